@@ -0,0 +1,42 @@
+"""Tiempo de arranque: DDL en cada import (antes) vs chequeo de SCHEMA_VERSION.
+
+Mide contra Oracle (variables ORACLE_* del .env) cuanto tarda cada forma de
+preparar un esquema que ya existe, y cuanto tarda importar fapi.
+
+    python crearTablas.py                  # deja el esquema al dia
+    python benchmarks/bench_arranque.py
+"""
+import os
+import sys
+from time import perf_counter
+
+import oracledb
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crearTablas import crear_tablas, migrar
+
+REPETICIONES = 10
+
+def medir(funcion):
+    inicio = perf_counter()
+    for _ in range(REPETICIONES):
+        funcion()
+    return (perf_counter() - inicio) / REPETICIONES * 1000
+
+if __name__ == '__main__':
+    load_dotenv()
+    with oracledb.connect(user=os.getenv('ORACLE_USERNAME'), password=os.getenv('ORACLE_PASSWORD'), dsn=os.getenv('ORACLE_CONNECTSTRING')) as connection:
+        migrar(connection)
+
+        def ddl_completo():
+            with connection.cursor() as cursor:
+                crear_tablas(cursor)
+
+        print(f"crear_tablas (DDL en cada arranque): {medir(ddl_completo):8.2f} ms")
+        print(f"migrar (esquema al dia):             {medir(lambda: migrar(connection)):8.2f} ms")
+
+    inicio = perf_counter()
+    import fapi  # noqa: F401
+    print(f"import fapi:                         {(perf_counter() - inicio) * 1000:8.2f} ms")
@@ -0,0 +1,101 @@
+"""Micro-benchmark de conflictos y huecos libres sobre miles de horarios.
+
+Compara el camino directo (parsear los 'HH:MM' de cada fila y comparar todas
+las franjas contra todas) con IndiceFranjas de franjas.py: minutos en arrays
+ordenados por dia, barrido con heap para los solapamientos y fusion lineal de
+intervalos para los huecos. No necesita base de datos.
+
+    python benchmarks/bench_franjas.py
+    python benchmarks/bench_franjas.py --horarios 5000 --franjas 30
+"""
+import argparse
+import os
+import random
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from franjas import IndiceFranjas, minutos
+
+def generar(horarios, franjas, semilla=1):
+    # {id_horario: [(id, dia, hora_inicio, hora_fin)]} con franjas de 1 a 3 horas
+    aleatorio = random.Random(semilla)
+    filas = {}
+    id = 0
+    for id_horario in range(1, horarios + 1):
+        filas[id_horario] = []
+        for _ in range(franjas):
+            id += 1
+            inicio = aleatorio.randrange(7 * 60, 20 * 60, 15)
+            fin = inicio + aleatorio.choice((60, 90, 120, 180))
+            filas[id_horario].append((id, aleatorio.choice('LMXJV'),
+                                      f'{inicio // 60:02d}:{inicio % 60:02d}', f'{fin // 60:02d}:{fin % 60:02d}'))
+    return filas
+
+def conflictos_directo(propias, otras):
+    # Cada franja del horario contra todas las demas: O(n^2) y parseo en cada comparacion
+    pares = []
+    todas = propias + otras
+    for i, (id_a, dia_a, inicio_a, fin_a) in enumerate(propias):
+        for id_b, dia_b, inicio_b, fin_b in todas[i + 1:]:
+            if dia_a == dia_b and minutos(inicio_a) < minutos(fin_b) and minutos(inicio_b) < minutos(fin_a):
+                pares.append((id_a, id_b))
+    return pares
+
+def huecos_directo(filas, dia, desde, hasta, duracion):
+    ocupadas = sorted((minutos(inicio), minutos(fin)) for _, d, inicio, fin in filas if d == dia)
+    libres = []
+    cursor = desde
+    for inicio, fin in ocupadas:
+        if inicio - cursor >= duracion and inicio <= hasta:
+            libres.append((cursor, inicio))
+        cursor = max(cursor, fin)
+    if hasta - cursor >= duracion:
+        libres.append((cursor, hasta))
+    return libres
+
+def medir(funcion, repeticiones=1):
+    inicio = perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (perf_counter() - inicio) / repeticiones * 1000, resultado
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--horarios', type=int, default=2000, help='horarios de usuario')
+    parser.add_argument('--franjas', type=int, default=25, help='franjas por horario')
+    args = parser.parse_args()
+
+    filas = generar(args.horarios, args.franjas)
+    total = sum(len(franjas) for franjas in filas.values())
+    ms, indices = medir(lambda: {id: IndiceFranjas(franjas) for id, franjas in filas.items()})
+    print(f"{args.horarios} horarios, {total} franjas: indices armados en {ms:.1f} ms")
+
+    print(f"\n{'conflictos vs':>14} {'franjas':>8} {'pares':>7} {'directo ms':>11} {'indice ms':>10}")
+    for otros in (1, 10, 100, 1000):
+        if otros >= args.horarios:
+            break
+        ids = list(range(2, otros + 2))
+        propias = filas[1]
+        otras = [fila for id in ids for fila in filas[id]]
+        directo, pares_directo = medir(lambda: conflictos_directo(propias, otras))
+        propios = {id for id, _, _, _ in propias}
+        indice, pares = medir(lambda: list(IndiceFranjas.unir([indices[1]] + [indices[id] for id in ids]).solapamientos(propios)))
+        assert {frozenset(par) for par in pares_directo} == {frozenset((a, b)) for _, a, b, _, _ in pares}
+        print(f"{otros:>14} {len(propias) + len(otras):>8} {len(pares):>7} {directo:>11.2f} {indice:>10.2f}")
+
+    print(f"\n{'huecos usuarios':>15} {'franjas':>8} {'directo ms':>11} {'indice ms':>10}")
+    for usuarios in (2, 10, 100, 1000, args.horarios):
+        ids = list(range(1, min(usuarios, args.horarios) + 1))
+        juntas = [fila for id in ids for fila in filas[id]]
+        directo, libres_directo = medir(lambda: [huecos_directo(juntas, dia, 7 * 60, 22 * 60, 30) for dia in 'LMXJV'])
+        def huecos_indice():
+            unido = IndiceFranjas.unir([indices[id] for id in ids])
+            return [unido.huecos(dia, 7 * 60, 22 * 60, 30) for dia in 'LMXJV']
+        indice, libres = medir(huecos_indice)
+        assert libres == libres_directo
+        print(f"{len(ids):>15} {len(juntas):>8} {directo:>11.2f} {indice:>10.2f}")
+
+    bytes_indice = sum(sum(columna.itemsize * len(columna) for columna in dia) for indice in indices.values() for dia in indice.dias.values())
+    print(f"\nmemoria de los indices: {bytes_indice / total:.1f} bytes por franja en arrays")
@@ -0,0 +1,93 @@
+"""Compara las estrategias de obtener_horario (join, multi, json) contra Oracle.
+
+Crea un horario compartido temporal con MATERIAS materias, HORARIOS horarios
+por materia y un numero creciente de comentarios, mide cada estrategia y
+borra los datos al terminar. Usa las variables ORACLE_* del .env.
+
+    python benchmarks/bench_obtener_horario.py
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from time import perf_counter
+
+os.environ['HORARIO_CACHE_MAX'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import fapi
+
+MATERIAS = 8
+HORARIOS = 3
+COMENTARIOS = [0, 10, 100, 1000]
+REPETICIONES = 20
+URL = 'bench-obtener-horario'
+
+def crear_datos(cursor):
+    ids = {}
+    id = cursor.var(int)
+    cursor.execute("INSERT INTO ROLES (nombre) VALUES ('bench') RETURNING id INTO :id", id=id)
+    ids['rol'] = id.getvalue()[0]
+    cursor.execute("INSERT INTO USUARIOS (id_rol, nombre, email, contrasena) VALUES (:1, 'bench', 'bench@email.com', 'bench') RETURNING id INTO :id", [ids['rol'], id])
+    ids['usuario'] = id.getvalue()[0]
+    cursor.execute("INSERT INTO HORARIOS_USUARIOS (id_usuario, nombre) VALUES (:1, 'bench') RETURNING id INTO :id", [ids['usuario'], id])
+    ids['horario'] = id.getvalue()[0]
+    cursor.execute("INSERT INTO COMPARTIR_HORARIO (url_acesso, id_horario) VALUES (:1, :2)", [URL, ids['horario']])
+    for m in range(MATERIAS):
+        cursor.execute("INSERT INTO MATERIAS (id_horario, nombre, color) VALUES (:1, :2, 'Azul') RETURNING id INTO :id", [ids['horario'], f'materia {m}', id])
+        id_materia = id.getvalue()[0]
+        cursor.execute("INSERT INTO DETALLES_MATERIAS (id_materia, descripcion, mostrar) VALUES (:1, 'detalle', 1)", [id_materia])
+        for h in range(HORARIOS):
+            cursor.execute("INSERT INTO HORARIOS (id_materia, dia, hora_incio, hora_fin) VALUES (:1, 'L', '08:00', '10:00') RETURNING id INTO :id", [id_materia, id])
+            cursor.execute("INSERT INTO DETALLES_HORARIOS (id_horario, descripcion, mostrar) VALUES (:1, 'aula', 1)", [id.getvalue()[0]])
+    return ids
+
+def agregar_comentarios(cursor, ids, cantidad):
+    filas = [(ids['horario'], ids['usuario'], f'comentario {i}', datetime.now()) for i in range(cantidad)]
+    if filas:
+        cursor.executemany("INSERT INTO COMENTARIOS_HORARIO (id_horario, id_usuario, comentario, publicado) VALUES (:1, :2, :3, :4)", filas)
+
+def borrar_datos(cursor, ids):
+    cursor.execute("DELETE FROM COMENTARIOS_HORARIO WHERE id_horario = :1", [ids['horario']])
+    cursor.execute("DELETE FROM DETALLES_HORARIOS WHERE id_horario IN (SELECT h.id FROM HORARIOS h JOIN MATERIAS m ON h.id_materia = m.id WHERE m.id_horario = :1)", [ids['horario']])
+    cursor.execute("DELETE FROM HORARIOS WHERE id_materia IN (SELECT id FROM MATERIAS WHERE id_horario = :1)", [ids['horario']])
+    cursor.execute("DELETE FROM DETALLES_MATERIAS WHERE id_materia IN (SELECT id FROM MATERIAS WHERE id_horario = :1)", [ids['horario']])
+    cursor.execute("DELETE FROM MATERIAS WHERE id_horario = :1", [ids['horario']])
+    cursor.execute("DELETE FROM COMPARTIR_HORARIO WHERE id_horario = :1", [ids['horario']])
+    cursor.execute("DELETE FROM HORARIOS_USUARIOS WHERE id = :1", [ids['horario']])
+    cursor.execute("DELETE FROM USUARIOS WHERE id = :1", [ids['usuario']])
+    cursor.execute("DELETE FROM ROLES WHERE id = :1", [ids['rol']])
+
+async def medir(estrategia):
+    inicio = perf_counter()
+    for _ in range(REPETICIONES):
+        await fapi.obtener_horario(URL, estrategia)
+    return (perf_counter() - inicio) / REPETICIONES * 1000
+
+async def main():
+    with fapi.oracledb.connect(user=fapi.un, password=fapi.pw, dsn=fapi.cs) as connection:
+        with connection.cursor() as cursor:
+            ids = crear_datos(cursor)
+            connection.commit()
+            try:
+                print(f"{'comentarios':>12} {'join ms':>10} {'multi ms':>10} {'json ms':>10}")
+                total = 0
+                for cantidad in COMENTARIOS:
+                    agregar_comentarios(cursor, ids, cantidad - total)
+                    connection.commit()
+                    total = cantidad
+                    tiempos = [await medir(estrategia) for estrategia in ('join', 'multi', 'json')]
+                    print(f"{cantidad:>12} " + ' '.join(f"{t:>10.2f}" for t in tiempos))
+            finally:
+                borrar_datos(cursor, ids)
+                connection.commit()
+
+if __name__ == '__main__':
+    if fapi.ASYNC_MODE:
+        # El pool asincrono se crea en el lifespan de la app
+        async def con_lifespan():
+            async with fapi.lifespan(fapi.app):
+                await main()
+        asyncio.run(con_lifespan())
+    else:
+        asyncio.run(main())
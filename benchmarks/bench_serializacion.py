@@ -0,0 +1,83 @@
+"""Costo de serializar las respuestas grandes: camino estandar vs JSON_RAPIDO.
+
+Para listados de COMENTARIOS_HORARIO y para la salida anidada de
+transformar_datos mide:
+
+- estandar: jsonable_encoder + JSONResponse (lo que hace FastAPI sin response_model)
+- response_model: validacion con Pydantic antes de serializar
+- orjson: RespuestaJSON de fapi.py sobre los mismos dicts y datetimes
+
+No necesita base de datos (ORACLE_ASYNC=1 evita crear el pool al importar).
+
+    python benchmarks/bench_serializacion.py
+"""
+import os
+import sys
+from datetime import datetime
+from time import perf_counter
+from typing import List
+
+os.environ['ORACLE_ASYNC'] = '1'
+os.environ['JSON_RAPIDO'] = '1'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from fapi import ComentariosHorario, RespuestaJSON
+from horarios import transformar_datos
+
+CAMPOS = ['id', 'id_horario', 'comentario', 'id_usuario', 'publicado']
+
+def generar_comentarios(n):
+    fecha = datetime(2024, 1, 1, 12, 30)
+    return [dict(zip(CAMPOS, (i, i % 50, f'comentario {i}', i % 200, fecha))) for i in range(n)]
+
+def generar_join(n):
+    # Filas del JOIN de obtener_horario repartidas en horarios de ~100 filas
+    fecha = datetime(2024, 1, 1, 12, 30)
+    filas = []
+    for i in range(n):
+        url, resto = divmod(i, 100)
+        materia, comentario = divmod(resto, 10)
+        filas.append((
+            f'url{url}', 'Horario', url * 10 + materia, f'materia {materia}', 'Azul',
+            'detalle', 1, url * 10 + materia, 'L', '08:00', '10:00', 'aula', 1,
+            f'comentario {comentario}', fecha, 'usuario',
+            url, url, url * 10 + materia, url * 10 + materia, url * 10 + comentario, comentario,
+        ))
+    return filas
+
+def medir(funcion, datos, repeticiones=3):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = perf_counter()
+        funcion(datos)
+        mejor = min(mejor, perf_counter() - inicio)
+    return mejor
+
+def estandar(datos):
+    return JSONResponse(jsonable_encoder(datos)).body
+
+modelo = TypeAdapter(List[ComentariosHorario])
+
+def con_response_model(datos):
+    return JSONResponse(jsonable_encoder(modelo.dump_python(modelo.validate_python(datos)))).body
+
+def rapido(datos):
+    return RespuestaJSON(datos).body
+
+if __name__ == '__main__':
+    print(f"{'caso':<12} {'filas':>7} {'estandar s':>11} {'resp_model s':>13} {'orjson s':>9} {'x':>6}")
+    for n in (1_000, 10_000, 100_000):
+        datos = generar_comentarios(n)
+        base = medir(estandar, datos)
+        validado = medir(con_response_model, datos)
+        nuevo = medir(rapido, datos)
+        print(f"{'listado':<12} {n:>7} {base:>11.4f} {validado:>13.4f} {nuevo:>9.4f} {base / nuevo:>6.1f}")
+    for n in (1_000, 10_000, 100_000):
+        resultado, _ = transformar_datos(generar_join(n))
+        base = medir(estandar, resultado)
+        nuevo = medir(rapido, resultado)
+        print(f"{'horarios':<12} {n:>7} {base:>11.4f} {'-':>13} {nuevo:>9.4f} {base / nuevo:>6.1f}")
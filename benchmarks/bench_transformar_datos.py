@@ -0,0 +1,88 @@
+"""Micro-benchmark de transformar_datos sobre filas sinteticas del JOIN.
+
+Compara la version original (un dict por fila via CAMPOS y deduplicacion de
+comentarios con `in` sobre una lista) con la actual, que trabaja sobre las
+tuplas del cursor y deduplica por id. No necesita base de datos.
+
+    python benchmarks/bench_transformar_datos.py
+"""
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from itertools import product
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from horarios import transformar_datos
+
+CAMPOS = [
+    'url_compartido', 'nombre_horario', 'id_materia', 'nombre_materia', 'color_materia',
+    'descripcion_materia', 'mostrar_detalle_materia', 'id_horario', 'dia_horario',
+    'hora_inicio', 'hora_fin', 'descripcion_horario', 'mostrar_detalle_horario',
+    'comentario_horario', 'fecha_comentario', 'nombre_usuario_comentario',
+    'id_compartir', 'id_horario_usuario', 'id_detalle_materia', 'id_detalle_horario',
+    'id_comentario', 'id_usuario_comentario',
+]
+
+def transformar_datos_original(datos):
+    resultado = defaultdict(lambda: {"nombre_horario": "", "comentarios": [], "materias": []})
+    materias_dict = {}
+    horarios_dict = {}
+    for item in datos:
+        url = item["url_compartido"]
+        resultado[url]["url_compartido"] = url
+        resultado[url]["nombre_horario"] = item["nombre_horario"]
+        comentario = {
+            "comentario": item["comentario_horario"],
+            "fecha": item["fecha_comentario"],
+            "nombre_usuario": item["nombre_usuario_comentario"]
+        }
+        if comentario not in resultado[url]["comentarios"]:
+            resultado[url]["comentarios"].append(comentario)
+        clave_materia = (url, item["id_materia"])
+        if clave_materia not in materias_dict:
+            materia = {"id": item["id_materia"], "nombre": item["nombre_materia"], "color": item["color_materia"].lower(), "descripciones": [], "horarios": []}
+            if item["descripcion_materia"]:
+                materia["descripciones"].append({"descripcion": item["descripcion_materia"], "mostrar": item["mostrar_detalle_materia"]})
+            materias_dict[clave_materia] = materia
+            resultado[url]["materias"].append(materia)
+        clave_horario = (clave_materia, item["id_horario"])
+        if clave_horario not in horarios_dict:
+            horario = {"id": item["id_horario"], "dia": item["dia_horario"], "hora_inicio": item["hora_inicio"], "hora_fin": item["hora_fin"], "descripciones": []}
+            if item["descripcion_horario"]:
+                horario["descripciones"].append({"descripcion": item["descripcion_horario"], "mostrar": item["mostrar_detalle_horario"]})
+            horarios_dict[clave_horario] = horario
+            materias_dict[clave_materia]["horarios"].append(horario)
+    return list(resultado.values())
+
+def generar_filas(materias, horarios, detalles, comentarios):
+    """Producto materias x horarios x detalles_materia x detalles_horario x comentarios."""
+    fecha = datetime(2024, 1, 1)
+    filas = []
+    for m, h, dm, dh, c in product(range(materias), range(horarios), range(detalles), range(detalles), range(comentarios)):
+        id_horario = m * horarios + h
+        filas.append((
+            'url', 'Horario', m, f'materia {m}', 'Azul',
+            f'detalle {dm}', 1, id_horario, 'L',
+            '08:00', '10:00', f'aula {dh}', 1,
+            f'comentario {c}', fecha, 'usuario',
+            1, 1, m * detalles + dm, id_horario * detalles + dh,
+            c, c % 10,
+        ))
+    return filas
+
+def medir(funcion, datos):
+    inicio = perf_counter()
+    funcion(datos)
+    return perf_counter() - inicio
+
+if __name__ == '__main__':
+    # 10 x 5 x 2 x 2 x comentarios filas; la ultima configuracion llega a 100k
+    print(f"{'filas':>8} {'comentarios':>12} {'original s':>11} {'actual s':>9}")
+    for comentarios in (5, 50, 500):
+        filas = generar_filas(10, 5, 2, comentarios)
+        original = medir(lambda d: transformar_datos_original([dict(zip(CAMPOS, fila)) for fila in d]), filas)
+        actual = medir(transformar_datos, filas)
+        print(f"{len(filas):>8} {comentarios:>12} {original:>11.3f} {actual:>9.3f}")
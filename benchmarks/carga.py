@@ -0,0 +1,215 @@
+"""Prueba de carga de la app en proceso contra el pool simulado.
+
+Manda las peticiones por ASGI (httpx.ASGITransport, sin red) a fapi.app con
+el pool de benchmarks/simulador.py, para cada escenario y nivel de
+concurrencia, y reporta p50/p95/p99, throughput y codigos de estado. Los
+resultados se guardan en JSON; con --comparar se marcan las regresiones
+contra una corrida anterior (y el proceso termina con codigo 1). Un nivel
+con respuestas fuera de 2xx/3xx queda marcado como fallido: sus tiempos no
+se comparan y el proceso tambien termina con codigo 1. Con
+--fondo otro escenario corre en paralelo mientras se mide (por ejemplo
+rafagas de login mientras se mide el CRUD).
+
+    python benchmarks/carga.py
+    python benchmarks/carga.py --async --latencia 0.005 --concurrencia 1,16,64
+    python benchmarks/carga.py --comparar benchmarks/resultados/carga-base.json
+    python benchmarks/carga.py --escenarios obtener,listar --fondo login --fondo-concurrencia 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import simulador
+
+# Cada escenario arma la peticion i: (metodo, ruta, cuerpo)
+ESCENARIOS = {
+    'crear': lambda i: ('POST', '/comentarios_horario/', {
+        'id_horario': i % 50 + 1, 'comentario': f'comentario {i}', 'id_usuario': i % 10 + 1,
+        'publicado': '2024-01-01T12:30:00',
+    }),
+    'listar': lambda i: ('GET', '/comentarios_horario/', None),
+    'obtener': lambda i: ('GET', f'/materias/{i % 1000 + 1}', None),
+    'obtener_ids': lambda i: ('GET', f"/materias/?ids={','.join(str(i % 1000 + n) for n in range(1, 21))}", None),
+    'actualizar': lambda i: ('PUT', f'/materias/{i % 1000 + 1}', {'id_horario': 1, 'nombre': f'materia {i}', 'color': 'Azul'}),
+    'eliminar': lambda i: ('DELETE', f'/materias/{i % 1000 + 1}', None),
+    'horario': lambda i: ('GET', f'/operacion/obtenerHorario/url-{i % 50}', None),
+    'horarios_lote': lambda i: ('POST', '/operacion/obtenerHorarios', [f'url-{(i + n) % 200}' for n in range(10)]),
+    'horario_popular': lambda i: ('GET', '/operacion/obtenerHorario/url-popular', None),
+    'conflictos': lambda i: ('GET', f'/operacion/conflictos/{i % 50 + 1}?con={i % 50 + 2},{i % 50 + 3}', None),
+    'huecos': lambda i: ('GET', f"/operacion/huecosLibres?horarios={','.join(str((i + n) % 500 + 1) for n in range(10))}", None),
+    'crear_usuario': lambda i: ('POST', '/usuarios/', {'id_rol': 1, 'nombre': f'usuario {i}', 'email': f'u{i}@x.com', 'contrasena': 'secreta'}),
+    'login': lambda i: ('POST', '/operacion/login', {'email': f'u{i % 100}@x.com', 'contrasena': 'secreta'}),
+    'eliminar_rol': lambda i: ('DELETE', f'/operacion/eliminarRol/{i + 1}', None),
+}
+
+def percentil(ordenados, p):
+    # Rango mas cercano sobre las latencias ya ordenadas
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+async def correr_nivel(cliente, escenario, concurrencia, peticiones):
+    armar = ESCENARIOS[escenario]
+    latencias = []
+    estados = {}
+    siguiente = iter(range(peticiones))
+
+    async def trabajador():
+        for i in siguiente:
+            metodo, ruta, cuerpo = armar(i)
+            inicio = perf_counter()
+            respuesta = await cliente.request(metodo, ruta, json=cuerpo)
+            latencias.append(perf_counter() - inicio)
+            estados[str(respuesta.status_code)] = estados.get(str(respuesta.status_code), 0) + 1
+
+    inicio = perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    total = perf_counter() - inicio
+
+    latencias.sort()
+    fallidas = sum(n for estado, n in estados.items() if not 200 <= int(estado) < 400)
+    return {
+        'escenario': escenario,
+        'concurrencia': concurrencia,
+        'peticiones': peticiones,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 3),
+        'rps': round(peticiones / total, 1),
+        'estados': estados,
+        # Los tiempos de respuestas de error no sirven de referencia
+        'fallido': fallidas > 0,
+    }
+
+async def fondo(cliente, escenario, concurrencia, parar):
+    # Carga de fondo sin medir hasta que se pida parar
+    armar = ESCENARIOS[escenario]
+    enviadas = 0
+
+    async def trabajador(n):
+        nonlocal enviadas
+        i = n
+        while not parar.is_set():
+            metodo, ruta, cuerpo = armar(i)
+            await cliente.request(metodo, ruta, json=cuerpo)
+            enviadas += 1
+            i += concurrencia
+
+    await asyncio.gather(*(trabajador(n) for n in range(concurrencia)))
+    return enviadas
+
+async def correr(args):
+    import httpx
+
+    import fapi
+
+    transporte = httpx.ASGITransport(app=fapi.app, raise_app_exceptions=False)
+    resultados = []
+    async with fapi.lifespan(fapi.app):
+        async with httpx.AsyncClient(transport=transporte, base_url='http://carga') as cliente:
+            for escenario in args.escenarios:
+                for concurrencia in args.concurrencia:
+                    if args.fondo:
+                        parar = asyncio.Event()
+                        tarea = asyncio.ensure_future(fondo(cliente, args.fondo, args.fondo_concurrencia, parar))
+                        await asyncio.sleep(0.2)
+                    resultado = await correr_nivel(cliente, escenario, concurrencia, args.peticiones)
+                    if args.fondo:
+                        parar.set()
+                        resultado['fondo'] = {'escenario': args.fondo, 'peticiones': await tarea}
+                    resultados.append(resultado)
+                    print(f"{escenario:<13} {concurrencia:>5} {resultado['p50_ms']:>9.2f} {resultado['p95_ms']:>9.2f} "
+                          f"{resultado['p99_ms']:>9.2f} {resultado['rps']:>9.1f}  {resultado['estados']}"
+                          f"{'  FALLIDO' if resultado['fallido'] else ''}")
+    return resultados
+
+def comparar(resultados, anterior, tolerancia):
+    # Regresion: p95 sube o throughput baja mas que la tolerancia. Los
+    # niveles fallidos en cualquiera de las dos corridas no se comparan
+    base = {(r['escenario'], r['concurrencia']): r for r in anterior['resultados']}
+    regresiones = 0
+    print(f"\n{'escenario':<13} {'conc':>5} {'p95 antes':>10} {'p95 ahora':>10} {'rps antes':>10} {'rps ahora':>10}")
+    for actual in resultados:
+        previo = base.get((actual['escenario'], actual['concurrencia']))
+        if previo is None:
+            continue
+        if actual.get('fallido') or previo.get('fallido'):
+            print(f"{actual['escenario']:<13} {actual['concurrencia']:>5}  FALLIDO, sin comparar")
+            continue
+        peor = (actual['p95_ms'] > previo['p95_ms'] * (1 + tolerancia)
+                or actual['rps'] < previo['rps'] * (1 - tolerancia))
+        regresiones += peor
+        print(f"{actual['escenario']:<13} {actual['concurrencia']:>5} {previo['p95_ms']:>10.2f} {actual['p95_ms']:>10.2f} "
+              f"{previo['rps']:>10.1f} {actual['rps']:>10.1f}{'  REGRESION' if peor else ''}")
+    return regresiones
+
+def opciones():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--async', dest='modo_async', action='store_true', help='ORACLE_ASYNC=1')
+    parser.add_argument('--latencia', type=float, default=0.002, help='segundos por execute')
+    parser.add_argument('--filas', type=int, default=100, help='filas por SELECT de listado')
+    parser.add_argument('--comentarios', type=int, default=20, help='comentarios por horario')
+    parser.add_argument('--pool-max', type=int, default=4, help='ORACLE_POOL_MAX')
+    parser.add_argument('--sin-cache', action='store_true', help='HORARIO_CACHE_MAX=0')
+    parser.add_argument('--procesos', type=int, help='CONTRASENA_PROCESOS')
+    parser.add_argument('--costo', type=int, help='CONTRASENA_COSTO')
+    parser.add_argument('--fondo', choices=list(ESCENARIOS), help='escenario que corre de fondo mientras se mide')
+    parser.add_argument('--fondo-concurrencia', type=int, default=16, help='clientes del escenario de fondo')
+    parser.add_argument('--estrategia', choices=['join', 'multi', 'json'], help='HORARIO_ESTRATEGIA')
+    parser.add_argument('--concurrencia', type=lambda v: [int(n) for n in v.split(',')], default=[1, 8, 32])
+    parser.add_argument('--peticiones', type=int, default=400, help='peticiones por escenario y nivel')
+    parser.add_argument('--escenarios', type=lambda v: v.split(','), default=list(ESCENARIOS))
+    parser.add_argument('--salida', help='archivo JSON de resultados (por defecto benchmarks/resultados/)')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='margen antes de marcar regresion')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = opciones()
+    desconocidos = set(args.escenarios) - set(ESCENARIOS)
+    if desconocidos:
+        sys.exit(f"escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+    # La configuracion de la app se lee del entorno al importar fapi
+    os.environ['ORACLE_ASYNC'] = '1' if args.modo_async else '0'
+    os.environ['ORACLE_POOL_MAX'] = str(args.pool_max)
+    os.environ['SCHEMA_AUTO_MIGRAR'] = '0'
+    os.environ['LOG_SAMPLE_RATE'] = '0'
+    if args.sin_cache:
+        os.environ['HORARIO_CACHE_MAX'] = '0'
+    if args.estrategia:
+        os.environ['HORARIO_ESTRATEGIA'] = args.estrategia
+    if args.procesos is not None:
+        os.environ['CONTRASENA_PROCESOS'] = str(args.procesos)
+    if args.costo is not None:
+        os.environ['CONTRASENA_COSTO'] = str(args.costo)
+    simulador.instalar(latencia=args.latencia, filas=args.filas, comentarios=args.comentarios)
+
+    print(f"{'escenario':<13} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}  estados")
+    resultados = asyncio.run(correr(args))
+
+    corrida = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'config': {clave: valor for clave, valor in vars(args).items() if clave not in ('salida', 'comparar')},
+        'resultados': resultados,
+    }
+    salida = args.salida or os.path.join(
+        os.path.dirname(__file__), 'resultados', f"carga-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w') as archivo:
+        json.dump(corrida, archivo, indent=2)
+    print(f"\nresultados en {salida}")
+
+    regresiones = 0
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            regresiones = comparar(resultados, json.load(archivo), args.tolerancia)
+    fallidos = [f"{r['escenario']}@{r['concurrencia']}" for r in resultados if r['fallido']]
+    if fallidos:
+        print(f"\nniveles con errores: {', '.join(fallidos)}")
+    if regresiones or fallidos:
+        sys.exit(1)
@@ -0,0 +1,323 @@
+"""Pool de Oracle simulado para correr fapi.py sin base de datos.
+
+instalar() reemplaza oracledb.create_pool y oracledb.create_pool_async; hay
+que llamarlo antes de importar fapi. Cada execute espera `latencia` segundos
+(time.sleep en modo sincrono, asyncio.sleep en modo ORACLE_ASYNC) y el pool
+deja salir a lo sumo ORACLE_POOL_MAX conexiones a la vez, como el real.
+Las filas se generan segun la sentencia:
+
+- SELECT <columnas> FROM <tabla>: `filas` filas (una si es WHERE id = ...,
+  una por id si es WHERE id IN (...))
+- consultas de obtener_horario (join, multi y json): un horario de
+  `materias` x `horarios` con `comentarios` comentarios, uno por url en las
+  variantes con IN de obtenerHorarios
+- VERSION_HORARIO(S) y VERSION_TABLA: cantidades y versiones fijas
+- INDICES_EXISTENTES: todos los indices de INDICES, ya creados
+- HORARIOS_DEL_ROL: `horarios_rol` ids para el borrado por lotes
+- FRANJAS_DE_HORARIOS: `materias` x `horarios` franjas por horario de usuario
+- USUARIOS.contrasena: el hash scrypt de `contrasena`, con el costo de fapi
+- INSERT ... RETURNING id: ids consecutivos; UPDATE, DELETE y PL/SQL: rowcount 1
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from itertools import count
+
+import oracledb
+
+CONFIG = {
+    'latencia': 0.002,
+    'filas': 100,
+    'materias': 8,
+    'horarios': 3,
+    'comentarios': 20,
+    'horarios_rol': 50,
+    'contrasena': 'secreta',
+}
+
+FECHA = datetime(2024, 1, 1, 12, 30)
+LISTA_URLS = re.compile(r'IN \((:\d+(, )?)+\)')
+SELECT = re.compile(r'^\s*SELECT\s+(.*?)\s+FROM\s+(\w+)(.*)$', re.S | re.I)
+ids_generados = count(1)
+
+@lru_cache(maxsize=None)
+def hash_contrasena(contrasena):
+    import contrasenas
+    import fapi
+
+    return contrasenas.hashear(contrasena, fapi.CONTRASENA_COSTO)
+
+def valor(columna, i):
+    nombre = columna.split('.')[-1].strip().lower()
+    if nombre == 'id' or nombre.startswith('id_'):
+        return i + 1
+    if nombre in ('leer', 'escribir', 'eliminar', 'modificar', 'mostrar'):
+        return 1
+    if nombre == 'publicado':
+        return FECHA
+    if nombre == 'contrasena':
+        return hash_contrasena(CONFIG['contrasena'])
+    if nombre == 'color':
+        return 'Azul'
+    if nombre == 'dia':
+        return 'L'
+    if nombre in ('hora_incio', 'hora_fin'):
+        return '08:00' if nombre == 'hora_incio' else '10:00'
+    return f'{nombre} {i}'
+
+def horario_multi(url, base=0):
+    # Filas de las seis consultas de CONSULTAS_HORARIO, con ids consistentes
+    # (desplazados en `base` para que cada url de un lote tenga los suyos)
+    hu = base + 1
+    materias = range(base + 1, base + CONFIG['materias'] + 1)
+    horarios = [(m, m * CONFIG['horarios'] + h) for m in materias for h in range(CONFIG['horarios'])]
+    return [
+        [(hu, url, hu, 'Horario')],
+        [(m, hu, f'materia {m}', 'Azul') for m in materias],
+        [(m, m, f'detalle {m}', 1) for m in materias],
+        [(id, m, 'L', '08:00', '10:00') for m, id in horarios],
+        [(id, id, f'aula {id}', 1) for _, id in horarios],
+        [(c, hu, f'comentario {c}', FECHA, c % 10 + 1, 'usuario') for c in range(base + 1, base + CONFIG['comentarios'] + 1)],
+    ]
+
+def horario_join(url, base=0):
+    # Producto materias x horarios x comentarios, como el JOIN real
+    _, materias, _, horarios, _, comentarios = horario_multi(url, base)
+    filas = []
+    for id, id_materia, dia, inicio, fin in horarios:
+        for c in comentarios or [(None,) * 6]:
+            filas.append((
+                url, 'Horario', id_materia, f'materia {id_materia}', 'Azul',
+                f'detalle {id_materia}', 1, id, dia, inicio, fin, f'aula {id}', 1,
+                c[2], c[3], c[5], base + 1, base + 1, id_materia, id, c[0], c[4],
+            ))
+    return filas
+
+def horario_json(url, base=0):
+    compartidos, materias, detalles, horarios, detalles_horarios, comentarios = horario_multi(url, base)
+    documento = {
+        'url_compartido': url, 'nombre_horario': 'Horario', 'id_compartir': base + 1, 'id_horario_usuario': base + 1,
+        'comentarios': [
+            {'id': c[0], 'comentario': c[2], 'fecha': c[3].isoformat(), 'id_usuario': c[4], 'nombre_usuario': c[5]}
+            for c in comentarios
+        ],
+        'materias': [
+            {
+                'id': m, 'nombre': nombre, 'color': color.lower(),
+                'descripciones': [{'id': d[0], 'descripcion': d[2], 'mostrar': d[3]} for d in detalles if d[1] == m],
+                'horarios': [
+                    {'id': h[0], 'dia': h[2], 'hora_inicio': h[3], 'hora_fin': h[4],
+                     'descripciones': [{'id': h[0], 'descripcion': f'aula {h[0]}', 'mostrar': 1}]}
+                    for h in horarios if h[1] == m
+                ],
+            }
+            for m, _, nombre, color in materias
+        ],
+    }
+    return [(json.dumps(documento),)]
+
+def franjas(ids_horario):
+    # Franjas de 1 a 3 horas repartidas de lunes a viernes, distintas por horario
+    filas = []
+    for id_horario in ids_horario:
+        for m in range(CONFIG['materias']):
+            id_materia = id_horario * CONFIG['materias'] + m
+            for h in range(CONFIG['horarios']):
+                id = id_materia * CONFIG['horarios'] + h
+                inicio = 7 * 60 + (id * 37) % (13 * 60)
+                fin = inicio + 60 * (1 + id % 3)
+                filas.append((id_horario, id_materia, id, 'LMXJV'[id % 5],
+                              f'{inicio // 60:02d}:{inicio % 60:02d}', f'{fin // 60:02d}:{fin % 60:02d}'))
+    return filas
+
+def generar(sql, params, base=0):
+    import crearTablas
+    import fapi
+
+    if 'url_acesso IN (' in sql:
+        # Variante de obtenerHorarios: las filas de cada url, una detras de otra
+        urls = [valor for valor in params if valor is not None]
+        sql = LISTA_URLS.sub('= :url', sql)
+        return [fila for i, url in enumerate(urls) for fila in generar(sql, {'url': url}, base=i * 1000)]
+    url = params.get('url') if isinstance(params, dict) else None
+    if sql == fapi.QUERY_HORARIO_JOIN:
+        return horario_join(url, base)
+    if sql == fapi.QUERY_HORARIO_JSON:
+        return horario_json(url, base)
+    if sql in fapi.CONSULTAS_HORARIO:
+        return horario_multi(url, base)[fapi.CONSULTAS_HORARIO.index(sql)]
+    if sql == fapi.VERSION_HORARIO:
+        return [(tabla, CONFIG['materias'], 1) for tabla in fapi.PADRES_HORARIO if tabla != 'USUARIOS']
+    if sql == fapi.VERSION_HORARIOS:
+        return [(url, tabla, CONFIG['materias'], 1) for tabla in fapi.PADRES_HORARIO if tabla != 'USUARIOS']
+    if sql.startswith(fapi.VERSION_TABLA.split('{')[0]):
+        return [(CONFIG['filas'],)]
+    if sql.startswith(fapi.FRANJAS_DE_HORARIOS.split('{')[0]):
+        return franjas([valor for valor in params if valor is not None])
+    if sql == crearTablas.INDICES_EXISTENTES:
+        return [(tabla, 'UNIQUE' if unico else 'NONUNIQUE', ','.join(columnas).upper()) for _, tabla, columnas, unico in crearTablas.INDICES]
+    if sql == fapi.HORARIOS_DEL_ROL:
+        return [(i + 1,) for i in range(CONFIG['horarios_rol'])]
+    if 'COUNT(1)' in sql:
+        return [(1,)]
+    coincidencia = SELECT.match(sql)
+    if coincidencia is None:
+        return []
+    columnas, _, resto = coincidencia.groups()
+    columnas = [columna.strip() for columna in columnas.split(',')]
+    n = 1 if 'id = :' in resto else CONFIG['filas']
+    if 'id IN (' in resto:
+        n = sum(valor is not None for valor in params)
+    inicio = params.get('after_id') or 0 if isinstance(params, dict) else 0
+    return [tuple(valor(columna, inicio + i) for columna in columnas) for i in range(n)]
+
+class Variable:
+    def __init__(self, n):
+        self.valores = [[next(ids_generados)] for _ in range(n)]
+
+    def getvalue(self, i=0):
+        return self.valores[i]
+
+class Tipo:
+    def newobject(self, valores):
+        return list(valores)
+
+class Cursor:
+    def __init__(self):
+        self.arraysize = 100
+        self.rowcount = 0
+        self.filas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def preparar(self, sql, params):
+        self.filas = generar(sql, params or {})
+        self.rowcount = len(self.filas) or 1
+
+    def var(self, tipo, arraysize=1):
+        return Variable(arraysize)
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def getbatcherrors(self):
+        return []
+
+    def siguientes(self, n=None):
+        n = n or self.arraysize
+        filas, self.filas = self.filas[:n], self.filas[n:]
+        return filas
+
+    def execute(self, sql, params=None):
+        time.sleep(CONFIG['latencia'])
+        self.preparar(sql, params)
+
+    def executemany(self, sql, filas, batcherrors=False):
+        time.sleep(CONFIG['latencia'])
+        self.rowcount = len(filas)
+
+    def fetchall(self):
+        filas, self.filas = self.filas, []
+        return filas
+
+    def fetchone(self):
+        return self.filas[0] if self.filas else None
+
+    def fetchmany(self, n=None):
+        return self.siguientes(n)
+
+class Conexion:
+    autocommit = False
+
+    def cursor(self):
+        return Cursor()
+
+    def gettype(self, nombre):
+        return Tipo()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class Pool:
+    def __init__(self, max=4, **kwargs):
+        self.libres = threading.BoundedSemaphore(max)
+        self.busy = 0
+        self.opened = max
+
+    def acquire(self):
+        self.libres.acquire()
+        self.busy += 1
+        return Conexion()
+
+    def release(self, connection):
+        self.busy -= 1
+        self.libres.release()
+
+    def close(self):
+        pass
+
+class CursorAsync(Cursor):
+    async def execute(self, sql, params=None):
+        await asyncio.sleep(CONFIG['latencia'])
+        self.preparar(sql, params)
+
+    async def executemany(self, sql, filas, batcherrors=False):
+        await asyncio.sleep(CONFIG['latencia'])
+        self.rowcount = len(filas)
+
+    async def fetchall(self):
+        return Cursor.fetchall(self)
+
+    async def fetchone(self):
+        return Cursor.fetchone(self)
+
+    async def fetchmany(self, n=None):
+        return self.siguientes(n)
+
+class ConexionAsync(Conexion):
+    def cursor(self):
+        return CursorAsync()
+
+    async def gettype(self, nombre):
+        return Tipo()
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+class PoolAsync:
+    def __init__(self, max=4, **kwargs):
+        self.libres = asyncio.Semaphore(max)
+        self.busy = 0
+        self.opened = max
+
+    async def acquire(self):
+        await self.libres.acquire()
+        self.busy += 1
+        return ConexionAsync()
+
+    async def release(self, connection):
+        self.busy -= 1
+        self.libres.release()
+
+    async def close(self):
+        pass
+
+def instalar(**config):
+    """Configura el simulador y reemplaza los pools de oracledb."""
+    CONFIG.update(config)
+    oracledb.create_pool = lambda *args, **kwargs: Pool(**kwargs)
+    oracledb.create_pool_async = lambda *args, **kwargs: PoolAsync(**kwargs)
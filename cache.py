@@ -0,0 +1,143 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from secrets import token_hex
+from time import monotonic
+
+class CacheTTL:
+    """Cache LRU en memoria con expiracion por TTL.
+
+    Cada entrada guarda sus dependencias (pares (tabla, id)) para poder
+    invalidar solo las entradas afectadas por una escritura.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=60):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.entradas = OrderedDict()
+        self.indice = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave):
+        entrada = self.entradas.get(clave)
+        if entrada is None or entrada[0] < monotonic():
+            if entrada is not None:
+                self.eliminar(clave)
+            self.misses += 1
+            return None
+        self.entradas.move_to_end(clave)
+        self.hits += 1
+        return entrada[1]
+
+    def guardar(self, clave, valor, dependencias=()):
+        if self.max_entradas <= 0:
+            return
+        self.eliminar(clave)
+        dependencias = set(dependencias)
+        self.entradas[clave] = (monotonic() + self.ttl, valor, dependencias)
+        for dependencia in dependencias:
+            self.indice[dependencia].add(clave)
+        while len(self.entradas) > self.max_entradas:
+            self.eliminar(next(iter(self.entradas)))
+
+    def eliminar(self, clave):
+        entrada = self.entradas.pop(clave, None)
+        if entrada is None:
+            return
+        for dependencia in entrada[2]:
+            claves = self.indice.get(dependencia)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self.indice[dependencia]
+
+    def invalidar(self, tabla, id):
+        claves = self.indice.get((tabla, id))
+        if not claves:
+            return
+        for clave in list(claves):
+            self.eliminar(clave)
+            self.invalidaciones += 1
+
+    def invalidar_todo(self):
+        self.invalidaciones += len(self.entradas)
+        self.entradas.clear()
+        self.indice.clear()
+
+    def resumen(self):
+        return {
+            "entradas": len(self.entradas),
+            "max_entradas": self.max_entradas,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidaciones": self.invalidaciones,
+        }
+
+class VersionesTablas:
+    """Version de cada tabla segun las escrituras hechas por este proceso.
+
+    Alcanza para armar ETag/Last-Modified sin consultar la base: cada
+    escritura incrementa el contador de su tabla. La epoca distingue los
+    contadores de distintos procesos (o de un reinicio).
+    """
+
+    def __init__(self):
+        self.epoca = token_hex(4)
+        self.general = 0
+        self.modificado = datetime.now(timezone.utc)
+        self.tablas = {}
+        self.sondas = {}
+
+    def tocar(self, tabla):
+        contador, _ = self.tablas.get(tabla, (0, None))
+        self.tablas[tabla] = (contador + 1, datetime.now(timezone.utc))
+
+    def tocar_todo(self):
+        # Escrituras que abarcan varias tablas (eliminar rol, bloques PL/SQL)
+        self.general += 1
+        self.modificado = datetime.now(timezone.utc)
+
+    def version(self, tabla):
+        contador, modificado = self.tablas.get(tabla, (0, self.modificado))
+        return (self.epoca, self.general, contador), max(modificado, self.modificado)
+
+    def observar(self, tabla, sonda=None):
+        """version() junto con la ultima sonda leida de la base (p. ej. MAX(id)).
+
+        La sonda cambia tambien con las escrituras de otros procesos; cuando
+        difiere de la ultima vista se toma ese momento como su modificacion.
+        Sin sonda se usa la ultima vista, que nunca es mas nueva que la base.
+        """
+        anterior = self.sondas.get(tabla)
+        if sonda is not None and (anterior is None or anterior[0] != sonda):
+            anterior = self.sondas[tabla] = (sonda, datetime.now(timezone.utc))
+        version, modificado = self.version(tabla)
+        if anterior is None:
+            return version + (None,), modificado
+        return version + (anterior[0],), max(modificado, anterior[1])
+
+class VueloUnico:
+    """Une las llamadas concurrentes con la misma clave en una sola ejecucion.
+
+    La primera llamada lanza funcion() como tarea propia y las que llegan
+    mientras esta en vuelo esperan ese mismo resultado (o excepcion). La
+    tarea no se cancela si se desconecta el cliente que la inicio.
+    """
+
+    def __init__(self):
+        self.en_vuelo = {}
+        self.ejecutadas = 0
+        self.unidas = 0
+
+    async def hacer(self, clave, funcion):
+        tarea = self.en_vuelo.get(clave)
+        if tarea is None:
+            self.ejecutadas += 1
+            tarea = self.en_vuelo[clave] = asyncio.ensure_future(funcion())
+            tarea.add_done_callback(lambda _: self.en_vuelo.pop(clave, None))
+        else:
+            self.unidas += 1
+        return await asyncio.shield(tarea)
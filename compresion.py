@@ -0,0 +1,117 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# brotli es opcional (pip install brotli); sin el se usa solo gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respuestas que no se comprimen: eventos que deben llegar sin buffer y
+# formatos que ya vienen comprimidos
+NO_COMPRIMIR = ('text/event-stream', 'image/', 'application/zip', 'application/gzip')
+
+# Estados sin cuerpo: no llevan Content-Encoding aunque minimo sea 0
+SIN_CUERPO = (204, 304)
+
+def elegir_codificacion(cabecera):
+    # Accept-Encoding: "gzip, br;q=0.8" -> 'br' si brotli esta instalado
+    aceptadas = {}
+    for parte in cabecera.split(','):
+        nombre, _, parametros = parte.partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[nombre.strip().lower()] = calidad
+    if brotli is not None and aceptadas.get('br', 0) > 0:
+        return 'br'
+    if aceptadas.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+class Compresor:
+    def __init__(self, codificacion, nivel_gzip, calidad_brotli):
+        self.brotli = codificacion == 'br'
+        if self.brotli:
+            self.objeto = brotli.Compressor(quality=calidad_brotli)
+        else:
+            self.objeto = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)
+
+    def parcial(self, datos):
+        # Flush en cada trozo para que los streams NDJSON no se queden en buffer
+        if self.brotli:
+            return self.objeto.process(datos) + self.objeto.flush()
+        return self.objeto.compress(datos) + self.objeto.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self, datos):
+        if self.brotli:
+            return self.objeto.process(datos) + self.objeto.finish()
+        return self.objeto.compress(datos) + self.objeto.flush()
+
+class CompresionMiddleware:
+    """Middleware ASGI que comprime con brotli o gzip las respuestas de al
+    menos `minimo` bytes (o en streaming) segun el Accept-Encoding. Las
+    respuestas a HEAD, las 204/304 y los cuerpos vacios pasan sin tocar."""
+
+    def __init__(self, app, minimo=1024, nivel_gzip=6, calidad_brotli=4):
+        self.app = app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.calidad_brotli = calidad_brotli
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'HEAD':
+            return await self.app(scope, receive, send)
+        codificacion = elegir_codificacion(Headers(scope=scope).get('accept-encoding', ''))
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        # El inicio de la respuesta se demora hasta ver el primer trozo del
+        # cuerpo, que decide si se comprime
+        pendiente = None
+        compresor = None
+
+        async def enviar(mensaje):
+            nonlocal pendiente, compresor
+            if mensaje['type'] == 'http.response.start':
+                pendiente = {**mensaje, 'headers': list(mensaje.get('headers', []))}
+                return
+            if mensaje['type'] != 'http.response.body':
+                return await send(mensaje)
+
+            cuerpo = mensaje.get('body', b'')
+            mas = mensaje.get('more_body', False)
+            if pendiente is not None:
+                inicio, pendiente = pendiente, None
+                cabeceras = MutableHeaders(raw=inicio['headers'])
+                tipo = cabeceras.get('content-type', '')
+                if ('content-encoding' in cabeceras or tipo.startswith(NO_COMPRIMIR)
+                        or inicio['status'] in SIN_CUERPO
+                        or (not mas and (not cuerpo or len(cuerpo) < self.minimo))):
+                    await send(inicio)
+                    return await send(mensaje)
+                compresor = Compresor(codificacion, self.nivel_gzip, self.calidad_brotli)
+                cabeceras['Content-Encoding'] = codificacion
+                cabeceras.add_vary_header('Accept-Encoding')
+                if 'content-length' in cabeceras:
+                    del cabeceras['content-length']
+                if not mas:
+                    comprimido = compresor.terminar(cuerpo)
+                    cabeceras['Content-Length'] = str(len(comprimido))
+                    await send(inicio)
+                    return await send({'type': 'http.response.body', 'body': comprimido})
+                await send(inicio)
+
+            if compresor is None:
+                return await send(mensaje)
+            if mas:
+                await send({'type': 'http.response.body', 'body': compresor.parcial(cuerpo), 'more_body': True})
+            else:
+                await send({'type': 'http.response.body', 'body': compresor.terminar(cuerpo)})
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,103 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Formato guardado en USUARIOS.contrasena: scrypt$costo$r$p$sal$clave (base64).
+# El costo va en cada hash, asi subir CONTRASENA_COSTO no invalida los viejos
+
+def codificar(datos):
+    return base64.b64encode(datos).decode()
+
+def derivar(contrasena, sal, costo, r, p):
+    n = 2 ** costo
+    return hashlib.scrypt(contrasena.encode(), salt=sal, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=32)
+
+def hashear(contrasena, costo, r=8, p=1):
+    sal = os.urandom(16)
+    return f"scrypt${costo}${r}${p}${codificar(sal)}${codificar(derivar(contrasena, sal, costo, r, p))}"
+
+def hashear_varias(contrasenas, costo):
+    return [hashear(contrasena, costo) for contrasena in contrasenas]
+
+def verificar(contrasena, guardada, costo):
+    """(valida, rehashear): rehashear si lo guardado no es un hash con el costo actual."""
+    partes = guardada.split('$')
+    if len(partes) != 6 or partes[0] != 'scrypt':
+        # Filas anteriores al hash, con la contrasena en texto plano
+        return hmac.compare_digest(contrasena.encode(), guardada.encode()), True
+    _, costo_guardado, r, p, sal, clave = partes
+    calculada = derivar(contrasena, base64.b64decode(sal), int(costo_guardado), int(r), int(p))
+    return hmac.compare_digest(calculada, base64.b64decode(clave)), int(costo_guardado) != costo
+
+def bajar_prioridad():
+    # Los procesos de hash ceden la CPU a los que atienden peticiones
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+class PoolContrasenas:
+    """Hash y verificacion de contrasenas en procesos aparte.
+
+    scrypt ocupa CPU y memoria durante decenas de ms por llamada; en otros
+    procesos, con menor prioridad, no frena al event loop ni al threadpool
+    de las consultas. Corren a lo sumo `procesos` calculos a la vez y con
+    `cola` esperando ocupado() avisa para responder 503 en vez de acumular
+    pedidos. Con procesos=0 (o antes de iniciar()) se usa el executor por
+    defecto del event loop.
+    """
+
+    def __init__(self, procesos=2, cola=64, costo=15):
+        self.procesos = procesos
+        self.cola = cola
+        self.costo = costo
+        self.ejecutor = None
+        self.pendientes = 0
+        self.relleno = None
+
+    def iniciar(self):
+        # spawn: los procesos no heredan el pool de Oracle ni los hilos del padre
+        if self.procesos > 0:
+            self.ejecutor = ProcessPoolExecutor(self.procesos, mp_context=get_context('spawn'), initializer=bajar_prioridad)
+
+    def detener(self):
+        if self.ejecutor is not None:
+            self.ejecutor.shutdown()
+            self.ejecutor = None
+
+    def ocupado(self):
+        return self.pendientes >= max(self.procesos, 1) + self.cola
+
+    async def correr(self, funcion, *args):
+        self.pendientes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.ejecutor, funcion, *args)
+        finally:
+            self.pendientes -= 1
+
+    async def hashear(self, contrasena):
+        return await self.correr(hashear, contrasena, self.costo)
+
+    async def hashear_varias(self, contrasenas):
+        # Un trabajo por proceso, no uno por contrasena, para no llenar la cola
+        partes = max(self.procesos, 1)
+        grupos = [contrasenas[i::partes] for i in range(partes) if contrasenas[i::partes]]
+        hashes = await asyncio.gather(*(self.correr(hashear_varias, grupo, self.costo) for grupo in grupos))
+        resultado = [None] * len(contrasenas)
+        for i, grupo in enumerate(hashes):
+            resultado[i::partes] = grupo
+        return resultado
+
+    async def verificar(self, contrasena, guardada=None):
+        # Sin hash guardado (email inexistente) se verifica contra uno de
+        # relleno: la respuesta tarda lo mismo exista o no el usuario
+        if guardada is None:
+            if self.relleno is None:
+                self.relleno = await self.hashear(codificar(os.urandom(16)))
+            await self.correr(verificar, contrasena, self.relleno, self.costo)
+            return False, False
+        return await self.correr(verificar, contrasena, guardada, self.costo)
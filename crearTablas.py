@@ -1,4 +1,6 @@
-from utils import createTableIfNotExist
+from oracledb import DatabaseError
+
+from utils import createTableIfNotExist, createIndexIfNotExist
 
 def crear_tablas(cursor):
   # Ejemplo
@@ -137,4 +139,147 @@ def crear_tablas(cursor):
       PRIMARY KEY(id),
       CONSTRAINT fk_horario_comentarios FOREIGN KEY (id_horario) REFERENCES HORARIOS_USUARIOS(id)
     )
-  """)
\ No newline at end of file
+  """)
+
+# Indices de las claves foraneas y de la busqueda por url_acesso:
+# (nombre, tabla, columnas, unico)
+INDICES = [
+  ('idx_permisos_rol', 'PERMISOS', ['id_rol', 'tabla'], False),
+  ('idx_usuarios_rol', 'USUARIOS', ['id_rol'], False),
+  ('idx_horarios_usuarios_usuario', 'HORARIOS_USUARIOS', ['id_usuario'], False),
+  ('idx_materias_horario', 'MATERIAS', ['id_horario'], False),
+  ('idx_detalles_materias_materia', 'DETALLES_MATERIAS', ['id_materia'], False),
+  ('idx_horarios_materia', 'HORARIOS', ['id_materia'], False),
+  ('idx_detalles_horarios_horario', 'DETALLES_HORARIOS', ['id_horario'], False),
+  ('idx_compartir_horario_horario', 'COMPARTIR_HORARIO', ['id_horario'], False),
+  ('uq_compartir_horario_url', 'COMPARTIR_HORARIO', ['url_acesso'], True),
+  ('idx_comentarios_horario_horario', 'COMENTARIOS_HORARIO', ['id_horario'], False),
+]
+
+def verificar_unicos(cursor):
+  # Un indice unico sobre filas repetidas falla con ORA-01452 sin decir
+  # cuales son; se buscan antes para que la migracion las nombre
+  for nombre, tabla, columnas, unico in INDICES:
+    if not unico:
+      continue
+    lista = ', '.join(columnas)
+    cursor.execute(f"""
+      SELECT {lista}, COUNT(*) FROM {tabla}
+      GROUP BY {lista} HAVING COUNT(*) > 1
+      ORDER BY COUNT(*) DESC FETCH FIRST 20 ROWS ONLY
+    """)
+    repetidos = cursor.fetchall()
+    if repetidos:
+      detalle = ', '.join(f"{fila[:-1] if len(fila) > 2 else fila[0]!r} ({fila[-1]} filas)" for fila in repetidos)
+      raise RuntimeError(f"No se puede crear {nombre}: valores repetidos de {tabla}.{lista}: {detalle}")
+
+def crear_indices(cursor):
+  verificar_unicos(cursor)
+  for nombre, tabla, columnas, unico in INDICES:
+    createIndexIfNotExist(cursor, f"CREATE {'UNIQUE ' if unico else ''}INDEX {nombre} ON {tabla} ({', '.join(columnas)})")
+
+  faltantes = verificar_indices(cursor)
+  if faltantes:
+    raise RuntimeError(f"Indices faltantes tras la migracion: {faltantes}")
+
+INDICES_EXISTENTES = """
+    SELECT i.table_name, i.uniqueness, LISTAGG(c.column_name, ',') WITHIN GROUP (ORDER BY c.column_position)
+    FROM USER_INDEXES i
+    JOIN USER_IND_COLUMNS c ON c.index_name = i.index_name
+    GROUP BY i.index_name, i.table_name, i.uniqueness
+"""
+
+def verificar_indices(cursor):
+  """Devuelve los indices de INDICES cuyas columnas no encabezan ningun indice."""
+  cursor.execute(INDICES_EXISTENTES)
+  return indices_faltantes(cursor.fetchall())
+
+def indices_faltantes(existentes):
+  # existentes: filas de INDICES_EXISTENTES
+  faltantes = []
+  for nombre, tabla, columnas, unico in INDICES:
+    buscado = ','.join(columnas).upper()
+    if not any(
+      tabla_indice == tabla and (columnas_indice + ',').startswith(buscado + ',')
+      and (not unico or (unicidad == 'UNIQUE' and columnas_indice == buscado))
+      for tabla_indice, unicidad, columnas_indice in existentes
+    ):
+      faltantes.append(nombre)
+  return faltantes
+
+def crear_tipos(cursor):
+  # Coleccion de ids que usa eliminar_rol para resolver cada conjunto una sola vez
+  createTableIfNotExist(cursor, "CREATE TYPE ID_LISTA AS TABLE OF NUMBER")
+
+def hashear_contrasenas(cursor):
+  # Los hashes scrypt no entran en VARCHAR2(50); el email pasa a tener indice para el login
+  cursor.execute("ALTER TABLE USUARIOS MODIFY (contrasena VARCHAR2(255))")
+  createIndexIfNotExist(cursor, "CREATE INDEX idx_usuarios_email ON USUARIOS (email)")
+
+# Migraciones en orden: (version, funcion que recibe el cursor).
+# La version 1 es el esquema original; como usa createTableIfNotExist
+# tambien sirve para bases creadas antes de existir SCHEMA_VERSION.
+MIGRACIONES = [
+  (1, crear_tablas),
+  (2, crear_indices),
+  (3, crear_tipos),
+  (4, hashear_contrasenas),
+]
+
+def version_actual(cursor):
+  try:
+    cursor.execute("SELECT MAX(version) FROM SCHEMA_VERSION")
+  except DatabaseError as e:
+    error, = e.args
+    # ORA-00942: la tabla de versiones todavia no existe
+    if error.code == 942:
+      return None
+    raise
+  version, = cursor.fetchone()
+  return version or 0
+
+def migrar(connection):
+  """Aplica las migraciones pendientes y devuelve la version final.
+
+  El caso comun (esquema al dia) es una sola consulta; el DDL solo corre
+  cuando SCHEMA_VERSION esta atrasada.
+  """
+  ultima = MIGRACIONES[-1][0]
+  with connection.cursor() as cursor:
+    version = version_actual(cursor)
+    if version is not None and version >= ultima:
+      return version
+
+    createTableIfNotExist(cursor, """
+      CREATE TABLE SCHEMA_VERSION (
+        version NUMBER NOT NULL,
+        aplicada DATE DEFAULT SYSDATE NOT NULL,
+        PRIMARY KEY(version)
+      )
+    """)
+
+    # Las migraciones son idempotentes (el DDL confirma solo y las tablas
+    # existentes se ignoran), asi dos workers que arrancan a la vez pueden
+    # aplicarlas en paralelo; el que llega segundo choca con la PK de version.
+    for numero, migracion in MIGRACIONES:
+      if numero > (version or 0):
+        migracion(cursor)
+        try:
+          cursor.execute("INSERT INTO SCHEMA_VERSION (version) VALUES (:1)", [numero])
+        except DatabaseError as e:
+          error, = e.args
+          if error.code != 1:
+            raise
+        connection.commit()
+        version = numero
+    return version
+
+if __name__ == "__main__":
+  # python crearTablas.py: aplica las migraciones sin levantar la API
+  import oracledb
+  from dotenv import load_dotenv
+  from os import getenv
+
+  load_dotenv()
+  with oracledb.connect(user=getenv('ORACLE_USERNAME'), password=getenv('ORACLE_PASSWORD'), dsn=getenv('ORACLE_CONNECTSTRING')) as connection:
+    print(f"Esquema en la version {migrar(connection)}")
@@ -0,0 +1,92 @@
+import asyncio
+from time import perf_counter
+
+from metricas import (
+    escritura_descartadas, escritura_escritas, escritura_flush_segundos, escritura_rechazadas, logger,
+)
+
+class EscrituraDiferida:
+    """Cola acotada de filas que una tarea de fondo inserta por lotes.
+
+    encolar() no espera: devuelve False si la cola esta llena, asi la ruta
+    puede responder 503 en vez de acumular memoria. La tarea junta hasta
+    `lote` filas o lo que llegue en `intervalo` segundos y llama a
+    insertar(filas) una vez por lote. detener() deja de aceptar filas y
+    vacia lo pendiente antes de terminar.
+    """
+
+    def __init__(self, nombre, insertar, max_filas=10000, lote=200, intervalo=0.05, reintentos=3):
+        self.nombre = nombre
+        self.insertar = insertar
+        self.lote = lote
+        self.intervalo = intervalo
+        self.reintentos = reintentos
+        self.cola = asyncio.Queue(max_filas)
+        self.cerrando = False
+        self.tarea = None
+
+    def pendientes(self):
+        return self.cola.qsize()
+
+    def encolar(self, fila):
+        if self.cerrando:
+            escritura_rechazadas.incrementar(self.nombre)
+            return False
+        try:
+            self.cola.put_nowait(fila)
+        except asyncio.QueueFull:
+            escritura_rechazadas.incrementar(self.nombre)
+            return False
+        return True
+
+    def iniciar(self):
+        self.tarea = asyncio.create_task(self.correr())
+
+    async def detener(self):
+        self.cerrando = True
+        if self.tarea is not None:
+            await self.tarea
+
+    async def juntar(self):
+        # Espera la primera fila y completa el lote hasta `lote` filas o
+        # hasta que pase `intervalo` desde esa primera fila
+        try:
+            filas = [await asyncio.wait_for(self.cola.get(), self.intervalo)]
+        except asyncio.TimeoutError:
+            return []
+        limite = asyncio.get_running_loop().time() + self.intervalo
+        while len(filas) < self.lote:
+            if not self.cola.empty():
+                filas.append(self.cola.get_nowait())
+                continue
+            restante = limite - asyncio.get_running_loop().time()
+            if restante <= 0 or self.cerrando:
+                break
+            try:
+                filas.append(await asyncio.wait_for(self.cola.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return filas
+
+    async def vaciar(self, filas):
+        for intento in range(1, self.reintentos + 1):
+            inicio = perf_counter()
+            try:
+                escritas = await self.insertar(filas)
+            except Exception as e:
+                logger.error(f"{self.nombre}: lote de {len(filas)} filas fallo (intento {intento}): {e}")
+                if intento < self.reintentos:
+                    await asyncio.sleep(self.intervalo * intento)
+                continue
+            escritura_flush_segundos.observar(perf_counter() - inicio, self.nombre)
+            escritura_escritas.incrementar(self.nombre, valor=escritas)
+            if escritas < len(filas):
+                escritura_descartadas.incrementar(self.nombre, valor=len(filas) - escritas)
+            return
+        escritura_descartadas.incrementar(self.nombre, valor=len(filas))
+
+    async def correr(self):
+        while not (self.cerrando and self.cola.empty()):
+            filas = await self.juntar()
+            if filas:
+                await self.vaciar(filas)
@@ -0,0 +1,82 @@
+import asyncio
+from collections import OrderedDict, deque
+
+class Suscripcion:
+    def __init__(self, clave, buffer):
+        self.clave = clave
+        self.cola = asyncio.Queue(buffer)
+        self.desbordada = False
+
+    async def eventos(self, keepalive):
+        # (id, datos) por evento y (None, None) cada `keepalive` segundos sin
+        # eventos. Termina si el suscriptor se atraso mas que su buffer
+        while not (self.desbordada and self.cola.empty()):
+            try:
+                yield await asyncio.wait_for(self.cola.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield None, None
+
+class Canal:
+    def __init__(self, historial):
+        self.suscripciones = set()
+        self.historial = deque(maxlen=historial)
+
+class HubEventos:
+    """Reparte en memoria los eventos publicados a los suscriptores de cada clave.
+
+    Cada suscriptor tiene una cola acotada: si no la consume a tiempo se lo
+    desconecta en vez de acumular memoria, y al reconectar retoma desde el
+    ultimo id recibido. Cada canal guarda sus ultimos `historial` eventos
+    para retomar sin consultar la base.
+    """
+
+    def __init__(self, buffer=100, historial=100, max_canales=1024):
+        self.buffer = buffer
+        self.historial = historial
+        self.max_canales = max_canales
+        self.canales = OrderedDict()
+        self.desbordes = 0
+
+    def canal(self, clave):
+        canal = self.canales.get(clave)
+        if canal is None:
+            canal = self.canales[clave] = Canal(self.historial)
+            # Se descartan los canales mas viejos que no tienen suscriptores
+            for vieja in list(self.canales):
+                if len(self.canales) <= self.max_canales:
+                    break
+                if not self.canales[vieja].suscripciones:
+                    del self.canales[vieja]
+        self.canales.move_to_end(clave)
+        return canal
+
+    def suscriptores(self):
+        return sum(len(canal.suscripciones) for canal in self.canales.values())
+
+    def suscribir(self, clave):
+        suscripcion = Suscripcion(clave, self.buffer)
+        self.canal(clave).suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        canal = self.canales.get(suscripcion.clave)
+        if canal is not None:
+            canal.suscripciones.discard(suscripcion)
+
+    def publicar(self, clave, id, datos):
+        canal = self.canal(clave)
+        canal.historial.append((id, datos))
+        for suscripcion in list(canal.suscripciones):
+            try:
+                suscripcion.cola.put_nowait((id, datos))
+            except asyncio.QueueFull:
+                suscripcion.desbordada = True
+                canal.suscripciones.discard(suscripcion)
+                self.desbordes += 1
+
+    def recientes(self, clave, desde):
+        # Eventos con id > desde, o None si el historial no alcanza a cubrirlos
+        canal = self.canales.get(clave)
+        if canal is None or not canal.historial or desde < canal.historial[0][0]:
+            return None
+        return [(id, datos) for id, datos in canal.historial if id > desde]
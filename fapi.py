@@ -1,15 +1,38 @@
 import oracledb
-from datetime import datetime
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 
 from dotenv import load_dotenv
 from os import getenv 
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-
-from crearTablas import crear_tablas
+from contextlib import asynccontextmanager, contextmanager
+from secrets import token_hex
+from threading import Lock
+from time import perf_counter, time
 
-from collections import defaultdict
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+from crearTablas import INDICES_EXISTENTES, indices_faltantes, migrar
+from cache import CacheTTL, VersionesTablas, VueloUnico
+from compresion import CompresionMiddleware
+from contrasenas import PoolContrasenas
+from permisos import MatrizPermisos, OPERACION_POR_METODO, emitir_token, leer_token
+from escritura_diferida import EscrituraDiferida
+from eventos import HubEventos
+from franjas import IndiceFranjas, hora, minutos, orden_dia
+from horarios import transformar_datos, armar_horarios, combinar_documentos, repartir_por_url
+from metricas import (
+    MetricasMiddleware, Medidor, db_execute_segundos, db_fetch_segundos, db_filas,
+    exponer, instrumentado, log_muestreado, logger, pool_espera_segundos, pool_timeouts,
+    registrar, template_actual,
+)
 
 PORT = 3000
 load_dotenv()
@@ -18,6 +41,106 @@ un = getenv('ORACLE_USERNAME')
 cs = getenv('ORACLE_CONNECTSTRING')
 pw = getenv('ORACLE_PASSWORD')
 
+# ORACLE_ASYNC=1 usa el pool asincrono de python-oracledb; si no, el pool
+# sincrono original corre en el threadpool (sirve para comparar ambos modos)
+ASYNC_MODE = getenv('ORACLE_ASYNC', '0').lower() in ('1', 'true', 'si')
+
+# Parametros del pool (wait_timeout en ms, ping_interval y max_lifetime_session en s)
+POOL_CONFIG = {
+    'min': int(getenv('ORACLE_POOL_MIN', '1')),
+    'max': int(getenv('ORACLE_POOL_MAX', '4')),
+    'increment': int(getenv('ORACLE_POOL_INCREMENT', '1')),
+    'wait_timeout': int(getenv('ORACLE_POOL_WAIT_TIMEOUT', '5000')),
+    'stmtcachesize': int(getenv('ORACLE_STMT_CACHE_SIZE', '20')),
+    'ping_interval': int(getenv('ORACLE_POOL_PING_INTERVAL', '60')),
+    'max_lifetime_session': int(getenv('ORACLE_POOL_MAX_LIFETIME', '0')),
+    'getmode': oracledb.POOL_GETMODE_TIMEDWAIT,
+}
+
+# Aplicar migraciones pendientes al arrancar (tambien: python crearTablas.py)
+SCHEMA_AUTO_MIGRAR = getenv('SCHEMA_AUTO_MIGRAR', '1').lower() in ('1', 'true', 'si')
+
+# Cache de /operacion/obtenerHorario (HORARIO_CACHE_MAX=0 lo desactiva)
+HORARIO_CACHE_MAX = int(getenv('HORARIO_CACHE_MAX', '1024'))
+HORARIO_CACHE_TTL = int(getenv('HORARIO_CACHE_TTL', '60'))
+
+# PERMISOS_ACTIVOS=1 exige en las rutas CRUD el token de /operacion/login
+# (Authorization: Bearer) y verifica su rol contra la tabla PERMISOS, cacheada
+# en memoria PERMISOS_TTL segundos. Las rutas /admin/ lo exigen siempre
+PERMISOS_ACTIVOS = getenv('PERMISOS_ACTIVOS', '0').lower() in ('1', 'true', 'si')
+PERMISOS_TTL = int(getenv('PERMISOS_TTL', '300'))
+
+# Clave de firma de los tokens (la misma en todos los workers) y su validez
+# en segundos. Sin TOKEN_SECRETO se usa una al azar: los tokens solo valen en
+# este proceso y hasta que se reinicie
+TOKEN_SECRETO = (getenv('TOKEN_SECRETO') or token_hex(32)).encode()
+TOKEN_VIGENCIA = int(getenv('TOKEN_VIGENCIA', '3600'))
+
+# Validez maxima (s) de los ETag/Last-Modified de los listados: acota cuanto
+# puede tardar en verse una escritura hecha por otro proceso (0 = sin limite)
+ETAG_VENTANA = int(getenv('ETAG_VENTANA', '60'))
+
+# Peticiones concurrentes iguales comparten una sola consulta: obtenerHorario
+# por url y, opcionalmente, GET /{recurso}/{id} por tabla e id
+COALESCER_HORARIOS = getenv('COALESCER_HORARIOS', '1').lower() in ('1', 'true', 'si')
+COALESCER_SELECT = getenv('COALESCER_SELECT', '0').lower() in ('1', 'true', 'si')
+
+# Estrategia de lectura de obtener_horario: join (consulta unica original),
+# multi (una consulta por tabla hija) o json (documento armado por Oracle)
+HORARIO_ESTRATEGIA = getenv('HORARIO_ESTRATEGIA', 'multi')
+
+# Maximo de urls en POST /operacion/obtenerHorarios (se resuelven con un solo IN)
+HORARIOS_URLS_MAX = min(int(getenv('HORARIOS_URLS_MAX', '100')), 1000)
+
+# Paginacion de las rutas de listado y filas por fetch en modo stream
+LIST_LIMIT_DEFAULT = int(getenv('LIST_LIMIT_DEFAULT', '100'))
+LIST_LIMIT_MAX = int(getenv('LIST_LIMIT_MAX', '1000'))
+STREAM_ARRAYSIZE = int(getenv('STREAM_ARRAYSIZE', '500'))
+
+# Ids por consulta en GET /{recurso}/?ids=1,2,3 (Oracle admite hasta 1000 en un IN)
+IDS_MAX = min(int(getenv('IDS_MAX', '100')), 1000)
+
+# Compresion gzip/brotli de respuestas desde COMPRESION_MINIMO bytes (-1 la desactiva)
+COMPRESION_MINIMO = int(getenv('COMPRESION_MINIMO', '1024'))
+COMPRESION_NIVEL = int(getenv('COMPRESION_NIVEL', '6'))
+
+# Filas por executemany en las rutas /bulk
+BULK_BATCH_SIZE = int(getenv('BULK_BATCH_SIZE', '500'))
+
+# COMENTARIOS_DIFERIDOS=1: POST /comentarios_horario/ encola y responde 202;
+# una tarea inserta la cola con executemany cada COMENTARIOS_INTERVALO_MS o
+# cada COMENTARIOS_LOTE filas. Con la cola llena se responde 503
+COMENTARIOS_DIFERIDOS = getenv('COMENTARIOS_DIFERIDOS', '0').lower() in ('1', 'true', 'si')
+COMENTARIOS_COLA_MAX = int(getenv('COMENTARIOS_COLA_MAX', '10000'))
+COMENTARIOS_LOTE = int(getenv('COMENTARIOS_LOTE', '200'))
+COMENTARIOS_INTERVALO_MS = int(getenv('COMENTARIOS_INTERVALO_MS', '50'))
+
+# Feed SSE de comentarios nuevos (/operacion/obtenerHorario/{url}/stream):
+# eventos en cola por suscriptor, eventos recientes por horario para retomar
+# sin consultar la base y segundos entre keepalives
+SSE_BUFFER = int(getenv('SSE_BUFFER', '100'))
+SSE_HISTORIAL = int(getenv('SSE_HISTORIAL', '100'))
+SSE_KEEPALIVE = int(getenv('SSE_KEEPALIVE', '15'))
+
+# Contrasenas con scrypt (N = 2**CONTRASENA_COSTO) calculadas en
+# CONTRASENA_PROCESOS procesos aparte (0 = threadpool); con mas de
+# CONTRASENA_COLA calculos esperando, altas y logins responden 503
+CONTRASENA_COSTO = int(getenv('CONTRASENA_COSTO', '15'))
+CONTRASENA_PROCESOS = int(getenv('CONTRASENA_PROCESOS', '2'))
+CONTRASENA_COLA = int(getenv('CONTRASENA_COLA', '64'))
+
+# Fraccion de llamadas que dejan un log estructurado (0 lo desactiva)
+LOG_SAMPLE_RATE = float(getenv('LOG_SAMPLE_RATE', '0.01'))
+
+# JSON_RAPIDO=1 serializa los listados y los horarios con orjson directamente
+# desde las filas del cursor, sin jsonable_encoder (orjson viene con fastapi[all])
+JSON_RAPIDO = getenv('JSON_RAPIDO', '0').lower() in ('1', 'true', 'si')
+if JSON_RAPIDO:
+    import orjson
+
+# Los CLOB (documentos JSON) se leen directamente como str
+oracledb.defaults.fetch_lobs = False
+
 class Roles(BaseModel):
     nombre: str
 
@@ -27,11 +150,18 @@ class Permisos(BaseModel):
     escribir: int
     eliminar: int
     modificar: int
+    tabla: Optional[str] = None
 
-class Usuarios(BaseModel):
+class UsuariosPublicos(BaseModel):
     id_rol: int
     nombre: str
     email: str
+
+class Usuarios(UsuariosPublicos):
+    contrasena: str
+
+class Credenciales(BaseModel):
+    email: str
     contrasena: str
 
 class HorariosUsuarios(BaseModel):
@@ -59,90 +189,766 @@ class ComentariosHorario(BaseModel):
     id_usuario: int
     publicado: datetime
 
+class Paginacion:
+    """Parametros de las rutas de listado: paginacion por id, export NDJSON,
+    ?fields=a,b para traer solo esas columnas e ?ids=1,2,3 para buscar varias
+    filas por id en una sola consulta."""
+
+    def __init__(
+        self,
+        request: Request,
+        response: Response,
+        limit: int = Query(LIST_LIMIT_DEFAULT, ge=1, le=LIST_LIMIT_MAX),
+        after_id: Optional[int] = None,
+        stream: bool = False,
+        fields: Optional[str] = None,
+        ids: Optional[str] = None,
+    ):
+        self.request = request
+        self.response = response
+        self.limit = limit
+        self.after_id = after_id
+        self.stream = stream
+        self.fields = fields
+        self.ids = ids
+
 # Pydantic model for order data
 class Order(BaseModel):
     order_id: int
     product_name: str
     quantity: int
 
-# Define the FastAPI app
-app = FastAPI()
+class PoolStats:
+    """Contadores de uso del pool: esperas al adquirir conexion y timeouts."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.adquisiciones = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def registrar_espera(self, segundos):
+        with self.lock:
+            self.adquisiciones += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+        pool_espera_segundos.observar(segundos)
+
+    def registrar_error(self, error):
+        # DPY-4005 (thin) / ORA-24457 (thick): se agoto wait_timeout
+        codigo = getattr(error.args[0], 'full_code', '') if error.args else ''
+        if codigo in ('DPY-4005', 'ORA-24457'):
+            with self.lock:
+                self.timeouts += 1
+            pool_timeouts.incrementar()
+
+    def resumen(self, pool_actual):
+        with self.lock:
+            promedio = self.espera_total / self.adquisiciones if self.adquisiciones else 0.0
+            return {
+                "modo": "async" if ASYNC_MODE else "sync",
+                "abiertas": pool_actual.opened if pool_actual else 0,
+                "ocupadas": pool_actual.busy if pool_actual else 0,
+                "min": POOL_CONFIG['min'],
+                "max": POOL_CONFIG['max'],
+                "adquisiciones": self.adquisiciones,
+                "espera_promedio_ms": round(promedio * 1000, 3),
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+
+pool_stats = PoolStats()
+
+horarios_cache = CacheTTL(HORARIO_CACHE_MAX, HORARIO_CACHE_TTL)
+
+# Tablas que alimentan obtener_horario y la columna que apunta a su padre
+PADRES_HORARIO = {
+    'COMPARTIR_HORARIO': ('id_horario', 'HORARIOS_USUARIOS'),
+    'HORARIOS_USUARIOS': None,
+    'MATERIAS': ('id_horario', 'HORARIOS_USUARIOS'),
+    'DETALLES_MATERIAS': ('id_materia', 'MATERIAS'),
+    'HORARIOS': ('id_materia', 'MATERIAS'),
+    'DETALLES_HORARIOS': ('id_horario', 'HORARIOS'),
+    'COMENTARIOS_HORARIO': ('id_horario', 'HORARIOS_USUARIOS'),
+    'USUARIOS': None,
+}
+
+versiones_tablas = VersionesTablas()
+vuelos_horario = VueloUnico()
+vuelos_select = VueloUnico()
+
+matriz_permisos = MatrizPermisos(
+    lambda: db_fetchall("SELECT id_rol, tabla, leer, escribir, eliminar, modificar FROM PERMISOS"),
+    PERMISOS_TTL,
+)
+
+cola_comentarios = EscrituraDiferida(
+    'comentarios_horario',
+    lambda datos: insertar_comentarios(datos),
+    COMENTARIOS_COLA_MAX,
+    COMENTARIOS_LOTE,
+    COMENTARIOS_INTERVALO_MS / 1000,
+)
+
+pool_contrasenas = PoolContrasenas(CONTRASENA_PROCESOS, CONTRASENA_COLA, CONTRASENA_COSTO)
+
+# Comentarios nuevos por id de HORARIOS_USUARIOS. Solo ve las altas hechas en
+# este proceso: con varios workers cada uno reparte las suyas
+comentarios_hub = HubEventos(SSE_BUFFER, SSE_HISTORIAL)
+
+def registrar_escritura(table, data=None, where=None):
+    versiones_tablas.tocar(table)
+    if table in ('PERMISOS', 'ROLES'):
+        matriz_permisos.invalidar()
+    invalidar_horarios(table, data, where)
+
+def registrar_escritura_general():
+    # Escrituras que abarcan varias tablas (eliminar rol, bloques PL/SQL)
+    versiones_tablas.tocar_todo()
+    matriz_permisos.invalidar()
+    horarios_cache.invalidar_todo()
+
+def version_horarios():
+    # Contadores de escritura de las tablas de obtener_horario. Se toma antes
+    # de consultar y se compara al guardar: si hubo una escritura en el medio,
+    # su invalidacion pudo llegar antes que el resultado viejo a la cache
+    return tuple(versiones_tablas.version(tabla)[0] for tabla in PADRES_HORARIO)
+
+def invalidar_horarios(table, data=None, where=None):
+    if table not in PADRES_HORARIO:
+        return
+    if where is not None:
+        if 'id' not in where:
+            horarios_cache.invalidar_todo()
+            return
+        horarios_cache.invalidar(table, where['id'])
+    if data:
+        padre = PADRES_HORARIO[table]
+        if padre and padre[0] in data:
+            horarios_cache.invalidar(padre[1], data[padre[0]])
+        if table == 'COMPARTIR_HORARIO':
+            horarios_cache.eliminar(data.get('url_accesso'))
 
 # Create a connection pool
-pool = oracledb.create_pool(user=un, password=pw, dsn=cs, min=1, max=4, increment=1)
+# El pool asincrono necesita un event loop activo, por eso se crea en el lifespan
+pool = None if ASYNC_MODE else oracledb.create_pool(user=un, password=pw, dsn=cs, **POOL_CONFIG)
+async_pool = None
+
+def preparar_esquema():
+    # Una consulta a SCHEMA_VERSION; el DDL solo corre si hay migraciones pendientes
+    with oracledb.connect(user=un, password=pw, dsn=cs) as connection:
+        migrar(connection)
+
+@asynccontextmanager
+async def lifespan(app):
+    global async_pool
+    if SCHEMA_AUTO_MIGRAR:
+        await run_in_threadpool(preparar_esquema)
+    if ASYNC_MODE:
+        async_pool = oracledb.create_pool_async(user=un, password=pw, dsn=cs, **POOL_CONFIG)
+    if COMENTARIOS_DIFERIDOS:
+        cola_comentarios.iniciar()
+    pool_contrasenas.iniciar()
+    yield
+    # Los comentarios encolados se insertan antes de cerrar los pools
+    await cola_comentarios.detener()
+    pool_contrasenas.detener()
+    if async_pool is not None:
+        await async_pool.close()
+    if pool is not None:
+        pool.close()
+
+# Tabla que protege cada prefijo de ruta; el metodo HTTP elige la columna
+TABLAS_POR_RUTA = {
+    '/roles/': 'ROLES',
+    '/permisos/': 'PERMISOS',
+    '/usuarios/': 'USUARIOS',
+    '/horarios_usuarios/': 'HORARIOS_USUARIOS',
+    '/materias/': 'MATERIAS',
+    '/detalles_materias/': 'DETALLES_MATERIAS',
+    '/compartir_horario/': 'COMPARTIR_HORARIO',
+    '/comentarios_horario/': 'COMENTARIOS_HORARIO',
+    '/operacion/eliminarRol/': 'ROLES',
+    # Tabla ficticia: el rol necesita una fila de PERMISOS con tabla 'ADMIN'
+    '/admin/': 'ADMIN',
+}
+
+async def verificar_permiso(request: Request):
+    tabla = next((tabla for prefijo, tabla in TABLAS_POR_RUTA.items() if request.url.path.startswith(prefijo)), None)
+    operacion = OPERACION_POR_METODO.get(request.method)
+    if tabla is None or operacion is None or (not PERMISOS_ACTIVOS and tabla != 'ADMIN'):
+        return
+    esquema, _, token = request.headers.get('authorization', '').partition(' ')
+    if esquema.lower() != 'bearer' or not token:
+        raise HTTPException(status_code=401, detail="Bearer token required", headers={'WWW-Authenticate': 'Bearer'})
+    sesion = leer_token(token.strip(), TOKEN_SECRETO)
+    if sesion is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={'WWW-Authenticate': 'Bearer'})
+    _, rol = sesion
+    try:
+        permitido = await matriz_permisos.permite(rol, tabla, operacion)
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    if not permitido:
+        raise HTTPException(status_code=403, detail=f"Rol {rol} cannot {operacion} {tabla}")
 
-# Set up the schema
-with pool.acquire() as connection:
-    with connection.cursor() as cursor:
-        crear_tablas(cursor)
+# Define the FastAPI app
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(verificar_permiso)])
+app.add_middleware(MetricasMiddleware)
+if COMPRESION_MINIMO >= 0:
+    app.add_middleware(CompresionMiddleware, minimo=COMPRESION_MINIMO, nivel_gzip=COMPRESION_NIVEL)
+
+registrar(Medidor('db_pool_busy', 'Conexiones ocupadas', lambda: getattr(async_pool if ASYNC_MODE else pool, 'busy', 0)))
+registrar(Medidor('db_pool_open', 'Conexiones abiertas', lambda: getattr(async_pool if ASYNC_MODE else pool, 'opened', 0)))
+registrar(Medidor('horario_cache_hits', 'Aciertos de la cache de horarios', lambda: horarios_cache.hits))
+registrar(Medidor('horario_cache_misses', 'Fallos de la cache de horarios', lambda: horarios_cache.misses))
+registrar(Medidor('write_behind_queue_depth', 'Comentarios encolados sin insertar', cola_comentarios.pendientes))
+registrar(Medidor('horario_singleflight_ejecutadas', 'Consultas de horario ejecutadas', lambda: vuelos_horario.ejecutadas))
+registrar(Medidor('horario_singleflight_unidas', 'Peticiones de horario que esperaron una consulta en vuelo', lambda: vuelos_horario.unidas))
+registrar(Medidor('select_singleflight_ejecutadas', 'Consultas por id ejecutadas', lambda: vuelos_select.ejecutadas))
+registrar(Medidor('select_singleflight_unidas', 'Consultas por id que esperaron una consulta en vuelo', lambda: vuelos_select.unidas))
+registrar(Medidor('sse_suscriptores', 'Clientes conectados al feed de comentarios', comentarios_hub.suscriptores))
+registrar(Medidor('sse_desbordes', 'Clientes desconectados por no leer el feed a tiempo', lambda: comentarios_hub.desbordes))
+registrar(Medidor('password_pool_pending', 'Hashes de contrasena en curso o esperando', lambda: pool_contrasenas.pendientes))
+registrar(Medidor('permisos_recargas', 'Cargas de la matriz de permisos', lambda: matriz_permisos.recargas))
+
+#
+# ACCESO A LA BASE DE DATOS
+#
+# Cada primitiva usa el pool asincrono en modo ORACLE_ASYNC o delega la
+# version sincrona al threadpool, asi las rutas son async en ambos modos.
+
+@contextmanager
+def acquire_sync():
+    inicio = perf_counter()
+    try:
+        connection = pool.acquire()
+    except oracledb.Error as e:
+        pool_stats.registrar_error(e)
+        raise
+    pool_stats.registrar_espera(perf_counter() - inicio)
+    try:
+        yield connection
+    finally:
+        pool.release(connection)
 
-def template_create(table, data):
+@asynccontextmanager
+async def acquire_async():
+    inicio = perf_counter()
     try:
-        keys = ', '.join(data.keys())
-        values = ', '.join([f":{i + 1}" for i in range(len(data))])
-        with pool.acquire() as connection:
-            connection.autocommit = True
+        connection = await async_pool.acquire()
+    except oracledb.Error as e:
+        pool_stats.registrar_error(e)
+        raise
+    pool_stats.registrar_espera(perf_counter() - inicio)
+    try:
+        yield connection
+    finally:
+        await async_pool.release(connection)
+
+def medir_db(inicio, ejecutado, filas=None):
+    # Atribuye el tiempo de execute/fetch y las filas al template en curso
+    template = template_actual.get()
+    db_execute_segundos.observar(ejecutado - inicio, template)
+    if filas is not None:
+        db_fetch_segundos.observar(perf_counter() - ejecutado, template)
+        db_filas.incrementar(template, valor=filas)
+
+def db_fetchall_sync(sql, params=()):
+    with acquire_sync() as connection:
+        with connection.cursor() as cursor:
+            inicio = perf_counter()
+            cursor.execute(sql, params)
+            ejecutado = perf_counter()
+            filas = cursor.fetchall()
+            medir_db(inicio, ejecutado, len(filas))
+            return filas
+
+def db_fetchone_sync(sql, params=()):
+    with acquire_sync() as connection:
+        with connection.cursor() as cursor:
+            inicio = perf_counter()
+            cursor.execute(sql, params)
+            ejecutado = perf_counter()
+            fila = cursor.fetchone()
+            medir_db(inicio, ejecutado, int(fila is not None))
+            return fila
+
+def db_execute_sync(sql, params=()):
+    with acquire_sync() as connection:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            inicio = perf_counter()
+            cursor.execute(sql, params)
+            medir_db(inicio, perf_counter())
+            return cursor.rowcount
+
+def db_stream_sync(sql, params=()):
+    with acquire_sync() as connection:
+        with connection.cursor() as cursor:
+            cursor.arraysize = STREAM_ARRAYSIZE
+            inicio = perf_counter()
+            cursor.execute(sql, params)
+            medir_db(inicio, perf_counter())
+            while True:
+                inicio = perf_counter()
+                filas = cursor.fetchmany()
+                medir_db(inicio, inicio, len(filas))
+                if not filas:
+                    break
+                yield filas
+
+def preparar_retorno(cursor, lote, retorno):
+    # Variable de salida para "RETURNING id INTO :n+1", una posicion por fila
+    if not retorno:
+        return None
+    ids = cursor.var(int, arraysize=len(lote))
+    cursor.setinputsizes(*([None] * len(lote[0])), ids)
+    return ids
+
+def leer_retorno(ids, lote):
+    if ids is None:
+        return [None] * len(lote)
+    return [valor[0] if valor else None for valor in (ids.getvalue(i) for i in range(len(lote)))]
+
+def db_executemany_sync(sql, filas, atomico=False, retorno=False):
+    with acquire_sync() as connection:
+        # Los lotes van en una sola transaccion, sin autocommit
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                errores = []
+                generados = []
+                for inicio in range(0, len(filas), BULK_BATCH_SIZE):
+                    lote = filas[inicio:inicio + BULK_BATCH_SIZE]
+                    ids = preparar_retorno(cursor, lote, retorno)
+                    comienzo = perf_counter()
+                    cursor.executemany(sql, lote, batcherrors=True)
+                    medir_db(comienzo, perf_counter())
+                    errores.extend((inicio + error.offset, error.message) for error in cursor.getbatcherrors())
+                    generados.extend(leer_retorno(ids, lote))
+            if errores and atomico:
+                connection.rollback()
+            else:
+                connection.commit()
+            return errores, generados
+        except oracledb.Error:
+            connection.rollback()
+            raise
+
+# Primera sentencia de db_fetch_varios: fija un snapshot para todas las consultas
+SOLO_LECTURA = "SET TRANSACTION READ ONLY"
+
+def db_fetch_varios_sync(consultas, params=()):
+    with acquire_sync() as connection:
+        # db_execute deja el autocommit activo en la conexion del pool: con
+        # el, SET TRANSACTION se confirmaria solo y cada SELECT veria su foto
+        connection.autocommit = False
+        try:
             with connection.cursor() as cursor:
-                cursor.execute(f"INSERT INTO {table} ({keys}) VALUES ({values})", tuple(data.values()))
-                return data
+                cursor.execute(SOLO_LECTURA)
+                resultados = []
+                for sql in consultas:
+                    inicio = perf_counter()
+                    cursor.execute(sql, params)
+                    ejecutado = perf_counter()
+                    resultados.append(cursor.fetchall())
+                    medir_db(inicio, ejecutado, len(resultados[-1]))
+                return resultados
+        finally:
+            connection.rollback()
+
+async def db_fetchall(sql, params=()):
+    if not ASYNC_MODE:
+        return await run_in_threadpool(db_fetchall_sync, sql, params)
+    async with acquire_async() as connection:
+        with connection.cursor() as cursor:
+            inicio = perf_counter()
+            await cursor.execute(sql, params)
+            ejecutado = perf_counter()
+            filas = await cursor.fetchall()
+            medir_db(inicio, ejecutado, len(filas))
+            return filas
+
+async def db_fetchone(sql, params=()):
+    if not ASYNC_MODE:
+        return await run_in_threadpool(db_fetchone_sync, sql, params)
+    async with acquire_async() as connection:
+        with connection.cursor() as cursor:
+            inicio = perf_counter()
+            await cursor.execute(sql, params)
+            ejecutado = perf_counter()
+            fila = await cursor.fetchone()
+            medir_db(inicio, ejecutado, int(fila is not None))
+            return fila
+
+async def db_execute(sql, params=()):
+    if not ASYNC_MODE:
+        return await run_in_threadpool(db_execute_sync, sql, params)
+    async with acquire_async() as connection:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            inicio = perf_counter()
+            await cursor.execute(sql, params)
+            medir_db(inicio, perf_counter())
+            return cursor.rowcount
+
+async def db_fetch_varios(consultas, params=()):
+    # Varias consultas con los mismos binds sobre una sola conexion del pool,
+    # dentro de una transaccion de solo lectura: todas ven la misma foto
+    if not ASYNC_MODE:
+        return await run_in_threadpool(db_fetch_varios_sync, consultas, params)
+    async with acquire_async() as connection:
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                await cursor.execute(SOLO_LECTURA)
+                resultados = []
+                for sql in consultas:
+                    inicio = perf_counter()
+                    await cursor.execute(sql, params)
+                    ejecutado = perf_counter()
+                    resultados.append(await cursor.fetchall())
+                    medir_db(inicio, ejecutado, len(resultados[-1]))
+                return resultados
+        finally:
+            await connection.rollback()
+
+async def db_executemany(sql, filas, atomico=False, retorno=False):
+    # Devuelve [(fila, mensaje)] de las filas rechazadas (batcherrors) y, con
+    # retorno, el id generado de cada fila (None si fue rechazada)
+    if not ASYNC_MODE:
+        return await run_in_threadpool(db_executemany_sync, sql, filas, atomico, retorno)
+    async with acquire_async() as connection:
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                errores = []
+                generados = []
+                for inicio in range(0, len(filas), BULK_BATCH_SIZE):
+                    lote = filas[inicio:inicio + BULK_BATCH_SIZE]
+                    ids = preparar_retorno(cursor, lote, retorno)
+                    comienzo = perf_counter()
+                    await cursor.executemany(sql, lote, batcherrors=True)
+                    medir_db(comienzo, perf_counter())
+                    errores.extend((inicio + error.offset, error.message) for error in cursor.getbatcherrors())
+                    generados.extend(leer_retorno(ids, lote))
+            if errores and atomico:
+                await connection.rollback()
+            else:
+                await connection.commit()
+            return errores, generados
+        except oracledb.Error:
+            await connection.rollback()
+            raise
+
+async def db_stream(sql, params=()):
+    # Entrega las filas en lotes de STREAM_ARRAYSIZE sin cargarlas todas
+    if not ASYNC_MODE:
+        lotes = db_stream_sync(sql, params)
+        try:
+            while True:
+                filas = await run_in_threadpool(next, lotes, None)
+                if filas is None:
+                    break
+                yield filas
+        finally:
+            lotes.close()
+        return
+    async with acquire_async() as connection:
+        with connection.cursor() as cursor:
+            cursor.arraysize = STREAM_ARRAYSIZE
+            inicio = perf_counter()
+            await cursor.execute(sql, params)
+            medir_db(inicio, perf_counter())
+            while True:
+                inicio = perf_counter()
+                filas = await cursor.fetchmany()
+                medir_db(inicio, inicio, len(filas))
+                if not filas:
+                    break
+                yield filas
+
+def json_default(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} is not JSON serializable")
+
+def serializar(valor):
+    if JSON_RAPIDO:
+        return orjson.dumps(valor, default=json_default)
+    return json.dumps(valor, default=json_default).encode()
+
+class RespuestaJSON(Response):
+    """Respuesta serializada con orjson: tuplas, dicts y datetimes tal cual
+    salen del cursor, sin jsonable_encoder ni validacion de response_model."""
+
+    media_type = 'application/json'
+
+    def render(self, content):
+        return orjson.dumps(content, default=json_default)
+
+def responder(contenido, response=None, cabeceras={}):
+    # Con JSON_RAPIDO se devuelve la respuesta ya armada y FastAPI no vuelve
+    # a recorrer el contenido; si no, las cabeceras van en la respuesta inyectada
+    if JSON_RAPIDO:
+        return RespuestaJSON(contenido, headers=cabeceras)
+    if response is not None:
+        response.headers.update(cabeceras)
+    return contenido
+
+async def ndjson(sql, params, campos):
+    # Corre despues de que template_select ya devolvio la respuesta
+    template_actual.set('template_select')
+    async for filas in db_stream(sql, params):
+        yield b''.join(serializar(dict(zip(campos, fila)) if campos else fila) + b'\n' for fila in filas)
+
+#
+# GET CONDICIONAL
+#
+
+def etag_de(*partes):
+    return 'W/"' + hashlib.blake2b(repr(partes).encode(), digest_size=12).hexdigest() + '"'
+
+def cabeceras_validacion(etag, modificado):
+    # no-cache: el cliente puede guardar la respuesta pero debe revalidarla
+    return {
+        'ETag': etag,
+        'Last-Modified': format_datetime(modificado, usegmt=True),
+        'Cache-Control': 'no-cache',
+    }
+
+def no_modificado(request, etag, modificado):
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    pedidos = request.headers.get('if-none-match')
+    if pedidos is not None:
+        pedidos = [pedido.strip().removeprefix('W/') for pedido in pedidos.split(',')]
+        return '*' in pedidos or etag.removeprefix('W/') in pedidos
+    desde = request.headers.get('if-modified-since')
+    if desde is None:
+        return False
+    try:
+        return modificado.replace(microsecond=0) <= parsedate_to_datetime(desde)
+    except (TypeError, ValueError):
+        return False
+
+def ventana_actual(modificado):
+    # Al empezar cada ventana cambian los validadores, asi una escritura que
+    # este proceso no vio se nota a lo sumo ETAG_VENTANA segundos despues
+    if ETAG_VENTANA <= 0:
+        return 0, modificado
+    ventana = int(time() // ETAG_VENTANA)
+    return ventana, max(modificado, datetime.fromtimestamp(ventana * ETAG_VENTANA, timezone.utc))
+
+# Las altas de cualquier proceso mueven el id mas alto, que Oracle lee en un
+# extremo del indice de la PK (INDEX FULL SCAN MIN/MAX): costo fijo
+VERSION_TABLA = "SELECT MAX(id) FROM {table}"
+
+def condicional(request):
+    return 'if-none-match' in request.headers or 'if-modified-since' in request.headers
+
+async def version_listado(table, pagina):
+    # Sonda de la base mas las escrituras registradas por este proceso. La
+    # sonda solo se lee en los GET condicionales; los demas usan la ultima
+    # vista, asi una pagina sin validadores sigue siendo un solo viaje. Las
+    # bajas y modificaciones de otros procesos no la mueven: para esas queda
+    # la ventana
+    sonda = None
+    if condicional(pagina.request):
+        try:
+            sonda = await db_fetchone(VERSION_TABLA.format(table=table))
+        except oracledb.Error as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    version, modificado = versiones_tablas.observar(table, sonda)
+    ventana, modificado = ventana_actual(modificado)
+    return etag_de(table, version, ventana, pagina.after_id, pagina.limit, pagina.fields, pagina.ids), modificado
+
+@instrumentado('template_insert')
+async def template_insert(table, datos, atomico):
+    # Camino comun de las altas simples y /bulk: executemany con
+    # RETURNING id INTO, asi la fila creada incluye su id sin otra consulta
+    keys = ', '.join(datos[0].keys())
+    values = ', '.join([f":{i + 1}" for i in range(len(datos[0]))])
+    sql = f"INSERT INTO {table} ({keys}) VALUES ({values}) RETURNING id INTO :{len(datos[0]) + 1}"
+    errores, ids = await db_executemany(sql, [tuple(data.values()) for data in datos], atomico, retorno=True)
+    confirmado = not (errores and atomico)
+    filas = []
+    if confirmado:
+        for id, data in zip(ids, datos):
+            if id is not None:
+                filas.append({'id': id, **data})
+                registrar_escritura(table, data)
+    # Altas simples, /bulk y lotes de la escritura diferida pasan por aca
+    if table == 'COMENTARIOS_HORARIO':
+        for fila in filas:
+            comentarios_hub.publicar(fila['id_horario'], fila['id'], fila)
+    return filas, errores, confirmado
+
+@instrumentado('template_create')
+async def template_create(table, data):
+    try:
+        filas, errores, _ = await template_insert(table, [data], atomico=True)
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    if errores:
+        raise HTTPException(status_code=500, detail=f"Database error: {errores[0][1]}")
+    return filas[0]
+
+@instrumentado('template_create_bulk')
+async def template_create_bulk(table, datos, atomico=False):
+    if not datos:
+        return {"insertados": 0, "filas": [], "errores": [], "confirmado": True}
+    try:
+        filas, errores, confirmado = await template_insert(table, datos, atomico)
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    return {
+        "insertados": len(filas),
+        "filas": filas,
+        "errores": [{"fila": fila, "error": mensaje} for fila, mensaje in errores],
+        "confirmado": confirmado,
+    }
+
+def proyectar(campos, fields):
+    # ?fields=a,b -> solo esas columnas, en el orden de campos. El id va
+    # siempre porque lo usa la paginacion por keyset
+    if not fields:
+        return campos
+    pedidos = {campo.strip() for campo in fields.split(',') if campo.strip()}
+    desconocidos = pedidos - set(campos)
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(desconocidos))}")
+    return [campo for campo in campos if campo == 'id' or campo in pedidos]
+
+def columnas(campos):
+    # Lista explicita en vez de SELECT *: el orden de campos manda, no el de la tabla
+    return ', '.join(campos) if campos else '*'
+
+def parsear_ids(ids):
+    try:
+        valores = list(dict.fromkeys(int(valor) for valor in ids.split(',') if valor.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    if len(valores) > IDS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {IDS_MAX} ids per request")
+    return valores
+
+def lista_binds(valores):
+    # El IN se rellena con NULL hasta la siguiente potencia de 2 (minimo 8):
+    # cualquier cantidad de ids usa uno de pocos textos SQL ya cacheados
+    tamano = 8
+    while tamano < len(valores):
+        tamano *= 2
+    tamano = min(tamano, 1000)
+    binds = ', '.join(f":{i + 1}" for i in range(tamano))
+    return binds, tuple(valores) + (None,) * (tamano - len(valores))
+
+@instrumentado('template_select_ids')
+async def template_select_ids(table, campos, pagina):
+    # Varias filas por id en un viaje; la respuesta va indexada por id y los
+    # ids que no existen quedan en null
+    ids = parsear_ids(pagina.ids)
+    etag, modificado = await version_listado(table, pagina)
+    cabeceras = cabeceras_validacion(etag, modificado)
+    if no_modificado(pagina.request, etag, modificado):
+        return Response(status_code=304, headers=cabeceras)
+    if not ids:
+        return responder({}, pagina.response, cabeceras)
+    binds, params = lista_binds(ids)
+    try:
+        data = await db_fetchall(f"SELECT {columnas(campos)} FROM {table} WHERE id IN ({binds})", params)
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    filas = {str(row[0]): dict(zip(campos, row)) for row in data}
+    return responder({str(id): filas.get(str(id)) for id in ids}, pagina.response, cabeceras)
 
 # Endpoint to retrieve all
-def template_select(table, campos = []):
+@instrumentado('template_select')
+async def template_select(table, campos = [], pagina = None):
+    if pagina is not None:
+        campos = proyectar(campos, pagina.fields)
+        if pagina.ids is not None:
+            return await template_select_ids(table, campos, pagina)
+    # Paginacion por keyset: id > :after_id ORDER BY id usa el indice de la PK
+    sql = f"SELECT {columnas(campos)} FROM {table}"
+    params = {}
+    if pagina is not None and pagina.after_id is not None:
+        sql += " WHERE id > :after_id"
+        params['after_id'] = pagina.after_id
+    sql += " ORDER BY id"
+
+    if pagina is not None and pagina.stream:
+        return StreamingResponse(ndjson(sql, params, campos), media_type='application/x-ndjson')
+
+    cabeceras = {}
+    if pagina is not None:
+        etag, modificado = await version_listado(table, pagina)
+        cabeceras = cabeceras_validacion(etag, modificado)
+        if no_modificado(pagina.request, etag, modificado):
+            return Response(status_code=304, headers=cabeceras)
+
+    limit = pagina.limit if pagina is not None else LIST_LIMIT_DEFAULT
+    sql += " FETCH FIRST :limit ROWS ONLY"
+    params['limit'] = limit
     try:
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(f"SELECT * FROM {table}")
-                data = cursor.fetchall()
-                return [{k: v for k, v in zip(campos, row)} if campos else row for row in data]
+        data = await db_fetchall(sql, params)
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-
-def template_select_where(table, where, campos = []):
+    if pagina is not None and len(data) == limit:
+        cabeceras['X-Next-After-Id'] = str(data[-1][0])
+    filas = [dict(zip(campos, row)) for row in data] if campos else data
+    return responder(filas, pagina.response if pagina is not None else None, cabeceras)
+
+def construir_where(where, inicio=1):
+    # {'id': 5} -> "id = :1"; los valores siempre van como bind variables
+    # para que cada ruta tenga un solo texto SQL en la cache de sentencias
+    return ' AND '.join(f"{k} = :{inicio + i}" for i, k in enumerate(where))
+
+@instrumentado('template_select_where')
+async def template_select_where(table, where, campos = []):
     try:
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                print(f'SELECT * FROM {table} WHERE {where}')
-                cursor.execute(f"SELECT * FROM {table} WHERE {where}")
-                data = cursor.fetchone()
-                if(data is None):
-                    raise HTTPException(status_code=404, detail=f"{table} {where} not found")
-                return {k: v for k, v in zip(campos, data)} if campos else data
+        sql = f"SELECT {columnas(campos)} FROM {table} WHERE {construir_where(where)}"
+        log_muestreado(LOG_SAMPLE_RATE, 'template_select_where', sql=sql)
+        params = tuple(where.values())
+        if COALESCER_SELECT:
+            data = await vuelos_select.hacer((sql, params), lambda: db_fetchone(sql, params))
+        else:
+            data = await db_fetchone(sql, params)
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    if(data is None):
+        condicion = ' AND '.join(f"{k} = {v}" for k, v in where.items())
+        raise HTTPException(status_code=404, detail=f"{table} {condicion} not found")
+    return {k: v for k, v in zip(campos, data)} if campos else data
     
-def template_update(table, data, where):
+@instrumentado('template_update')
+async def template_update(table, data, where):
     try:
         set = ', '.join([f"{k} = :{i + 1}" for i, k in enumerate(data.keys())])
-        with pool.acquire() as connection:
-            connection.autocommit = True
-            with connection.cursor() as cursor:
-                cursor.execute(f"UPDATE {table} SET {set} WHERE {where}", tuple(data.values()))
+        await db_execute(f"UPDATE {table} SET {set} WHERE {construir_where(where, len(data) + 1)}", tuple(data.values()) + tuple(where.values()))
+        registrar_escritura(table, data, where)
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    # La fila como quedo; el response_model de cada ruta elige que columnas salen
+    return data
     
-def template_delete(table, where):
+@instrumentado('template_delete')
+async def template_delete(table, where):
     try:
-        with pool.acquire() as connection:
-            connection.autocommit = True
-            with connection.cursor() as cursor:
-                cursor.execute(f"DELETE FROM {table} WHERE {where}")
-            return {"message": "Record deleted"}
+        await db_execute(f"DELETE FROM {table} WHERE {construir_where(where)}", tuple(where.values()))
+        registrar_escritura(table, where=where)
+        return {"message": "Record deleted"}
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
-def template_execute(query):
+@instrumentado('template_execute')
+async def template_execute(query, params=()):
     try:
-        with pool.acquire() as connection:
-            connection.autocommit = True
-            with connection.cursor() as cursor:
-                cursor.execute(query)
-
-                #commitear
-                connection.commit()
-
-                return {"message": "Query executed"}
+        # autocommit ya confirma el bloque PL/SQL
+        await db_execute(query, params)
+        registrar_escritura_general()
+        return {"message": "Query executed"}
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
@@ -150,439 +956,1065 @@ def template_execute(query):
 # OPERACIONES
 #
 
-def transformar_datos(datos):
-    resultado = defaultdict(lambda: {"nombre_horario": "", "comentarios": [], "materias": []})
-    materias_dict = {}
-    horarios_dict = {}
-    
-    for item in datos:
-        url = item["url_compartido"]
-        resultado[url]["url_compartido"] = url
-        resultado[url]["nombre_horario"] = item["nombre_horario"]
-        
-        # Agregar comentario si no está duplicado
-        comentario = {
-            "comentario": item["comentario_horario"],
-            "fecha": item["fecha_comentario"],
-            "nombre_usuario": item["nombre_usuario_comentario"]
-        }
-        if comentario not in resultado[url]["comentarios"]:
-            resultado[url]["comentarios"].append(comentario)
-        
-        # Clave única para la materia
-        clave_materia = (url, item["id_materia"])
-        if clave_materia not in materias_dict:
-            materia = {
-                "id": item["id_materia"],
-                "nombre": item["nombre_materia"],
-                "color": item["color_materia"].lower(),
-                "descripciones": [],
-                "horarios": []
-            }
-
-            if item["descripcion_materia"]:
-                materia["descripciones"].append({
-                    "descripcion": item["descripcion_materia"],
-                    "mostrar": item["mostrar_detalle_materia"]
-                })
-
-            materias_dict[clave_materia] = materia
-            resultado[url]["materias"].append(materia)
-        
-        # Clave única para el horario
-        clave_horario = (clave_materia, item["id_horario"])
-        if clave_horario not in horarios_dict:
-            horario = {
-                "id": item["id_horario"],
-                "dia": item["dia_horario"],
-                "hora_inicio": item["hora_inicio"],
-                "hora_fin": item["hora_fin"],
-                "descripciones": []
-            }
-            if item["descripcion_horario"]:
-                horario["descripciones"].append({
-                    "descripcion": item["descripcion_horario"],
-                    "mostrar": item["mostrar_detalle_horario"]
-                })
-            horarios_dict[clave_horario] = horario
-            materias_dict[clave_materia]["horarios"].append(horario)
-    
-    return list(resultado.values())
-
-@app.get('/operacion/obtenerHorario/{url}', tags=["Operaciones"])
-def obtener_horario(url: str):
-    QUERY = f"""
-        SELECT
-            -- Información del horario compartido
-            ch.url_acesso AS url_compartido,
-            hu.nombre AS nombre_horario,
-
-            -- Información de las materias
-            m.id AS id_materia,
-            m.nombre AS nombre_materia,
-            m.color AS color_materia,
-            dm.descripcion AS descripcion_materia,
-            dm.mostrar AS mostrar_detalle_materia,
-
-            -- Información de los horarios
-            h.id AS id_horario,
-            h.dia AS dia_horario,
-            h.hora_incio AS hora_inicio,
-            h.hora_fin AS hora_fin,
-            dh.descripcion AS descripcion_horario,
-            dh.mostrar AS mostrar_detalle_horario,
-
-            -- Información de los comentarios
-            chc.comentario AS comentario_horario,
-            chc.publicado AS fecha_comentario,
-            u.nombre AS nombre_usuario_comentario
-
-        FROM
-            COMPARTIR_HORARIO ch
-            JOIN HORARIOS_USUARIOS hu ON ch.id_horario = hu.id
-            JOIN MATERIAS m ON hu.id = m.id_horario
-            LEFT JOIN DETALLES_MATERIAS dm ON m.id = dm.id_materia
-            JOIN HORARIOS h ON m.id = h.id_materia
-            LEFT JOIN DETALLES_HORARIOS dh ON h.id = dh.id_horario
-            LEFT JOIN COMENTARIOS_HORARIO chc ON hu.id = chc.id_horario
-            LEFT JOIN USUARIOS u ON chc.id_usuario = u.id
-        WHERE
-            ch.url_acesso = {url}
+# Estrategia "join": consulta unica original, una fila por combinacion
+QUERY_HORARIO_JOIN = """
+    SELECT
+        -- Información del horario compartido
+        ch.url_acesso AS url_compartido,
+        hu.nombre AS nombre_horario,
+
+        -- Información de las materias
+        m.id AS id_materia,
+        m.nombre AS nombre_materia,
+        m.color AS color_materia,
+        dm.descripcion AS descripcion_materia,
+        dm.mostrar AS mostrar_detalle_materia,
+
+        -- Información de los horarios
+        h.id AS id_horario,
+        h.dia AS dia_horario,
+        h.hora_incio AS hora_inicio,
+        h.hora_fin AS hora_fin,
+        dh.descripcion AS descripcion_horario,
+        dh.mostrar AS mostrar_detalle_horario,
+
+        -- Información de los comentarios
+        chc.comentario AS comentario_horario,
+        chc.publicado AS fecha_comentario,
+        u.nombre AS nombre_usuario_comentario,
+
+        -- Ids de las filas usadas, para invalidar la cache
+        ch.id AS id_compartir,
+        hu.id AS id_horario_usuario,
+        dm.id AS id_detalle_materia,
+        dh.id AS id_detalle_horario,
+        chc.id AS id_comentario,
+        u.id AS id_usuario_comentario
+
+    FROM
+        COMPARTIR_HORARIO ch
+        JOIN HORARIOS_USUARIOS hu ON ch.id_horario = hu.id
+        JOIN MATERIAS m ON hu.id = m.id_horario
+        LEFT JOIN DETALLES_MATERIAS dm ON m.id = dm.id_materia
+        LEFT JOIN HORARIOS h ON m.id = h.id_materia
+        LEFT JOIN DETALLES_HORARIOS dh ON h.id = dh.id_horario
+        LEFT JOIN COMENTARIOS_HORARIO chc ON hu.id = chc.id_horario
+        LEFT JOIN USUARIOS u ON chc.id_usuario = u.id
+    WHERE
+        ch.url_acesso = :url
+"""
+
+# Consultas de la estrategia "multi": cada una devuelve solo las filas de su
+# tabla, asi el volumen crece con el tamano real del horario y no con el
+# producto materias x horarios x detalles x comentarios del JOIN.
+# Se leen todas las materias para depender tambien de las que aun no tienen
+# horarios; armar_horarios las omite de la respuesta, igual que el JOIN.
+CONSULTAS_HORARIO = [
     """
-
-    CAMPOS = [
-        'url_compartido',
-        'nombre_horario',
-        'id_materia',
-        'nombre_materia',
-        'color_materia',
-        'descripcion_materia',
-        'mostrar_detalle_materia',
-        'id_horario',
-        'dia_horario',
-        'hora_inicio',
-        'hora_fin',
-        'descripcion_horario',
-        'mostrar_detalle_horario',
-        'comentario_horario',
-        'fecha_comentario',
-        'nombre_usuario_comentario'
-    ]
-
+        SELECT ch.id, ch.url_acesso, hu.id, hu.nombre
+        FROM COMPARTIR_HORARIO ch
+        JOIN HORARIOS_USUARIOS hu ON ch.id_horario = hu.id
+        WHERE ch.url_acesso = :url
+        ORDER BY ch.id
+    """,
+    """
+        SELECT m.id, m.id_horario, m.nombre, m.color
+        FROM MATERIAS m
+        WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+        ORDER BY m.id
+    """,
+    """
+        SELECT dm.id, dm.id_materia, dm.descripcion, dm.mostrar
+        FROM DETALLES_MATERIAS dm
+        JOIN MATERIAS m ON dm.id_materia = m.id
+        WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+        ORDER BY dm.id
+    """,
+    """
+        SELECT h.id, h.id_materia, h.dia, h.hora_incio, h.hora_fin
+        FROM HORARIOS h
+        JOIN MATERIAS m ON h.id_materia = m.id
+        WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+        ORDER BY h.id
+    """,
+    """
+        SELECT dh.id, dh.id_horario, dh.descripcion, dh.mostrar
+        FROM DETALLES_HORARIOS dh
+        JOIN HORARIOS h ON dh.id_horario = h.id
+        JOIN MATERIAS m ON h.id_materia = m.id
+        WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+        ORDER BY dh.id
+    """,
+    """
+        SELECT chc.id, chc.id_horario, chc.comentario, chc.publicado, u.id, u.nombre
+        FROM COMENTARIOS_HORARIO chc
+        LEFT JOIN USUARIOS u ON chc.id_usuario = u.id
+        WHERE chc.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+        ORDER BY chc.id
+    """,
+]
+
+# Estrategia "json": Oracle arma un documento por horario compartido
+QUERY_HORARIO_JSON = """
+    SELECT JSON_OBJECT(
+        'url_compartido' VALUE ch.url_acesso,
+        'nombre_horario' VALUE hu.nombre,
+        'id_compartir' VALUE ch.id,
+        'id_horario_usuario' VALUE hu.id,
+        'comentarios' VALUE (
+            SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                'id' VALUE chc.id,
+                'comentario' VALUE chc.comentario,
+                'fecha' VALUE chc.publicado,
+                'id_usuario' VALUE u.id,
+                'nombre_usuario' VALUE u.nombre
+            ) ORDER BY chc.id RETURNING CLOB)
+            FROM COMENTARIOS_HORARIO chc
+            LEFT JOIN USUARIOS u ON chc.id_usuario = u.id
+            WHERE chc.id_horario = hu.id
+        ) FORMAT JSON,
+        'materias' VALUE (
+            SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                'id' VALUE m.id,
+                'nombre' VALUE m.nombre,
+                'color' VALUE LOWER(m.color),
+                'descripciones' VALUE (
+                    SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                        'id' VALUE dm.id, 'descripcion' VALUE dm.descripcion, 'mostrar' VALUE dm.mostrar
+                    ) ORDER BY dm.id RETURNING CLOB)
+                    FROM DETALLES_MATERIAS dm WHERE dm.id_materia = m.id
+                ) FORMAT JSON,
+                'horarios' VALUE (
+                    SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                        'id' VALUE h.id,
+                        'dia' VALUE h.dia,
+                        'hora_inicio' VALUE h.hora_incio,
+                        'hora_fin' VALUE h.hora_fin,
+                        'descripciones' VALUE (
+                            SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                                'id' VALUE dh.id, 'descripcion' VALUE dh.descripcion, 'mostrar' VALUE dh.mostrar
+                            ) ORDER BY dh.id RETURNING CLOB)
+                            FROM DETALLES_HORARIOS dh WHERE dh.id_horario = h.id
+                        ) FORMAT JSON
+                    ) ORDER BY h.id RETURNING CLOB)
+                    FROM HORARIOS h WHERE h.id_materia = m.id
+                ) FORMAT JSON
+            ) ORDER BY m.id RETURNING CLOB)
+            FROM MATERIAS m
+            WHERE m.id_horario = hu.id
+        ) FORMAT JSON
+        RETURNING CLOB
+    )
+    FROM COMPARTIR_HORARIO ch
+    JOIN HORARIOS_USUARIOS hu ON ch.id_horario = hu.id
+    WHERE ch.url_acesso = :url
+    ORDER BY ch.id
+"""
+
+# Version de obtenerHorario: cantidad de filas y ORA_ROWSCN mas alto de cada
+# tabla del horario, por los mismos indices que las consultas pero sin traer
+# columnas. ORA_ROWSCN cambia con altas y modificaciones (commit mas reciente
+# del bloque) y COUNT(*) con las bajas, de cualquier proceso
+VERSION_HORARIO = """
+    SELECT 'COMPARTIR_HORARIO', COUNT(*), MAX(ch.ORA_ROWSCN)
+    FROM COMPARTIR_HORARIO ch WHERE ch.url_acesso = :url
+    UNION ALL
+    SELECT 'HORARIOS_USUARIOS', COUNT(*), MAX(hu.ORA_ROWSCN)
+    FROM HORARIOS_USUARIOS hu
+    WHERE hu.id IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+    UNION ALL
+    SELECT 'MATERIAS', COUNT(*), MAX(m.ORA_ROWSCN)
+    FROM MATERIAS m
+    WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+    UNION ALL
+    SELECT 'DETALLES_MATERIAS', COUNT(*), MAX(dm.ORA_ROWSCN)
+    FROM DETALLES_MATERIAS dm
+    JOIN MATERIAS m ON dm.id_materia = m.id
+    WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+    UNION ALL
+    SELECT 'HORARIOS', COUNT(*), MAX(h.ORA_ROWSCN)
+    FROM HORARIOS h
+    JOIN MATERIAS m ON h.id_materia = m.id
+    WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+    UNION ALL
+    SELECT 'DETALLES_HORARIOS', COUNT(*), MAX(dh.ORA_ROWSCN)
+    FROM DETALLES_HORARIOS dh
+    JOIN HORARIOS h ON dh.id_horario = h.id
+    JOIN MATERIAS m ON h.id_materia = m.id
+    WHERE m.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+    UNION ALL
+    SELECT 'COMENTARIOS_HORARIO', COUNT(*), GREATEST(MAX(chc.ORA_ROWSCN), NVL(MAX(u.ORA_ROWSCN), 0))
+    FROM COMENTARIOS_HORARIO chc
+    LEFT JOIN USUARIOS u ON chc.id_usuario = u.id
+    WHERE chc.id_horario IN (SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url)
+"""
+
+# La misma version para varias urls en un viaje (obtenerHorarios), agrupada
+# por url. url_acesso es unica, asi que cada url aporta un solo id_horario y
+# los conteos coinciden con VERSION_HORARIO; las tablas sin filas de una url
+# no aparecen y se completan con (tabla, 0, None) como en la consulta de una
+VERSION_HORARIOS = """
+    WITH ch AS (
+        SELECT url_acesso, id_horario, ORA_ROWSCN AS scn
+        FROM COMPARTIR_HORARIO WHERE url_acesso = :url
+    )
+    SELECT ch.url_acesso, 'COMPARTIR_HORARIO', COUNT(*), MAX(ch.scn)
+    FROM ch GROUP BY ch.url_acesso
+    UNION ALL
+    SELECT ch.url_acesso, 'HORARIOS_USUARIOS', COUNT(*), MAX(hu.ORA_ROWSCN)
+    FROM ch JOIN HORARIOS_USUARIOS hu ON hu.id = ch.id_horario
+    GROUP BY ch.url_acesso
+    UNION ALL
+    SELECT ch.url_acesso, 'MATERIAS', COUNT(*), MAX(m.ORA_ROWSCN)
+    FROM ch JOIN MATERIAS m ON m.id_horario = ch.id_horario
+    GROUP BY ch.url_acesso
+    UNION ALL
+    SELECT ch.url_acesso, 'DETALLES_MATERIAS', COUNT(*), MAX(dm.ORA_ROWSCN)
+    FROM ch
+    JOIN MATERIAS m ON m.id_horario = ch.id_horario
+    JOIN DETALLES_MATERIAS dm ON dm.id_materia = m.id
+    GROUP BY ch.url_acesso
+    UNION ALL
+    SELECT ch.url_acesso, 'HORARIOS', COUNT(*), MAX(h.ORA_ROWSCN)
+    FROM ch
+    JOIN MATERIAS m ON m.id_horario = ch.id_horario
+    JOIN HORARIOS h ON h.id_materia = m.id
+    GROUP BY ch.url_acesso
+    UNION ALL
+    SELECT ch.url_acesso, 'DETALLES_HORARIOS', COUNT(*), MAX(dh.ORA_ROWSCN)
+    FROM ch
+    JOIN MATERIAS m ON m.id_horario = ch.id_horario
+    JOIN HORARIOS h ON h.id_materia = m.id
+    JOIN DETALLES_HORARIOS dh ON dh.id_horario = h.id
+    GROUP BY ch.url_acesso
+    UNION ALL
+    SELECT ch.url_acesso, 'COMENTARIOS_HORARIO', COUNT(*), GREATEST(MAX(chc.ORA_ROWSCN), NVL(MAX(u.ORA_ROWSCN), 0))
+    FROM ch
+    JOIN COMENTARIOS_HORARIO chc ON chc.id_horario = ch.id_horario
+    LEFT JOIN USUARIOS u ON chc.id_usuario = u.id
+    GROUP BY ch.url_acesso
+"""
+
+async def version_horario(url):
     try:
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(QUERY)
-                data = cursor.fetchall()
-                data = [{k: v for k, v in zip(CAMPOS, row)} for row in data]
-                return transformar_datos(data)
-
+        filas = await db_fetchall(VERSION_HORARIO, {'url': url})
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    return etag_de('horario', url, sorted(tuple(fila) for fila in filas))
 
-@app.delete('/operacion/eliminarRol/{rolId}', tags=["Operaciones"])
-def eliminar_rol(rolId: int):
-
-    can_continue = False
-
-    # Verificar si el rol existe
-
+async def versiones_horario(urls, binds, params):
+    # version_horario de cada url con una sola consulta
     try:
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(f"SELECT PAPU.rol_existe({rolId}) FROM DUAL")
-                data = cursor.fetchone()[0]
-                can_continue = data == 1
+        filas = await db_fetchall(consulta_por_urls(VERSION_HORARIOS, binds), params)
     except oracledb.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    # USUARIOS no tiene fila propia: entra en la de COMENTARIOS_HORARIO
+    tablas = [tabla for tabla in PADRES_HORARIO if tabla != 'USUARIOS']
+    conteos = {url: {tabla: (tabla, 0, None) for tabla in tablas} for url in urls}
+    for url, *fila in filas:
+        conteos[url][fila[0]] = tuple(fila)
+    return {url: etag_de('horario', url, sorted(conteos[url].values())) for url in urls}
+
+def responder_horario(resultado, cuerpo, response, cabeceras):
+    # Con JSON_RAPIDO el cuerpo ya serializado (y cacheado) se envia tal cual
+    if JSON_RAPIDO:
+        return Response(cuerpo, media_type='application/json', headers=cabeceras)
+    response.headers.update(cabeceras)
+    return resultado
+
+async def cargar_horario(url, estrategia, etag=None):
+    version = version_horarios()
+    try:
+        if estrategia == 'multi':
+            resultado, dependencias = armar_horarios(*await db_fetch_varios(CONSULTAS_HORARIO, {'url': url}))
+        elif estrategia == 'json':
+            resultado, dependencias = combinar_documentos(await db_fetchall(QUERY_HORARIO_JSON, {'url': url}))
+        else:
+            resultado, dependencias = transformar_datos(await db_fetchall(QUERY_HORARIO_JOIN, {'url': url}))
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    return guardar_horario(url, resultado, dependencias, version, etag)
+
+def guardar_horario(url, resultado, dependencias, version, etag=None):
+    # etag es la version_horario leida antes de consultar: nunca es mas
+    # nueva que el contenido.
+    # El cuerpo serializado solo se usa con JSON_RAPIDO; sin el, FastAPI
+    # serializa resultado al responder y armarlo aca seria hacerlo dos veces
+    cuerpo = serializar(resultado) if JSON_RAPIDO else None
+    # Un horario vacio no tiene filas de las que depender, asi que no se
+    # cachea; tampoco uno leido mientras se escribia en sus tablas
+    if resultado and version == version_horarios():
+        horarios_cache.guardar(url, (resultado, etag, cuerpo), dependencias)
+    return resultado, etag, cuerpo
+
+async def resolver_horario(url, estrategia=None, etag=None):
+    # (resultado, etag, cuerpo) desde la base; las peticiones que llegan
+    # mientras se consulta la misma url esperan esa consulta (y su etag)
+    estrategia = estrategia or HORARIO_ESTRATEGIA
+    if COALESCER_HORARIOS:
+        return await vuelos_horario.hacer((url, estrategia), lambda: cargar_horario(url, estrategia, etag))
+    return await cargar_horario(url, estrategia, etag)
+
+def consulta_por_urls(sql, binds):
+    # La consulta de una sola url, filtrando por una lista de binds
+    return sql.replace('= :url', f'IN ({binds})')
+
+async def cargar_horarios(urls, estrategia):
+    # Todas las urls en un viaje (en multi, una consulta por tabla sobre una
+    # conexion); cada horario queda en la cache como si se hubiera pedido solo,
+    # con su ETag leido antes de consultar
+    binds, params = lista_binds(urls)
+    version = version_horarios()
+    etags = await versiones_horario(urls, binds, params)
+    try:
+        if estrategia == 'multi':
+            filas = await db_fetch_varios([consulta_por_urls(sql, binds) for sql in CONSULTAS_HORARIO], params)
+        elif estrategia == 'json':
+            filas = await db_fetchall(consulta_por_urls(QUERY_HORARIO_JSON, binds), params)
+        else:
+            filas = await db_fetchall(consulta_por_urls(QUERY_HORARIO_JOIN, binds), params)
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    grupos = repartir_por_url(estrategia, filas)
+    armar = {'multi': lambda grupo: armar_horarios(*grupo), 'json': combinar_documentos}.get(estrategia, transformar_datos)
+    return {
+        url: guardar_horario(url, *armar(grupos[url]), version, etags[url]) if url in grupos else guardar_horario(url, [], set(), version, etags[url])
+        for url in urls
+    }
+
+@app.post('/operacion/obtenerHorarios', tags=["Operaciones"])
+@instrumentado('obtener_horarios')
+async def obtener_horarios(urls: List[str], estrategia: Optional[Literal['join', 'multi', 'json']] = None):
+    # Varios horarios compartidos por url_acesso; las urls que no existen
+    # (o sin materias con horarios) quedan en null
+    urls = list(dict.fromkeys(urls))
+    if len(urls) > HORARIOS_URLS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {HORARIOS_URLS_MAX} urls per request")
+    horarios = {}
+    faltan = []
+    for url in urls:
+        cacheado = horarios_cache.obtener(url)
+        if cacheado is None:
+            faltan.append(url)
+        else:
+            horarios[url] = cacheado
+    if faltan:
+        horarios.update(await cargar_horarios(faltan, estrategia or HORARIO_ESTRATEGIA))
+    if JSON_RAPIDO:
+        # Cada cuerpo cacheado es "[{...}]" o "[]": se pegan sin volver a serializar
+        cuerpo = b','.join(serializar(url) + b':' + (horarios[url][2][1:-1] or b'null') for url in urls)
+        return Response(b'{' + cuerpo + b'}', media_type='application/json')
+    return {url: horarios[url][0][0] if horarios[url][0] else None for url in urls}
 
-    if not can_continue:
-        raise HTTPException(status_code=404, detail=f"Rol {rolId} not found")
-
-    return template_execute(f"""
+@app.get('/operacion/obtenerHorario/{url}', tags=["Operaciones"])
+@instrumentado('obtener_horario')
+async def obtener_horario(request: Request, response: Response, url: str, estrategia: Optional[Literal['join', 'multi', 'json']] = None):
+    # Last-Modified es la ultima escritura en cualquiera de las tablas del horario
+    _, modificado = ventana_actual(max(versiones_tablas.version(tabla)[1] for tabla in PADRES_HORARIO))
+    cacheado = horarios_cache.obtener(url)
+    if cacheado is None or cacheado[1] is None:
+        # Sin version en la cache se lee solo la version: si el cliente ya
+        # la tiene, 304 sin consultar el horario
+        etag = await version_horario(url)
+        if no_modificado(request, etag, modificado):
+            return Response(status_code=304, headers=cabeceras_validacion(etag, modificado))
+        cacheado = await resolver_horario(url, estrategia, etag)
+    resultado, etag, cuerpo = cacheado
+    cabeceras = cabeceras_validacion(etag, modificado)
+    if no_modificado(request, etag, modificado):
+        return Response(status_code=304, headers=cabeceras)
+    return responder_horario(resultado, cuerpo, response, cabeceras)
+
+COMENTARIOS_DESDE = """
+    SELECT id, id_horario, comentario, id_usuario, publicado
+    FROM COMENTARIOS_HORARIO
+    WHERE id_horario = :id_horario AND id > :desde
+    ORDER BY id
+"""
+
+def evento_sse(id, datos):
+    return b'id: %d\nevent: comentario\ndata: %s\n\n' % (id, serializar(datos))
+
+async def feed_comentarios(suscripcion, pendientes):
+    # Corre despues de que la ruta ya devolvio la respuesta. Solo se saltean
+    # los eventos en vivo que ya salieron en `pendientes`: las altas
+    # concurrentes se publican en cualquier orden, asi que un id menor que el
+    # ultimo enviado puede llegar despues y no se debe perder
+    template_actual.set('stream_horario')
+    try:
+        yield b'retry: 3000\n\n'
+        enviados = set()
+        for id, datos in pendientes:
+            yield evento_sse(id, datos)
+            enviados.add(id)
+        async for id, datos in suscripcion.eventos(SSE_KEEPALIVE):
+            if id is None:
+                yield b': keepalive\n\n'
+            elif id in enviados:
+                enviados.discard(id)
+            else:
+                yield evento_sse(id, datos)
+    finally:
+        comentarios_hub.cancelar(suscripcion)
+
+@app.get('/operacion/obtenerHorario/{url}/stream', tags=["Operaciones"])
+@instrumentado('stream_horario')
+async def stream_horario(request: Request, url: str, after_id: Optional[int] = Query(None, ge=0)):
+    # Server-sent events con los comentarios nuevos del horario. Al reconectar,
+    # Last-Event-ID (o ?after_id) reenvia lo que se perdio: desde el historial
+    # en memoria si alcanza, si no con una consulta
+    ultimo = request.headers.get('last-event-id', '')
+    ultimo = int(ultimo) if ultimo.isdigit() else after_id
+    try:
+        compartido = await db_fetchone("SELECT id_horario FROM COMPARTIR_HORARIO WHERE url_acesso = :url", {'url': url})
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    if compartido is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    id_horario = compartido[0]
+
+    # Suscribirse antes de buscar lo perdido: lo que llegue mientras tanto
+    # queda en la cola y los repetidos se saltean por id
+    suscripcion = comentarios_hub.suscribir(id_horario)
+    pendientes = []
+    if ultimo is not None:
+        pendientes = comentarios_hub.recientes(id_horario, ultimo)
+        if pendientes is None:
+            try:
+                filas = await db_fetchall(COMENTARIOS_DESDE, {'id_horario': id_horario, 'desde': ultimo})
+            except oracledb.Error as e:
+                comentarios_hub.cancelar(suscripcion)
+                raise HTTPException(status_code=500, detail=f"Database error: {e}")
+            campos = ['id', 'id_horario', 'comentario', 'id_usuario', 'publicado']
+            pendientes = [(fila[0], dict(zip(campos, fila))) for fila in filas]
+    return StreamingResponse(
+        feed_comentarios(suscripcion, pendientes),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+# Franjas de varios HORARIOS_USUARIOS en una consulta. El LEFT JOIN trae
+# tambien las materias sin franjas, para depender de ellas en la cache
+FRANJAS_DE_HORARIOS = """
+    SELECT m.id_horario, m.id, h.id, h.dia, h.hora_incio, h.hora_fin
+    FROM MATERIAS m
+    LEFT JOIN HORARIOS h ON h.id_materia = m.id
+    WHERE m.id_horario IN ({binds})
+"""
+
+async def cargar_franjas(ids_horario):
+    # {id_horario: (IndiceFranjas, {id franja: id_materia})}. Cada indice se
+    # guarda en horarios_cache con clave ('franjas', id_horario): las
+    # escrituras en MATERIAS y HORARIOS lo invalidan como a obtenerHorario
+    indices = {}
+    faltan = []
+    for id_horario in ids_horario:
+        cacheado = horarios_cache.obtener(('franjas', id_horario))
+        if cacheado is None:
+            faltan.append(id_horario)
+        else:
+            indices[id_horario] = cacheado
+    filas = defaultdict(list)
+    version = version_horarios()
+    try:
+        for inicio in range(0, len(faltan), 1000):
+            binds, params = lista_binds(faltan[inicio:inicio + 1000])
+            for fila in await db_fetchall(FRANJAS_DE_HORARIOS.format(binds=binds), params):
+                filas[fila[0]].append(fila[1:])
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    for id_horario in faltan:
+        franjas = [fila for fila in filas[id_horario] if fila[1] is not None]
+        indice = IndiceFranjas((id, dia, inicio, fin) for _, id, dia, inicio, fin in franjas)
+        materias = {id: id_materia for id_materia, id, _, _, _ in franjas}
+        dependencias = {('HORARIOS_USUARIOS', id_horario)}
+        dependencias.update(('MATERIAS', fila[0]) for fila in filas[id_horario])
+        dependencias.update(('HORARIOS', id) for id in materias)
+        if version == version_horarios():
+            horarios_cache.guardar(('franjas', id_horario), (indice, materias), dependencias)
+        indices[id_horario] = (indice, materias)
+    return indices
+
+def parsear_hora(nombre, valor):
+    try:
+        return minutos(valor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{nombre}: {e}")
+
+@app.get('/operacion/conflictos/{id_horario}', tags=["Operaciones"])
+@instrumentado('conflictos')
+async def conflictos(id_horario: int, con: str = ''):
+    # Franjas del horario que se pisan entre si y, con ?con=2,3, con las de
+    # otros horarios de usuario
+    otros = [id for id in parsear_ids(con) if id != id_horario]
+    indices = await cargar_franjas([id_horario] + otros)
+    indice, materias = indices[id_horario]
+    propias = set(materias)
+    if otros:
+        indice = IndiceFranjas.unir([indices[id][0] for id in [id_horario] + otros])
+    duenos = {id: (id_horario_franja, id_materia)
+              for id_horario_franja, (_, materias_horario) in indices.items()
+              for id, id_materia in materias_horario.items()}
+
+    def franja(id):
+        dueno, id_materia = duenos[id]
+        return {"id": id, "id_horario": dueno, "id_materia": id_materia}
+
+    return responder({
+        "id_horario": id_horario,
+        "conflictos": [
+            {"dia": dia, "desde": hora(desde), "hasta": hora(hasta), "franjas": [franja(a), franja(b)]}
+            for dia, a, b, desde, hasta in indice.solapamientos(propias)
+        ],
+    })
+
+@app.get('/operacion/huecosLibres', tags=["Operaciones"])
+@instrumentado('huecos_libres')
+async def huecos_libres(horarios: str, duracion: int = Query(30, ge=1), desde: str = '07:00', hasta: str = '22:00', dias: str = 'LMXJV'):
+    # Intervalos en los que ninguno de los horarios de usuario tiene clase
+    ids = parsear_ids(horarios)
+    if not ids:
+        raise HTTPException(status_code=400, detail="horarios must list at least one id")
+    inicio, fin = parsear_hora('desde', desde), parsear_hora('hasta', hasta)
+    if fin <= inicio:
+        raise HTTPException(status_code=400, detail="hasta must be after desde")
+    indices = await cargar_franjas(ids)
+    ocupado = IndiceFranjas.unir([indice for indice, _ in indices.values()])
+    return responder({
+        "horarios": ids,
+        "huecos": {
+            dia: [
+                {"hora_inicio": hora(libre_desde), "hora_fin": hora(libre_hasta), "minutos": libre_hasta - libre_desde}
+                for libre_desde, libre_hasta in ocupado.huecos(dia, inicio, fin, duracion)
+            ]
+            for dia in sorted(dict.fromkeys(dia for dia in dias.upper() if dia.isalpha()), key=orden_dia)
+        },
+    })
+
+@app.post('/operacion/login', tags=["Operaciones"])
+@instrumentado('login')
+async def login(credenciales: Credenciales):
+    # Devuelve el usuario y un token firmado con su id y su id_rol, para
+    # Authorization: Bearer; 401 sin distinguir email inexistente de clave erronea
+    try:
+        usuario = await db_fetchone(
+            "SELECT id, id_rol, nombre, contrasena FROM USUARIOS WHERE email = :email ORDER BY id",
+            {'email': credenciales.email},
+        )
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    verificar_pool_contrasenas()
+    valida, rehashear = await pool_contrasenas.verificar(credenciales.contrasena, usuario[3] if usuario else None)
+    if not valida:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    id, id_rol, nombre, _ = usuario
+    if rehashear:
+        # Contrasenas en texto plano (o con otro costo) se actualizan al entrar
+        nuevo = await pool_contrasenas.hashear(credenciales.contrasena)
+        await template_update('USUARIOS', {'contrasena': nuevo}, {'id': id})
+    return {"id": id, "id_rol": id_rol, "nombre": nombre, "token": emitir_token(id, id_rol, TOKEN_SECRETO, TOKEN_VIGENCIA)}
+
+# Borra todo lo que cuelga de los horarios de usuario en v_horarios. Cada
+# conjunto de ids (materias, franjas) se resuelve una vez en una ID_LISTA y
+# todos los DELETE lo reutilizan en vez de repetir los JOIN.
+BLOQUE_ELIMINAR_HORARIOS = """
+            SELECT id BULK COLLECT INTO v_materias FROM MATERIAS
+            WHERE id_horario IN (SELECT COLUMN_VALUE FROM TABLE(v_horarios));
+
+            SELECT id BULK COLLECT INTO v_franjas FROM HORARIOS
+            WHERE id_materia IN (SELECT COLUMN_VALUE FROM TABLE(v_materias));
+
+            DELETE FROM DETALLES_HORARIOS WHERE id_horario IN (SELECT COLUMN_VALUE FROM TABLE(v_franjas));
+            DELETE FROM HORARIOS WHERE id IN (SELECT COLUMN_VALUE FROM TABLE(v_franjas));
+            DELETE FROM DETALLES_MATERIAS WHERE id_materia IN (SELECT COLUMN_VALUE FROM TABLE(v_materias));
+            DELETE FROM MATERIAS WHERE id IN (SELECT COLUMN_VALUE FROM TABLE(v_materias));
+            DELETE FROM COMPARTIR_HORARIO WHERE id_horario IN (SELECT COLUMN_VALUE FROM TABLE(v_horarios));
+            DELETE FROM COMENTARIOS_HORARIO WHERE id_horario IN (SELECT COLUMN_VALUE FROM TABLE(v_horarios));
+            DELETE FROM HORARIOS_USUARIOS WHERE id IN (SELECT COLUMN_VALUE FROM TABLE(v_horarios));
+"""
+
+# Operación Eliminar Rol en un solo viaje: valida el rol (ORA-20404 si no
+# existe), resuelve usuarios y horarios una vez y borra en cascada
+ELIMINAR_ROL = """
+        DECLARE
+            v_existe NUMBER;
+            v_usuarios ID_LISTA;
+            v_horarios ID_LISTA;
+            v_materias ID_LISTA;
+            v_franjas ID_LISTA;
         BEGIN
+            SELECT COUNT(1) INTO v_existe FROM ROLES WHERE id = :rol_id;
+            IF v_existe = 0 THEN
+                RAISE_APPLICATION_ERROR(-20404, 'Rol no encontrado');
+            END IF;
+
             -- Iniciar la transacción
             SAVEPOINT inicio_transaccion;
-                            
-            -- 1. Eliminar detalles de horarios relacionados con el rol
-            DELETE FROM DETALLES_HORARIOS
-            WHERE id_horario IN (
-                SELECT h.id
-                FROM HORARIOS h
-                JOIN MATERIAS m ON h.id_materia = m.id
-                JOIN HORARIOS_USUARIOS hu ON m.id_horario = hu.id
-                JOIN USUARIOS u ON hu.id_usuario = u.id
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 2. Eliminar horarios relacionados con el rol
-            DELETE FROM HORARIOS
-            WHERE id_materia IN (
-                SELECT m.id
-                FROM MATERIAS m
-                JOIN HORARIOS_USUARIOS hu ON m.id_horario = hu.id
-                JOIN USUARIOS u ON hu.id_usuario = u.id
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 3. Eliminar detalles de materias relacionados con el rol
-            DELETE FROM DETALLES_MATERIAS
-            WHERE id_materia IN (
-                SELECT m.id
-                FROM MATERIAS m
-                JOIN HORARIOS_USUARIOS hu ON m.id_horario = hu.id
-                JOIN USUARIOS u ON hu.id_usuario = u.id
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 4. Eliminar materias relacionadas con el rol
-            DELETE FROM MATERIAS
-            WHERE id_horario IN (
-                SELECT hu.id
-                FROM HORARIOS_USUARIOS hu
-                JOIN USUARIOS u ON hu.id_usuario = u.id
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 5. Eliminar compartir horario relacionados con el rol
-            DELETE FROM COMPARTIR_HORARIO
-            WHERE id_horario IN (
-                SELECT hu.id
-                FROM HORARIOS_USUARIOS hu
-                JOIN USUARIOS u ON hu.id_usuario = u.id
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 6. Eliminar comentarios de horario relacionados con el rol
-            DELETE FROM COMENTARIOS_HORARIO
-            WHERE id_horario IN (
-                SELECT hu.id
-                FROM HORARIOS_USUARIOS hu
-                JOIN USUARIOS u ON hu.id_usuario = u.id
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 7. Eliminar horarios de usuarios relacionados con el rol
-            DELETE FROM HORARIOS_USUARIOS
-            WHERE id_usuario IN (
-                SELECT u.id
-                FROM USUARIOS u
-                WHERE u.id_rol = {rolId}
-            );
-
-            -- 8. Eliminar usuarios relacionados con el rol
-            DELETE FROM USUARIOS
-            WHERE id_rol = {rolId};
-
-            -- 9. Eliminar permisos relacionados con el rol
-            DELETE FROM PERMISOS
-            WHERE id_rol = {rolId};
-
-            -- 10. Finalmente, eliminar el rol
-            DELETE FROM ROLES
-            WHERE id = {rolId};
-
-            -- Confirmar la transacción si todo fue exitoso
-            COMMIT;
+
+            SELECT id BULK COLLECT INTO v_usuarios FROM USUARIOS WHERE id_rol = :rol_id;
+            SELECT id BULK COLLECT INTO v_horarios FROM HORARIOS_USUARIOS
+            WHERE id_usuario IN (SELECT COLUMN_VALUE FROM TABLE(v_usuarios));
+""" + BLOQUE_ELIMINAR_HORARIOS + """
+            DELETE FROM USUARIOS WHERE id IN (SELECT COLUMN_VALUE FROM TABLE(v_usuarios));
+            DELETE FROM PERMISOS WHERE id_rol = :rol_id;
+            DELETE FROM ROLES WHERE id = :rol_id;
         EXCEPTION
             WHEN OTHERS THEN
                 -- Si ocurre algún error, deshacer todos los cambios
-                ROLLBACK TO inicio_transaccion;
+                IF SQLCODE != -20404 THEN
+                    ROLLBACK TO inicio_transaccion;
+                END IF;
                 RAISE;  -- Relanzar la excepción para notificar el error
         END;
-    """)
+"""
+
+# Modo por lotes: un bloque por grupo de horarios, con commit entre grupos
+ELIMINAR_HORARIOS_LOTE = """
+        DECLARE
+            v_horarios ID_LISTA := :horarios;
+            v_materias ID_LISTA;
+            v_franjas ID_LISTA;
+        BEGIN
+""" + BLOQUE_ELIMINAR_HORARIOS + """
+        END;
+"""
+
+ELIMINAR_ROL_FINAL = """
+        BEGIN
+            DELETE FROM USUARIOS WHERE id_rol = :rol_id;
+            DELETE FROM PERMISOS WHERE id_rol = :rol_id;
+            DELETE FROM ROLES WHERE id = :rol_id;
+        END;
+"""
+
+HORARIOS_DEL_ROL = """
+    SELECT hu.id
+    FROM HORARIOS_USUARIOS hu
+    JOIN USUARIOS u ON hu.id_usuario = u.id
+    WHERE u.id_rol = :rol_id
+    ORDER BY hu.id
+"""
+
+def eliminar_rol_lotes_sync(rol_id, lote):
+    with acquire_sync() as connection:
+        connection.autocommit = False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(1) FROM ROLES WHERE id = :rol_id", {'rol_id': rol_id})
+            if cursor.fetchone()[0] == 0:
+                yield None
+                return
+            cursor.execute(HORARIOS_DEL_ROL, {'rol_id': rol_id})
+            horarios = [id for id, in cursor.fetchall()]
+            tipo = connection.gettype("ID_LISTA")
+            for inicio in range(0, len(horarios), lote):
+                cursor.execute(ELIMINAR_HORARIOS_LOTE, {'horarios': tipo.newobject(horarios[inicio:inicio + lote])})
+                connection.commit()
+                yield {"horarios_eliminados": min(inicio + lote, len(horarios)), "total": len(horarios)}
+            cursor.execute(ELIMINAR_ROL_FINAL, {'rol_id': rol_id})
+            connection.commit()
+
+async def eliminar_rol_lotes(rol_id, lote):
+    # Genera None si el rol no existe y luego un dict de progreso por lote
+    if not ASYNC_MODE:
+        pasos = eliminar_rol_lotes_sync(rol_id, lote)
+        try:
+            while True:
+                paso = await run_in_threadpool(next, pasos, False)
+                if paso is False:
+                    break
+                yield paso
+        finally:
+            pasos.close()
+        return
+    async with acquire_async() as connection:
+        connection.autocommit = False
+        with connection.cursor() as cursor:
+            await cursor.execute("SELECT COUNT(1) FROM ROLES WHERE id = :rol_id", {'rol_id': rol_id})
+            if (await cursor.fetchone())[0] == 0:
+                yield None
+                return
+            await cursor.execute(HORARIOS_DEL_ROL, {'rol_id': rol_id})
+            horarios = [id for id, in await cursor.fetchall()]
+            tipo = await connection.gettype("ID_LISTA")
+            for inicio in range(0, len(horarios), lote):
+                await cursor.execute(ELIMINAR_HORARIOS_LOTE, {'horarios': tipo.newobject(horarios[inicio:inicio + lote])})
+                await connection.commit()
+                yield {"horarios_eliminados": min(inicio + lote, len(horarios)), "total": len(horarios)}
+            await cursor.execute(ELIMINAR_ROL_FINAL, {'rol_id': rol_id})
+            await connection.commit()
+
+async def progreso_eliminar_rol(pasos):
+    # Cada lote ya confirmado queda borrado aunque falle uno posterior
+    try:
+        async for paso in pasos:
+            registrar_escritura_general()
+            yield json.dumps(paso) + '\n'
+        yield json.dumps({"message": "Query executed"}) + '\n'
+    except oracledb.Error as e:
+        yield json.dumps({"error": f"Database error: {e}"}) + '\n'
+
+@app.delete('/operacion/eliminarRol/{rolId}', tags=["Operaciones"])
+@instrumentado('eliminar_rol')
+async def eliminar_rol(rolId: int, lote: Optional[int] = Query(None, ge=1)):
+    if lote is None:
+        try:
+            await db_execute(ELIMINAR_ROL, {'rol_id': rolId})
+        except oracledb.Error as e:
+            error, = e.args
+            if error.code == 20404:
+                raise HTTPException(status_code=404, detail=f"Rol {rolId} not found")
+            raise HTTPException(status_code=500, detail=f"Database error: {e}")
+        registrar_escritura_general()
+        return {"message": "Query executed"}
+
+    # Con ?lote=N se confirma cada N horarios y se informa el avance en NDJSON
+    pasos = eliminar_rol_lotes(rolId, lote)
+    try:
+        primero = await pasos.__anext__()
+    except StopAsyncIteration:
+        primero = {"horarios_eliminados": 0, "total": 0}
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    if primero is None:
+        await pasos.aclose()
+        raise HTTPException(status_code=404, detail=f"Rol {rolId} not found")
+
+    async def con_primero():
+        yield primero
+        async for paso in pasos:
+            yield paso
+
+    return StreamingResponse(progreso_eliminar_rol(con_primero()), media_type='application/x-ndjson')
+
+#
+# ADMIN
+#
+
+@app.get('/metrics', tags=["Admin"], response_class=PlainTextResponse)
+async def metricas():
+    return PlainTextResponse(exponer(), media_type='text/plain; version=0.0.4')
+
+@app.get('/admin/pool', tags=["Admin"])
+async def estado_pool():
+    return pool_stats.resumen(async_pool if ASYNC_MODE else pool)
+
+# EXPLAIN PLAN de las consultas principales; los binds solo dan forma al texto
+CONSULTAS_EXPLICADAS = {
+    'obtener_horario_join': QUERY_HORARIO_JOIN,
+    'obtener_horario_json': QUERY_HORARIO_JSON,
+    **{f'obtener_horario_multi_{i + 1}': sql for i, sql in enumerate(CONSULTAS_HORARIO)},
+}
+PLAN = "SELECT plan_table_output FROM TABLE(DBMS_XPLAN.DISPLAY(NULL, NULL, 'BASIC'))"
+
+def explicar_consultas_sync():
+    # Con una conexion del pool; las filas que EXPLAIN PLAN deja en
+    # PLAN_TABLE se descartan con el rollback antes de devolverla
+    planes = {}
+    with acquire_sync() as connection:
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                for nombre, sql in CONSULTAS_EXPLICADAS.items():
+                    try:
+                        cursor.execute(f"EXPLAIN PLAN FOR {sql}", {'url': ''})
+                        cursor.execute(PLAN)
+                        planes[nombre] = [linea for linea, in cursor.fetchall()]
+                    except oracledb.Error as e:
+                        planes[nombre] = [f"Database error: {e}"]
+                cursor.execute(INDICES_EXISTENTES)
+                return {"indices_faltantes": indices_faltantes(cursor.fetchall()), "planes": planes}
+        finally:
+            connection.rollback()
+
+async def explicar_consultas():
+    if not ASYNC_MODE:
+        return await run_in_threadpool(explicar_consultas_sync)
+    planes = {}
+    async with acquire_async() as connection:
+        connection.autocommit = False
+        try:
+            with connection.cursor() as cursor:
+                for nombre, sql in CONSULTAS_EXPLICADAS.items():
+                    try:
+                        await cursor.execute(f"EXPLAIN PLAN FOR {sql}", {'url': ''})
+                        await cursor.execute(PLAN)
+                        planes[nombre] = [linea for linea, in await cursor.fetchall()]
+                    except oracledb.Error as e:
+                        planes[nombre] = [f"Database error: {e}"]
+                await cursor.execute(INDICES_EXISTENTES)
+                return {"indices_faltantes": indices_faltantes(await cursor.fetchall()), "planes": planes}
+        finally:
+            await connection.rollback()
+
+@app.get('/admin/explain', tags=["Admin"])
+async def explicar_planes():
+    try:
+        return await explicar_consultas()
+    except oracledb.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+
+@app.get('/admin/cache', tags=["Admin"])
+async def estado_cache():
+    return horarios_cache.resumen()
 
 #
 # ROLES
 #
 
-@app.post('/roles/', response_model=Roles, tags=["Roles"])
-def create_rol(rol: Roles):
-    return template_create('ROLES', rol.dict())
+@app.post('/roles/', tags=["Roles"])
+async def create_rol(rol: Roles):
+    return await template_create('ROLES', rol.dict())
+
+@app.post('/roles/bulk', tags=["Roles"])
+async def create_rol_bulk(datos: List[Roles], atomico: bool = False):
+    return await template_create_bulk('ROLES', [dato.dict() for dato in datos], atomico)
 
 @app.get('/roles/', tags=["Roles"])
-def get_roles():
-    return template_select('ROLES', ['id', 'nombre'])
+async def get_roles(pagina: Paginacion = Depends()):
+    return await template_select('ROLES', ['id', 'nombre'], pagina)
 
 @app.get('/roles/{rol_id}', response_model=Roles, tags=["Roles"])
-def get_rol(rol_id: int):
-    return template_select_where('ROLES', f'id = {rol_id}', ['id', 'nombre'])
+async def get_rol(rol_id: int):
+    return await template_select_where('ROLES', {'id': rol_id}, ['id', 'nombre'])
 
 @app.put('/roles/{rol_id}', response_model=Roles, tags=["Roles"])
-def update_rol(rol_id: int, rol: Roles):
-    return template_update('ROLES', rol.dict(), f'id = {rol_id}')
+async def update_rol(rol_id: int, rol: Roles):
+    return await template_update('ROLES', rol.dict(), {'id': rol_id})
 
 @app.delete('/roles/{rol_id}', tags=["Roles"])
-def delete_rol(rol_id: int):
-    return template_delete('ROLES', f'id = {rol_id}')
+async def delete_rol(rol_id: int):
+    return await template_delete('ROLES', {'id': rol_id})
 
 #
 # PERMISOS
 #
 
-@app.post('/permisos/', response_model=Permisos, tags=["Permisos"])
-def create_permiso(permiso: Permisos):
-    return template_create('PERMISOS', permiso.dict())
+@app.post('/permisos/', tags=["Permisos"])
+async def create_permiso(permiso: Permisos):
+    return await template_create('PERMISOS', permiso.dict())
+
+@app.post('/permisos/bulk', tags=["Permisos"])
+async def create_permiso_bulk(datos: List[Permisos], atomico: bool = False):
+    return await template_create_bulk('PERMISOS', [dato.dict() for dato in datos], atomico)
 
 @app.get('/permisos/', tags=["Permisos"])
-def get_permisos():
-    return template_select('PERMISOS', ['id', 'id_rol', 'leer', 'escribir', 'eliminar', 'modificar', 'tabla'])
+async def get_permisos(pagina: Paginacion = Depends()):
+    return await template_select('PERMISOS', ['id', 'id_rol', 'leer', 'escribir', 'eliminar', 'modificar', 'tabla'], pagina)
 
 @app.get('/permisos/{permiso_id}', response_model=Permisos, tags=["Permisos"])
-def get_permiso(permiso_id: int):
-    return template_select_where('PERMISOS', f'id = {permiso_id}', ['id', 'id_rol', 'leer', 'escribir', 'eliminar', 'modificar', 'tabla'])
+async def get_permiso(permiso_id: int):
+    return await template_select_where('PERMISOS', {'id': permiso_id}, ['id', 'id_rol', 'leer', 'escribir', 'eliminar', 'modificar', 'tabla'])
 
 @app.put('/permisos/{permiso_id}', response_model=Permisos, tags=["Permisos"])
-def update_permiso(permiso_id: int, permiso: Permisos):
-    return template_update('PERMISOS', permiso.dict(), f'id = {permiso_id}')
+async def update_permiso(permiso_id: int, permiso: Permisos):
+    return await template_update('PERMISOS', permiso.dict(), {'id': permiso_id})
 
 @app.delete('/permisos/{permiso_id}', tags=["Permisos"])
-def delete_permiso(permiso_id: int):
-    return template_delete('PERMISOS', f'id = {permiso_id}')
+async def delete_permiso(permiso_id: int):
+    return await template_delete('PERMISOS', {'id': permiso_id})
 
 #
 # USUARIOS
 #
 
-@app.post('/usuarios/', response_model=Usuarios, tags=["Usuarios"])
-def create_usuario(usuario: Usuarios):
-    return template_create('USUARIOS', usuario.dict())
+# La contrasena se guarda como hash scrypt y ninguna ruta la devuelve
+
+def verificar_pool_contrasenas():
+    if pool_contrasenas.ocupado():
+        raise HTTPException(status_code=503, detail="Password hashing busy", headers={'Retry-After': '1'})
+
+def sin_contrasena(fila):
+    return {campo: valor for campo, valor in fila.items() if campo != 'contrasena'}
+
+@app.post('/usuarios/', tags=["Usuarios"])
+async def create_usuario(usuario: Usuarios):
+    verificar_pool_contrasenas()
+    data = usuario.dict()
+    data['contrasena'] = await pool_contrasenas.hashear(data['contrasena'])
+    return sin_contrasena(await template_create('USUARIOS', data))
+
+@app.post('/usuarios/bulk', tags=["Usuarios"])
+async def create_usuario_bulk(datos: List[Usuarios], atomico: bool = False):
+    verificar_pool_contrasenas()
+    datos = [dato.dict() for dato in datos]
+    hashes = await pool_contrasenas.hashear_varias([data['contrasena'] for data in datos])
+    for data, contrasena in zip(datos, hashes):
+        data['contrasena'] = contrasena
+    resultado = await template_create_bulk('USUARIOS', datos, atomico)
+    resultado['filas'] = [sin_contrasena(fila) for fila in resultado['filas']]
+    return resultado
 
 @app.get('/usuarios/', tags=["Usuarios"])
-def get_usuarios():
-    return template_select('USUARIOS', ['id', 'id_rol', 'nombre', 'email', 'contrasena'])
+async def get_usuarios(pagina: Paginacion = Depends()):
+    return await template_select('USUARIOS', ['id', 'id_rol', 'nombre', 'email'], pagina)
 
-@app.get('/usuarios/{usuario_id}', response_model=Usuarios, tags=["Usuarios"])
-def get_usuario(usuario_id: int):
-    return template_select_where('USUARIOS', f'id = {usuario_id}', ['id', 'id_rol', 'nombre', 'email', 'contrasena'])
+@app.get('/usuarios/{usuario_id}', response_model=UsuariosPublicos, tags=["Usuarios"])
+async def get_usuario(usuario_id: int):
+    return await template_select_where('USUARIOS', {'id': usuario_id}, ['id', 'id_rol', 'nombre', 'email'])
 
-@app.put('/usuarios/{usuario_id}', response_model=Usuarios, tags=["Usuarios"])
-def update_usuario(usuario_id: int, usuario: Usuarios):
-    return template_update('USUARIOS', usuario.dict(), f'id = {usuario_id}')
+@app.put('/usuarios/{usuario_id}', response_model=UsuariosPublicos, tags=["Usuarios"])
+async def update_usuario(usuario_id: int, usuario: Usuarios):
+    verificar_pool_contrasenas()
+    data = usuario.dict()
+    data['contrasena'] = await pool_contrasenas.hashear(data['contrasena'])
+    await template_update('USUARIOS', data, {'id': usuario_id})
+    return sin_contrasena(data)
 
 @app.delete('/usuarios/{usuario_id}', tags=["Usuarios"])
-def delete_usuario(usuario_id: int):
-    return template_delete('USUARIOS', f'id = {usuario_id}')
+async def delete_usuario(usuario_id: int):
+    return await template_delete('USUARIOS', {'id': usuario_id})
 
 #
 # HORARIOS USUARIOS
 #
 
-@app.post('/horarios_usuarios/', response_model=HorariosUsuarios, tags=["HorariosUsuarios"])
-def create_horario_usuario(horario_usuario: HorariosUsuarios):
-    return template_create('HORARIOS_USUARIOS', horario_usuario.dict())
+@app.post('/horarios_usuarios/', tags=["HorariosUsuarios"])
+async def create_horario_usuario(horario_usuario: HorariosUsuarios):
+    return await template_create('HORARIOS_USUARIOS', horario_usuario.dict())
+
+@app.post('/horarios_usuarios/bulk', tags=["HorariosUsuarios"])
+async def create_horario_usuario_bulk(datos: List[HorariosUsuarios], atomico: bool = False):
+    return await template_create_bulk('HORARIOS_USUARIOS', [dato.dict() for dato in datos], atomico)
 
 @app.get('/horarios_usuarios/', tags=["HorariosUsuarios"])
-def get_horarios_usuarios():
-    return template_select('HORARIOS_USUARIOS', ['id', 'id_usuario', 'nombre'])
+async def get_horarios_usuarios(pagina: Paginacion = Depends()):
+    return await template_select('HORARIOS_USUARIOS', ['id', 'id_usuario', 'nombre'], pagina)
 
 @app.get('/horarios_usuarios/{horario_usuario_id}', response_model=HorariosUsuarios, tags=["HorariosUsuarios"])
-def get_horario_usuario(horario_usuario_id: int):
-    return template_select_where('HORARIOS_USUARIOS', f'id = {horario_usuario_id}', ['id', 'id_usuario', 'nombre'])
+async def get_horario_usuario(horario_usuario_id: int):
+    return await template_select_where('HORARIOS_USUARIOS', {'id': horario_usuario_id}, ['id', 'id_usuario', 'nombre'])
 
 @app.put('/horarios_usuarios/{horario_usuario_id}', response_model=HorariosUsuarios, tags=["HorariosUsuarios"])
-def update_horario_usuario(horario_usuario_id: int, horario_usuario: HorariosUsuarios):
-    return template_update('HORARIOS_USUARIOS', horario_usuario.dict(), f'id = {horario_usuario_id}')
+async def update_horario_usuario(horario_usuario_id: int, horario_usuario: HorariosUsuarios):
+    return await template_update('HORARIOS_USUARIOS', horario_usuario.dict(), {'id': horario_usuario_id})
 
 @app.delete('/horarios_usuarios/{horario_usuario_id}', tags=["HorariosUsuarios"])
-def delete_horario_usuario(horario_usuario_id: int):
-    return template_delete('HORARIOS_USUARIOS', f'id = {horario_usuario_id}')
+async def delete_horario_usuario(horario_usuario_id: int):
+    return await template_delete('HORARIOS_USUARIOS', {'id': horario_usuario_id})
 
 #
 # MATERIAS
 #
 
-@app.post('/materias/', response_model=Materias, tags=["Materias"])
-def create_materia(materia: Materias):
-    return template_create('MATERIAS', materia.dict())
+@app.post('/materias/', tags=["Materias"])
+async def create_materia(materia: Materias):
+    return await template_create('MATERIAS', materia.dict())
+
+@app.post('/materias/bulk', tags=["Materias"])
+async def create_materia_bulk(datos: List[Materias], atomico: bool = False):
+    return await template_create_bulk('MATERIAS', [dato.dict() for dato in datos], atomico)
 
 @app.get('/materias/', tags=["Materias"])
-def get_materias():
-    return template_select('MATERIAS', ['id', 'id_horario', 'nombre', 'color'])
+async def get_materias(pagina: Paginacion = Depends()):
+    return await template_select('MATERIAS', ['id', 'id_horario', 'nombre', 'color'], pagina)
 
 @app.get('/materias/{materia_id}', response_model=Materias, tags=["Materias"])
-def get_materia(materia_id: int):
-    return template_select_where('MATERIAS', f'id = {materia_id}', ['id', 'id_horario', 'nombre', 'color'])
+async def get_materia(materia_id: int):
+    return await template_select_where('MATERIAS', {'id': materia_id}, ['id', 'id_horario', 'nombre', 'color'])
 
 @app.put('/materias/{materia_id}', response_model=Materias, tags=["Materias"])
-def update_materia(materia_id: int, materia: Materias):
-    return template_update('MATERIAS', materia.dict(), f'id = {materia_id}')
+async def update_materia(materia_id: int, materia: Materias):
+    return await template_update('MATERIAS', materia.dict(), {'id': materia_id})
 
 @app.delete('/materias/{materia_id}', tags=["Materias"])
-def delete_materia(materia_id: int):
-    return template_delete('MATERIAS', f'id = {materia_id}')
+async def delete_materia(materia_id: int):
+    return await template_delete('MATERIAS', {'id': materia_id})
 
 #
 # DETALLES MATERIAS
 #
 
-@app.post('/detalles_materias/', response_model=DetallesMaterias, tags=["DetallesMaterias"])
-def create_detalle_materia(detalle_materia: DetallesMaterias):
-    return template_create('DETALLES_MATERIAS', detalle_materia.dict())
+@app.post('/detalles_materias/', tags=["DetallesMaterias"])
+async def create_detalle_materia(detalle_materia: DetallesMaterias):
+    return await template_create('DETALLES_MATERIAS', detalle_materia.dict())
+
+@app.post('/detalles_materias/bulk', tags=["DetallesMaterias"])
+async def create_detalle_materia_bulk(datos: List[DetallesMaterias], atomico: bool = False):
+    return await template_create_bulk('DETALLES_MATERIAS', [dato.dict() for dato in datos], atomico)
 
 @app.get('/detalles_materias/', tags=["DetallesMaterias"])
-def get_detalles_materias():
-    return template_select('DETALLES_MATERIAS', ['id', 'id_materia', 'descripcion', 'mostrar'])
+async def get_detalles_materias(pagina: Paginacion = Depends()):
+    return await template_select('DETALLES_MATERIAS', ['id', 'id_materia', 'descripcion', 'mostrar'], pagina)
 
 @app.get('/detalles_materias/{detalle_materia_id}', response_model=DetallesMaterias, tags=["DetallesMaterias"])
-def get_detalle_materia(detalle_materia_id: int):
-    return template_select_where('DETALLES_MATERIAS', f'id = {detalle_materia_id}', ['id', 'id_materia', 'descripcion', 'mostrar'])
+async def get_detalle_materia(detalle_materia_id: int):
+    return await template_select_where('DETALLES_MATERIAS', {'id': detalle_materia_id}, ['id', 'id_materia', 'descripcion', 'mostrar'])
 
 @app.put('/detalles_materias/{detalle_materia_id}', response_model=DetallesMaterias, tags=["DetallesMaterias"])
-def update_detalle_materia(detalle_materia_id: int, detalle_materia: DetallesMaterias):
-    return template_update('DETALLES_MATERIAS', detalle_materia.dict(), f'id = {detalle_materia_id}')
+async def update_detalle_materia(detalle_materia_id: int, detalle_materia: DetallesMaterias):
+    return await template_update('DETALLES_MATERIAS', detalle_materia.dict(), {'id': detalle_materia_id})
 
 @app.delete('/detalles_materias/{detalle_materia_id}', tags=["DetallesMaterias"])
-def delete_detalle_materia(detalle_materia_id: int):
-    return template_delete('DETALLES_MATERIAS', f'id = {detalle_materia_id}')
+async def delete_detalle_materia(detalle_materia_id: int):
+    return await template_delete('DETALLES_MATERIAS', {'id': detalle_materia_id})
 
 #
 # COMPARTIR HORARIO
 #
 
-@app.post('/compartir_horario/', response_model=CompartirHorario, tags=["CompartirHorario"])
-def create_compartir_horario(compartir_horario: CompartirHorario):
-    return template_create('COMPARTIR_HORARIO', compartir_horario.dict())
+@app.post('/compartir_horario/', tags=["CompartirHorario"])
+async def create_compartir_horario(compartir_horario: CompartirHorario):
+    return await template_create('COMPARTIR_HORARIO', compartir_horario.dict())
+
+@app.post('/compartir_horario/bulk', tags=["CompartirHorario"])
+async def create_compartir_horario_bulk(datos: List[CompartirHorario], atomico: bool = False):
+    return await template_create_bulk('COMPARTIR_HORARIO', [dato.dict() for dato in datos], atomico)
 
 @app.get('/compartir_horario/', tags=["CompartirHorario"])
-def get_compartir_horarios():
-    return template_select('COMPARTIR_HORARIO', ['id', 'url_acesso', 'id_horario'])
+async def get_compartir_horarios(pagina: Paginacion = Depends()):
+    return await template_select('COMPARTIR_HORARIO', ['id', 'url_acesso', 'id_horario'], pagina)
 
 @app.get('/compartir_horario/{compartir_horario_id}', response_model=CompartirHorario, tags=["CompartirHorario"])
-def get_compartir_horario(compartir_horario_id: int):
-    return template_select_where('COMPARTIR_HORARIO', f'id = {compartir_horario_id}', ['id', 'url_acesso', 'id_horario'])
+async def get_compartir_horario(compartir_horario_id: int):
+    return await template_select_where('COMPARTIR_HORARIO', {'id': compartir_horario_id}, ['id', 'url_acesso', 'id_horario'])
 
 @app.put('/compartir_horario/{compartir_horario_id}', response_model=CompartirHorario, tags=["CompartirHorario"])
-def update_compartir_horario(compartir_horario_id: int, compartir_horario: CompartirHorario):
-    return template_update('COMPARTIR_HORARIO', compartir_horario.dict(), f'id = {compartir_horario_id}')
+async def update_compartir_horario(compartir_horario_id: int, compartir_horario: CompartirHorario):
+    return await template_update('COMPARTIR_HORARIO', compartir_horario.dict(), {'id': compartir_horario_id})
 
 @app.delete('/compartir_horario/{compartir_horario_id}', tags=["CompartirHorario"])
-def delete_compartir_horario(compartir_horario_id: int):
-    return template_delete('COMPARTIR_HORARIO', f'id = {compartir_horario_id}')
+async def delete_compartir_horario(compartir_horario_id: int):
+    return await template_delete('COMPARTIR_HORARIO', {'id': compartir_horario_id})
 
 #
 # COMENTARIOS HORARIO
 #
 
-@app.post('/comentarios_horario/', response_model=ComentariosHorario, tags=["ComentariosHorario"])
-def create_comentario_horario(comentario_horario: ComentariosHorario):
-    return template_create('COMENTARIOS_HORARIO', comentario_horario.dict())
+async def insertar_comentarios(datos):
+    # Un lote de la escritura diferida: executemany con batcherrors, las
+    # filas rechazadas por Oracle se registran y no se reintentan
+    filas, errores, _ = await template_insert('COMENTARIOS_HORARIO', datos, atomico=False)
+    for fila, mensaje in errores:
+        logger.warning(f"comentario descartado {datos[fila]}: {mensaje}")
+    return len(filas)
+
+@app.post('/comentarios_horario/', tags=["ComentariosHorario"])
+async def create_comentario_horario(comentario_horario: ComentariosHorario):
+    if COMENTARIOS_DIFERIDOS:
+        if not cola_comentarios.encolar(comentario_horario.dict()):
+            raise HTTPException(status_code=503, detail="Comment queue full", headers={'Retry-After': '1'})
+        return JSONResponse(status_code=202, content={"message": "Comment queued"})
+    return await template_create('COMENTARIOS_HORARIO', comentario_horario.dict())
+
+@app.post('/comentarios_horario/bulk', tags=["ComentariosHorario"])
+async def create_comentario_horario_bulk(datos: List[ComentariosHorario], atomico: bool = False):
+    return await template_create_bulk('COMENTARIOS_HORARIO', [dato.dict() for dato in datos], atomico)
 
 @app.get('/comentarios_horario/', tags=["ComentariosHorario"])
-def get_comentarios_horarios():
-    return template_select('COMENTARIOS_HORARIO', ['id', 'id_horario', 'comentario', 'id_usuario', 'publicado'])
+async def get_comentarios_horarios(pagina: Paginacion = Depends()):
+    return await template_select('COMENTARIOS_HORARIO', ['id', 'id_horario', 'comentario', 'id_usuario', 'publicado'], pagina)
 
 @app.get('/comentarios_horario/{comentario_horario_id}', response_model=ComentariosHorario, tags=["ComentariosHorario"])
-def get_comentario_horario(comentario_horario_id: int):
-    return template_select_where('COMENTARIOS_HORARIO', f'id = {comentario_horario_id}', ['id', 'id_horario', 'comentario', 'id_usuario', 'publicado'])
+async def get_comentario_horario(comentario_horario_id: int):
+    return await template_select_where('COMENTARIOS_HORARIO', {'id': comentario_horario_id}, ['id', 'id_horario', 'comentario', 'id_usuario', 'publicado'])
 
 @app.put('/comentarios_horario/{comentario_horario_id}', response_model=ComentariosHorario, tags=["ComentariosHorario"])
-def update_comentario_horario(comentario_horario_id: int, comentario_horario: ComentariosHorario):
-    return template_update('COMENTARIOS_HORARIO', comentario_horario.dict(), f'id = {comentario_horario_id}')
+async def update_comentario_horario(comentario_horario_id: int, comentario_horario: ComentariosHorario):
+    return await template_update('COMENTARIOS_HORARIO', comentario_horario.dict(), {'id': comentario_horario_id})
 
 @app.delete('/comentarios_horario/{comentario_horario_id}', tags=["ComentariosHorario"])
-def delete_comentario_horario(comentario_horario_id: int):
-    return template_delete('COMENTARIOS_HORARIO', f'id = {comentario_horario_id}')
+async def delete_comentario_horario(comentario_horario_id: int):
+    return await template_delete('COMENTARIOS_HORARIO', {'id': comentario_horario_id})
 
 if __name__ == "__main__":
     import uvicorn
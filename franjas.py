@@ -0,0 +1,119 @@
+import heapq
+from array import array
+from collections import defaultdict
+from itertools import chain
+
+# Indice de las franjas de HORARIOS (dia + 'HH:MM'-'HH:MM') en minutos, para
+# responder solapamientos y huecos libres sin volver a parsear los strings.
+
+DIAS = 'LMXJVSD'
+
+def minutos(hora):
+    horas, separador, mins = hora.partition(':')
+    if not separador or not horas.isdigit() or not mins.isdigit():
+        raise ValueError(f"invalid time {hora!r}, expected HH:MM")
+    valor = int(horas) * 60 + int(mins)
+    if int(mins) >= 60 or valor > 24 * 60:
+        raise ValueError(f"invalid time {hora!r}, expected HH:MM")
+    return valor
+
+def hora(valor):
+    return f"{valor // 60:02d}:{valor % 60:02d}"
+
+def orden_dia(dia):
+    # L..D en orden de la semana; cualquier otra letra va al final
+    return (DIAS.index(dia) if dia and dia in DIAS else len(DIAS), dia)
+
+class IndiceFranjas:
+    """Franjas de uno o varios horarios, agrupadas por dia y ordenadas por inicio.
+
+    Cada dia son tres arrays paralelos (inicio y fin en minutos, id de la fila
+    de HORARIOS), asi un horario ocupa unos pocos bytes por franja en la
+    cache. Las filas con horas invalidas o fin <= inicio se ignoran.
+    """
+
+    __slots__ = ('dias',)
+
+    def __init__(self, franjas=()):
+        por_dia = defaultdict(list)
+        for id, dia, hora_inicio, hora_fin in franjas:
+            try:
+                inicio, fin = minutos(hora_inicio), minutos(hora_fin)
+            except (ValueError, AttributeError):
+                continue
+            if fin > inicio:
+                por_dia[dia].append((inicio, fin, id))
+        self.dias = {}
+        for dia, lista in por_dia.items():
+            lista.sort()
+            self.dias[dia] = self.arrays(lista)
+
+    @staticmethod
+    def arrays(lista):
+        return (
+            array('H', (inicio for inicio, _, _ in lista)),
+            array('H', (fin for _, fin, _ in lista)),
+            array('q', (id for _, _, id in lista)),
+        )
+
+    def franjas(self, dia):
+        inicios, fines, ids = self.dias.get(dia, ((), (), ()))
+        return zip(inicios, fines, ids)
+
+    def __len__(self):
+        return sum(len(inicios) for inicios, _, _ in self.dias.values())
+
+    @classmethod
+    def unir(cls, indices):
+        # Cada indice aporta un tramo ya ordenado y timsort los une en O(n log k)
+        unido = cls()
+        for dia in {dia for indice in indices for dia in indice.dias}:
+            unido.dias[dia] = cls.arrays(sorted(chain.from_iterable(indice.franjas(dia) for indice in indices)))
+        return unido
+
+    def solapamientos(self, propias=None):
+        """(dia, id_a, id_b, desde, hasta) por cada par de franjas que se pisan.
+
+        Barrido por inicio con un heap de las franjas abiertas: O(n log n + k)
+        con k pares reportados. Con `propias` (set de ids) solo se reportan
+        los pares en los que participa al menos una de esas franjas.
+        """
+        for dia in sorted(self.dias, key=orden_dia):
+            abiertas_propias = []
+            abiertas_otras = []
+            for inicio, fin, id in self.franjas(dia):
+                for abiertas in (abiertas_propias, abiertas_otras):
+                    while abiertas and abiertas[0][0] <= inicio:
+                        heapq.heappop(abiertas)
+                propia = propias is None or id in propias
+                candidatas = abiertas_propias + abiertas_otras if propia else abiertas_propias
+                for fin_abierta, id_abierta in candidatas:
+                    yield dia, id_abierta, id, inicio, min(fin, fin_abierta)
+                heapq.heappush(abiertas_propias if propia else abiertas_otras, (fin, id))
+
+    def ocupado(self, dia):
+        # Intervalos ocupados del dia ya fusionados, en orden
+        fusionados = []
+        for inicio, fin, _ in self.franjas(dia):
+            if fusionados and inicio <= fusionados[-1][1]:
+                if fin > fusionados[-1][1]:
+                    fusionados[-1][1] = fin
+            else:
+                fusionados.append([inicio, fin])
+        return fusionados
+
+    def huecos(self, dia, desde, hasta, duracion=1):
+        """Intervalos libres (inicio, fin) del dia dentro de [desde, hasta] de al menos `duracion` minutos."""
+        libres = []
+        cursor = desde
+        for inicio, fin in self.ocupado(dia):
+            if fin <= cursor:
+                continue
+            if inicio >= hasta:
+                break
+            if inicio - cursor >= duracion:
+                libres.append((cursor, inicio))
+            cursor = max(cursor, fin)
+        if hasta - cursor >= duracion:
+            libres.append((cursor, hasta))
+        return libres
@@ -0,0 +1,250 @@
+import json
+from collections import defaultdict
+
+# Funciones puras que arman la respuesta de /operacion/obtenerHorario a partir
+# de las filas leidas por cada estrategia. Todas devuelven el resultado y las
+# dependencias (tabla, id) que usa la cache para invalidar.
+
+def transformar_datos(filas):
+    """Arma la respuesta a partir de las filas del JOIN de obtener_horario.
+
+    Cada fila es la tupla del cursor en el orden de columnas de la consulta.
+    Materias, horarios, descripciones y comentarios se deduplican por id con
+    diccionarios y sets, asi el costo es lineal en el numero de filas. Las
+    materias sin horarios (id_horario nulo por el LEFT JOIN) no se muestran,
+    pero quedan en las dependencias: su primer horario debe invalidar.
+    """
+    resultado = {}
+    materias_dict = {}
+    horarios_dict = {}
+    vistos = set()
+    dependencias = set()
+
+    for (url, nombre_horario, id_materia, nombre_materia, color_materia,
+         descripcion_materia, mostrar_detalle_materia, id_horario, dia_horario,
+         hora_inicio, hora_fin, descripcion_horario, mostrar_detalle_horario,
+         comentario_horario, fecha_comentario, nombre_usuario_comentario,
+         id_compartir, id_horario_usuario, id_detalle_materia, id_detalle_horario,
+         id_comentario, id_usuario_comentario) in filas:
+
+        item = resultado.get(url)
+        if item is None:
+            item = resultado[url] = {"nombre_horario": "", "comentarios": [], "materias": [], "url_compartido": url}
+        item["nombre_horario"] = nombre_horario
+
+        if ('COMPARTIR_HORARIO', id_compartir) not in dependencias:
+            dependencias.add(('COMPARTIR_HORARIO', id_compartir))
+            dependencias.add(('HORARIOS_USUARIOS', id_horario_usuario))
+
+        # Comentario, una sola vez por url
+        if id_comentario is not None and (url, 'c', id_comentario) not in vistos:
+            vistos.add((url, 'c', id_comentario))
+            item["comentarios"].append({
+                "comentario": comentario_horario,
+                "fecha": fecha_comentario,
+                "nombre_usuario": nombre_usuario_comentario
+            })
+            dependencias.add(('COMENTARIOS_HORARIO', id_comentario))
+            if id_usuario_comentario is not None:
+                dependencias.add(('USUARIOS', id_usuario_comentario))
+
+        if id_horario is None:
+            dependencias.add(('MATERIAS', id_materia))
+            continue
+
+        # Clave única para la materia
+        clave_materia = (url, id_materia)
+        materia = materias_dict.get(clave_materia)
+        if materia is None:
+            materia = materias_dict[clave_materia] = {
+                "id": id_materia,
+                "nombre": nombre_materia,
+                "color": color_materia.lower(),
+                "descripciones": [],
+                "horarios": []
+            }
+            item["materias"].append(materia)
+            dependencias.add(('MATERIAS', id_materia))
+
+        if id_detalle_materia is not None and (clave_materia, 'dm', id_detalle_materia) not in vistos:
+            vistos.add((clave_materia, 'dm', id_detalle_materia))
+            materia["descripciones"].append({
+                "descripcion": descripcion_materia,
+                "mostrar": mostrar_detalle_materia
+            })
+            dependencias.add(('DETALLES_MATERIAS', id_detalle_materia))
+
+        # Clave única para el horario
+        clave_horario = (clave_materia, id_horario)
+        horario = horarios_dict.get(clave_horario)
+        if horario is None:
+            horario = horarios_dict[clave_horario] = {
+                "id": id_horario,
+                "dia": dia_horario,
+                "hora_inicio": hora_inicio,
+                "hora_fin": hora_fin,
+                "descripciones": []
+            }
+            materia["horarios"].append(horario)
+            dependencias.add(('HORARIOS', id_horario))
+
+        if id_detalle_horario is not None and (clave_horario, 'dh', id_detalle_horario) not in vistos:
+            vistos.add((clave_horario, 'dh', id_detalle_horario))
+            horario["descripciones"].append({
+                "descripcion": descripcion_horario,
+                "mostrar": mostrar_detalle_horario
+            })
+            dependencias.add(('DETALLES_HORARIOS', id_detalle_horario))
+
+    # Una url cuyas materias no tienen horarios no aparece
+    return [item for item in resultado.values() if item["materias"]], dependencias
+
+def armar_horarios(compartidos, materias, detalles_materias, horarios, detalles_horarios, comentarios):
+    """Arma la respuesta de obtener_horario a partir de las filas de CONSULTAS_HORARIO.
+
+    Devuelve el resultado y las dependencias (tabla, id) para la cache.
+    """
+    dependencias = set()
+    por_horario_usuario = defaultdict(list)
+    por_materia = {}
+    por_horario = {}
+
+    for id, id_horario, nombre, color in materias:
+        materia = {"id": id, "nombre": nombre, "color": color.lower(), "descripciones": [], "horarios": []}
+        por_horario_usuario[id_horario].append(materia)
+        por_materia[id] = materia
+        dependencias.add(('MATERIAS', id))
+
+    for id, id_materia, descripcion, mostrar in detalles_materias:
+        if id_materia in por_materia:
+            por_materia[id_materia]["descripciones"].append({"descripcion": descripcion, "mostrar": mostrar})
+            dependencias.add(('DETALLES_MATERIAS', id))
+
+    # Las filas huerfanas (su padre no esta en la consulta anterior) se ignoran
+    for id, id_materia, dia, hora_inicio, hora_fin in horarios:
+        if id_materia in por_materia:
+            horario = {"id": id, "dia": dia, "hora_inicio": hora_inicio, "hora_fin": hora_fin, "descripciones": []}
+            por_materia[id_materia]["horarios"].append(horario)
+            por_horario[id] = horario
+            dependencias.add(('HORARIOS', id))
+
+    for id, id_horario, descripcion, mostrar in detalles_horarios:
+        if id_horario in por_horario:
+            por_horario[id_horario]["descripciones"].append({"descripcion": descripcion, "mostrar": mostrar})
+            dependencias.add(('DETALLES_HORARIOS', id))
+
+    comentarios_por_horario = defaultdict(list)
+    for id, id_horario, comentario, publicado, id_usuario, nombre_usuario in comentarios:
+        comentarios_por_horario[id_horario].append({"comentario": comentario, "fecha": publicado, "nombre_usuario": nombre_usuario})
+        dependencias.add(('COMENTARIOS_HORARIO', id))
+        if id_usuario is not None:
+            dependencias.add(('USUARIOS', id_usuario))
+
+    resultado = {}
+    for id_compartir, url, id_horario_usuario, nombre_horario in compartidos:
+        dependencias.add(('COMPARTIR_HORARIO', id_compartir))
+        dependencias.add(('HORARIOS_USUARIOS', id_horario_usuario))
+        # Como en el JOIN, las materias sin horarios no se muestran (aunque
+        # quedan en las dependencias) y un horario sin ninguna con horarios no aparece
+        materias_con_horarios = [materia for materia in por_horario_usuario[id_horario_usuario] if materia["horarios"]]
+        if not materias_con_horarios:
+            continue
+        item = resultado.setdefault(url, {"nombre_horario": "", "comentarios": [], "materias": []})
+        item["url_compartido"] = url
+        item["nombre_horario"] = nombre_horario
+        item["comentarios"].extend(comentarios_por_horario[id_horario_usuario])
+        item["materias"].extend(materias_con_horarios)
+
+    return list(resultado.values()), dependencias
+
+def combinar_documentos(documentos):
+    """Une los documentos de QUERY_HORARIO_JSON por url, como transformar_datos."""
+    dependencias = set()
+    resultado = {}
+
+    for (documento,) in documentos:
+        if isinstance(documento, str):
+            documento = json.loads(documento)
+        dependencias.add(('COMPARTIR_HORARIO', documento["id_compartir"]))
+        dependencias.add(('HORARIOS_USUARIOS', documento["id_horario_usuario"]))
+        # Las materias sin horarios no se muestran pero si se depende de ellas
+        materias = []
+        for materia in documento["materias"] or []:
+            dependencias.add(('MATERIAS', materia["id"]))
+            if materia["horarios"]:
+                materias.append(materia)
+        if not materias:
+            continue
+
+        for materia in materias:
+            materia["descripciones"] = materia["descripciones"] or []
+            for descripcion in materia["descripciones"]:
+                dependencias.add(('DETALLES_MATERIAS', descripcion.pop("id")))
+            for horario in materia["horarios"]:
+                dependencias.add(('HORARIOS', horario["id"]))
+                horario["descripciones"] = horario["descripciones"] or []
+                for descripcion in horario["descripciones"]:
+                    dependencias.add(('DETALLES_HORARIOS', descripcion.pop("id")))
+
+        comentarios = documento["comentarios"] or []
+        for comentario in comentarios:
+            dependencias.add(('COMENTARIOS_HORARIO', comentario.pop("id")))
+            id_usuario = comentario.pop("id_usuario")
+            if id_usuario is not None:
+                dependencias.add(('USUARIOS', id_usuario))
+
+        url = documento["url_compartido"]
+        item = resultado.setdefault(url, {"nombre_horario": "", "comentarios": [], "materias": []})
+        item["url_compartido"] = url
+        item["nombre_horario"] = documento["nombre_horario"]
+        item["comentarios"].extend(comentarios)
+        item["materias"].extend(materias)
+
+    return list(resultado.values()), dependencias
+
+def repartir_consultas(compartidos, materias, detalles_materias, horarios, detalles_horarios, comentarios):
+    """Separa las filas de CONSULTAS_HORARIO pedidas para varias urls.
+
+    Devuelve {url: las seis listas de filas de esa url}, listas para
+    armar_horarios. Un horario de usuario compartido con varias urls
+    aporta sus filas a cada una.
+    """
+    grupos = {}
+    urls = defaultdict(list)
+    for fila in compartidos:
+        _, url, id_horario_usuario, _ = fila
+        grupos.setdefault(url, ([], [], [], [], [], []))[0].append(fila)
+        if url not in urls[id_horario_usuario]:
+            urls[id_horario_usuario].append(url)
+
+    horario_usuario_de_materia = {fila[0]: fila[1] for fila in materias}
+    horario_usuario_de_horario = {fila[0]: horario_usuario_de_materia.get(fila[1]) for fila in horarios}
+    for posicion, filas, horario_usuario in (
+        (1, materias, lambda fila: fila[1]),
+        (2, detalles_materias, lambda fila: horario_usuario_de_materia.get(fila[1])),
+        (3, horarios, lambda fila: horario_usuario_de_materia.get(fila[1])),
+        (4, detalles_horarios, lambda fila: horario_usuario_de_horario.get(fila[1])),
+        (5, comentarios, lambda fila: fila[1]),
+    ):
+        for fila in filas:
+            for url in urls.get(horario_usuario(fila), ()):
+                grupos[url][posicion].append(fila)
+    return grupos
+
+def repartir_por_url(estrategia, filas):
+    """Agrupa por url las filas de una consulta de obtener_horario hecha para varias urls.
+
+    Cada grupo tiene la forma que espera la funcion de su estrategia:
+    transformar_datos (join), armar_horarios (multi) o combinar_documentos (json).
+    """
+    if estrategia == 'multi':
+        return repartir_consultas(*filas)
+    grupos = defaultdict(list)
+    if estrategia == 'json':
+        for (documento,) in filas:
+            documento = json.loads(documento)
+            grupos[documento["url_compartido"]].append((documento,))
+    else:
+        for fila in filas:
+            grupos[fila[0]].append(fila)
+    return grupos
@@ -0,0 +1,156 @@
+import json
+import logging
+import random
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+# Metricas en formato de texto de Prometheus, sin dependencias externas.
+# Los templates marcan en template_actual quien hace cada llamada a la base,
+# asi los tiempos de execute/fetch y las filas se atribuyen al template.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+template_actual = ContextVar('template_actual', default='sin_template')
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas, buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self.series = defaultdict(lambda: [[0] * len(self.buckets), 0.0, 0])
+
+    def observar(self, valor, *etiquetas):
+        with lock:
+            serie = self.series[etiquetas]
+            indice = bisect_left(self.buckets, valor)
+            if indice < len(self.buckets):
+                serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for etiquetas, (cuentas, suma, total) in self.series.items():
+            base = formatear_etiquetas(self.etiquetas, etiquetas)
+            prefijo = base + ',' if base else ''
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets, cuentas):
+                acumulado += cuenta
+                lineas.append(f'{self.nombre}_bucket{{{prefijo}le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{prefijo}le="+Inf"}} {total}')
+            lineas.append(f"{self.nombre}_sum{llaves(base)} {suma}")
+            lineas.append(f"{self.nombre}_count{llaves(base)} {total}")
+        return lineas
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.series = defaultdict(float)
+
+    def incrementar(self, *etiquetas, valor=1):
+        with lock:
+            self.series[etiquetas] += valor
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for etiquetas, valor in self.series.items():
+            lineas.append(f"{self.nombre}{llaves(formatear_etiquetas(self.etiquetas, etiquetas))} {valor}")
+        return lineas
+
+class Medidor:
+    """Valor instantaneo leido al exponer (por ejemplo, conexiones ocupadas)."""
+
+    def __init__(self, nombre, ayuda, leer):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.leer = leer
+
+    def exponer(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge", f"{self.nombre} {self.leer()}"]
+
+def formatear_etiquetas(nombres, valores):
+    return ','.join(f'{nombre}="{valor}"' for nombre, valor in zip(nombres, valores))
+
+def llaves(base):
+    return f"{{{base}}}" if base else ''
+
+lock = Lock()
+registro = []
+
+def registrar(metrica):
+    registro.append(metrica)
+    return metrica
+
+def exponer():
+    with lock:
+        return '\n'.join(linea for metrica in registro for linea in metrica.exponer()) + '\n'
+
+peticiones_segundos = registrar(Histograma('http_request_duration_seconds', 'Latencia por ruta', ('ruta', 'metodo', 'estado')))
+template_segundos = registrar(Histograma('template_duration_seconds', 'Latencia por template', ('template',)))
+template_errores = registrar(Contador('template_errors_total', 'Errores por template', ('template',)))
+db_execute_segundos = registrar(Histograma('db_execute_seconds', 'Tiempo de cursor.execute por template', ('template',)))
+db_fetch_segundos = registrar(Histograma('db_fetch_seconds', 'Tiempo de fetch por template', ('template',)))
+db_filas = registrar(Contador('db_rows_total', 'Filas leidas por template', ('template',)))
+pool_espera_segundos = registrar(Histograma('db_pool_wait_seconds', 'Espera para obtener una conexion del pool', ()))
+pool_timeouts = registrar(Contador('db_pool_timeouts_total', 'Esperas que agotaron wait_timeout', ()))
+escritura_flush_segundos = registrar(Histograma('write_behind_flush_seconds', 'Tiempo de cada lote de la escritura diferida', ('cola',)))
+escritura_escritas = registrar(Contador('write_behind_rows_total', 'Filas insertadas por la escritura diferida', ('cola',)))
+escritura_rechazadas = registrar(Contador('write_behind_rejected_total', 'Filas rechazadas con la cola llena', ('cola',)))
+escritura_descartadas = registrar(Contador('write_behind_dropped_total', 'Filas encoladas que no se pudieron insertar', ('cola',)))
+
+def instrumentado(nombre):
+    """Decorador para templates async: latencia, errores y contexto de la base."""
+    def decorador(funcion):
+        @wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            token = template_actual.set(nombre)
+            inicio = perf_counter()
+            try:
+                return await funcion(*args, **kwargs)
+            except Exception as e:
+                if getattr(e, 'status_code', 500) >= 500:
+                    template_errores.incrementar(nombre)
+                raise
+            finally:
+                template_segundos.observar(perf_counter() - inicio, nombre)
+                template_actual.reset(token)
+        return envoltura
+    return decorador
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide cada peticion por plantilla de ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        inicio = perf_counter()
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado[0] = mensaje['status']
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = getattr(scope.get('route'), 'path', 'sin_ruta')
+            peticiones_segundos.observar(perf_counter() - inicio, ruta, scope['method'], estado[0])
+
+logger = logging.getLogger('fapi')
+
+def log_muestreado(tasa, evento, **campos):
+    # Log estructurado (una linea JSON) solo para una fraccion de las llamadas
+    if tasa > 0 and random.random() < tasa:
+        logger.info(json.dumps({"evento": evento, **campos}, default=str))
@@ -0,0 +1,89 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+from time import monotonic, time
+
+# Columna de PERMISOS que habilita cada metodo HTTP
+OPERACION_POR_METODO = {
+    'GET': 'leer',
+    'HEAD': 'leer',
+    'POST': 'escribir',
+    'PUT': 'modificar',
+    'PATCH': 'modificar',
+    'DELETE': 'eliminar',
+}
+
+OPERACIONES = ('leer', 'escribir', 'eliminar', 'modificar')
+
+class MatrizPermisos:
+    """Tabla PERMISOS en memoria, indexada por (id_rol, tabla).
+
+    Se carga entera con una consulta y queda vigente hasta que se invalida
+    (escrituras en PERMISOS o ROLES) o vence el TTL, asi verificar un
+    permiso no agrega viajes a la base. Una fila con tabla NULL vale para
+    todas las tablas del rol.
+    """
+
+    def __init__(self, cargar, ttl=300):
+        self.cargar = cargar
+        self.ttl = ttl
+        self.permisos = {}
+        self.vence = 0.0
+        self.generacion = 0
+        self.recargas = 0
+        self.lock = asyncio.Lock()
+
+    def invalidar(self):
+        self.generacion += 1
+        self.vence = 0.0
+
+    async def recargar(self):
+        # Las peticiones que llegan durante la carga esperan la misma consulta
+        async with self.lock:
+            if self.vence > monotonic():
+                return
+            generacion = self.generacion
+            filas = await self.cargar()
+            self.permisos = {
+                (id_rol, tabla.upper() if tabla else None): dict(zip(OPERACIONES, valores))
+                for id_rol, tabla, *valores in filas
+            }
+            self.recargas += 1
+            # Si hubo una escritura mientras se cargaba, la proxima verificacion recarga
+            if generacion == self.generacion:
+                self.vence = monotonic() + self.ttl
+
+    async def permite(self, id_rol, tabla, operacion):
+        if self.vence <= monotonic():
+            await self.recargar()
+        fila = self.permisos.get((id_rol, tabla)) or self.permisos.get((id_rol, None))
+        return bool(fila and fila[operacion])
+
+# Token de sesion que emite /operacion/login: carga JSON {u: id_usuario,
+# r: id_rol, exp: vencimiento} y su HMAC-SHA256, en base64url separados por
+# un punto. El rol viaja firmado, asi no se puede elegir con una cabecera
+
+def b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode()
+
+def firmar(carga, secreto):
+    return b64(hmac.new(secreto, carga.encode(), hashlib.sha256).digest())
+
+def emitir_token(id_usuario, id_rol, secreto, vigencia):
+    carga = b64(json.dumps({'u': id_usuario, 'r': id_rol, 'exp': int(time()) + vigencia}, separators=(',', ':')).encode())
+    return f"{carga}.{firmar(carga, secreto)}"
+
+def leer_token(token, secreto):
+    """(id_usuario, id_rol) del token, o None si la firma no coincide o ya vencio."""
+    carga, _, firma = token.partition('.')
+    if not hmac.compare_digest(firma.encode(), firmar(carga, secreto).encode()):
+        return None
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(carga + '=' * (-len(carga) % 4)))
+    except ValueError:
+        return None
+    if datos['exp'] < time():
+        return None
+    return datos['u'], datos['r']
@@ -23,7 +23,7 @@ CREATE TABLE USUARIOS (
   id_rol NUMBER NOT NULL,
   nombre VARCHAR2(50) NOT NULL,
   email VARCHAR2(50) NOT NULL,
-  contrasena VARCHAR2(50) NOT NULL,
+  contrasena VARCHAR2(255) NOT NULL,
   PRIMARY KEY(id),
   CONSTRAINT fk_rol_user FOREIGN KEY (id_rol) REFERENCES ROLES(id)
 )
@@ -91,6 +91,22 @@ CREATE TABLE COMENTARIOS_HORARIO (
   CONSTRAINT fk_horario_comentarios FOREIGN KEY (id_horario) REFERENCES HORARIOS_USUARIOS(id)
 )
 
+-- Indices de claves foraneas y de la busqueda por url
+CREATE INDEX idx_permisos_rol ON PERMISOS (id_rol, tabla);
+CREATE INDEX idx_usuarios_rol ON USUARIOS (id_rol);
+CREATE INDEX idx_usuarios_email ON USUARIOS (email);
+CREATE INDEX idx_horarios_usuarios_usuario ON HORARIOS_USUARIOS (id_usuario);
+CREATE INDEX idx_materias_horario ON MATERIAS (id_horario);
+CREATE INDEX idx_detalles_materias_materia ON DETALLES_MATERIAS (id_materia);
+CREATE INDEX idx_horarios_materia ON HORARIOS (id_materia);
+CREATE INDEX idx_detalles_horarios_horario ON DETALLES_HORARIOS (id_horario);
+CREATE INDEX idx_compartir_horario_horario ON COMPARTIR_HORARIO (id_horario);
+CREATE UNIQUE INDEX uq_compartir_horario_url ON COMPARTIR_HORARIO (url_acesso);
+CREATE INDEX idx_comentarios_horario_horario ON COMENTARIOS_HORARIO (id_horario);
+
+-- Coleccion de ids usada por la operacion Eliminar Rol
+CREATE TYPE ID_LISTA AS TABLE OF NUMBER;
+
 -- Insertar roles
 INSERT INTO ROLES (nombre) VALUES ('Administrador');
 INSERT INTO ROLES (nombre) VALUES ('Profesor');
@@ -98,14 +114,15 @@ INSERT INTO ROLES (nombre) VALUES ('Estudiante');
 INSERT INTO ROLES (nombre) VALUES ('Invitado');
 INSERT INTO ROLES (nombre) VALUES ('Otro');
 
--- Insertar permisos
+-- Insertar permisos (tabla NULL = todas las tablas, incluida la ficticia ADMIN de las rutas /admin/)
+INSERT INTO PERMISOS (id_rol, leer, escribir, eliminar, modificar, tabla) VALUES (1, 1, 1, 1, 1, NULL);
 INSERT INTO PERMISOS (id_rol, leer, escribir, eliminar, modificar, tabla) VALUES (1, 1, 1, 1, 1, 'USUARIOS');
 INSERT INTO PERMISOS (id_rol, leer, escribir, eliminar, modificar, tabla) VALUES (2, 1, 1, 0, 1, 'MATERIAS');
 INSERT INTO PERMISOS (id_rol, leer, escribir, eliminar, modificar, tabla) VALUES (3, 1, 0, 0, 0, 'HORARIOS');
 INSERT INTO PERMISOS (id_rol, leer, escribir, eliminar, modificar, tabla) VALUES (4, 0, 0, 0, 0, 'DETALLES_MATERIAS');
 INSERT INTO PERMISOS (id_rol, leer, escribir, eliminar, modificar, tabla) VALUES (5, 0, 0, 0, 0, 'DETALLES_HORARIOS');
 
--- Insertar usuarios
+-- Insertar usuarios (contrasenas en texto plano: POST /operacion/login las reemplaza por su hash la primera vez)
 INSERT INTO USUARIOS (id_rol, nombre, email, contrasena) VALUES (1, 'Admin', 'admin@email.com', 'admin123');
 INSERT INTO USUARIOS (id_rol, nombre, email, contrasena) VALUES (2, 'Profesor Juan', 'juan@email.com', 'profesor123');
 INSERT INTO USUARIOS (id_rol, nombre, email, contrasena) VALUES (3, 'Estudiante Ana', 'ana@email.com', 'estudiante123');
@@ -0,0 +1,99 @@
+"""Pool de Oracle falso para importar fapi sin base de datos.
+
+Cada sentencia ejecutada queda en SENTENCIAS (texto) y en EJECUTADAS (texto
+y autocommit de la conexion en ese momento). fetchone devuelve FILA y
+fetchall FILAS, que cada test puede cambiar con monkeypatch. El pool entrega
+siempre la misma conexion, como un pool real con una sola.
+"""
+import os
+import sys
+
+import oracledb
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+SENTENCIAS = set()
+EJECUTADAS = []
+FILA = (1, 1, 1, 1, 1, 1, 1)
+FILAS = []
+
+class Cursor:
+    rowcount = 1
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql, params=None):
+        SENTENCIAS.add(sql)
+        if len(EJECUTADAS) < 1000:
+            EJECUTADAS.append((sql, self.conexion.autocommit))
+
+    def fetchone(self):
+        return FILA
+
+    def fetchall(self):
+        return list(FILAS)
+
+class Conexion:
+    autocommit = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class Pool:
+    opened = busy = 0
+
+    def __init__(self):
+        self.conexion = Conexion()
+
+    def acquire(self):
+        return self.conexion
+
+    def release(self, connection):
+        pass
+
+    def close(self):
+        pass
+
+oracledb.create_pool = lambda *args, **kwargs: Pool()
+os.environ['ORACLE_ASYNC'] = '0'
+os.environ['HORARIO_CACHE_MAX'] = '0'
+os.environ['PERMISOS_ACTIVOS'] = '0'
+os.environ['SCHEMA_AUTO_MIGRAR'] = '0'
+
+import fapi  # noqa: E402
+
+@pytest.fixture
+def cliente():
+    from fastapi.testclient import TestClient
+
+    # Solo interesan las sentencias y los estados, no los datos falsos
+    return TestClient(fapi.app, raise_server_exceptions=False)
+
+@pytest.fixture
+def ejecutadas():
+    EJECUTADAS.clear()
+    return EJECUTADAS
+
+@pytest.fixture
+def sentencias():
+    return SENTENCIAS
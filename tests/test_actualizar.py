@@ -0,0 +1,16 @@
+import fapi
+
+def test_put_devuelve_la_fila_actualizada(cliente):
+    respuesta = cliente.put('/materias/3', json={'id_horario': 1, 'nombre': 'Fisica', 'color': 'Rojo'})
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {'id_horario': 1, 'nombre': 'Fisica', 'color': 'Rojo'}
+
+def test_put_usuario_no_devuelve_la_contrasena(cliente, monkeypatch, ejecutadas):
+    async def hashear(contrasena):
+        return 'scrypt$hash'
+
+    monkeypatch.setattr(fapi.pool_contrasenas, 'hashear', hashear)
+    respuesta = cliente.put('/usuarios/2', json={'id_rol': 1, 'nombre': 'Ana', 'email': 'ana@x', 'contrasena': 'secreta'})
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {'id_rol': 1, 'nombre': 'Ana', 'email': 'ana@x'}
+    assert any(sql.startswith('UPDATE USUARIOS SET') for sql, _ in ejecutadas)
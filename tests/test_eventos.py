@@ -0,0 +1,65 @@
+import asyncio
+
+import fapi
+from eventos import HubEventos
+
+def ids_enviados(trozos):
+    return [int(trozo.split(b'\n')[0][4:]) for trozo in trozos if trozo.startswith(b'id: ')]
+
+async def leer(feed, n):
+    # Los ids de los primeros n eventos (sin contar retry ni keepalive); si
+    # alguno no llega en un segundo, los que hayan llegado
+    trozos = []
+
+    async def consumir():
+        async for trozo in feed:
+            trozos.append(trozo)
+            if len(ids_enviados(trozos)) == n:
+                break
+
+    try:
+        await asyncio.wait_for(consumir(), 1)
+    except asyncio.TimeoutError:
+        pass
+    await feed.aclose()
+    return ids_enviados(trozos)
+
+def test_feed_no_pierde_ids_publicados_fuera_de_orden(monkeypatch):
+    hub = HubEventos()
+    monkeypatch.setattr(fapi, 'comentarios_hub', hub)
+
+    async def probar():
+        suscripcion = hub.suscribir(1)
+        # Dos altas concurrentes: la de id 5 termina antes que la de id 4
+        hub.publicar(1, 5, {'id': 5})
+        hub.publicar(1, 4, {'id': 4})
+        return await leer(fapi.feed_comentarios(suscripcion, []), 2)
+
+    assert asyncio.run(probar()) == [5, 4]
+
+def test_feed_saltea_solo_lo_ya_reenviado(monkeypatch):
+    hub = HubEventos()
+    monkeypatch.setattr(fapi, 'comentarios_hub', hub)
+
+    async def probar():
+        suscripcion = hub.suscribir(1)
+        # 3 llego a la cola mientras se buscaba lo perdido y tambien esta en
+        # pendientes; 2 se publico tarde y nunca se envio
+        hub.publicar(1, 3, {'id': 3})
+        hub.publicar(1, 2, {'id': 2})
+        hub.publicar(1, 6, {'id': 6})
+        return await leer(fapi.feed_comentarios(suscripcion, [(3, {'id': 3})]), 3)
+
+    assert asyncio.run(probar()) == [3, 2, 6]
+
+def test_feed_cancela_la_suscripcion_al_cerrar(monkeypatch):
+    hub = HubEventos()
+    monkeypatch.setattr(fapi, 'comentarios_hub', hub)
+
+    async def probar():
+        suscripcion = hub.suscribir(1)
+        hub.publicar(1, 1, {'id': 1})
+        await leer(fapi.feed_comentarios(suscripcion, []), 1)
+
+    asyncio.run(probar())
+    assert hub.suscriptores() == 0
@@ -0,0 +1,58 @@
+import pytest
+
+from franjas import IndiceFranjas, hora, minutos
+
+FRANJAS = [
+    (1, 'L', '08:00', '10:00'),
+    (2, 'L', '09:00', '11:00'),
+    (3, 'L', '10:00', '12:00'),
+    (4, 'M', '08:00', '09:00'),
+    (5, 'M', '08:30', '08:45'),
+]
+
+def test_solapamientos():
+    # 1 y 3 solo se tocan a las 10:00: no se pisan
+    assert list(IndiceFranjas(FRANJAS).solapamientos()) == [
+        ('L', 1, 2, minutos('09:00'), minutos('10:00')),
+        ('L', 2, 3, minutos('10:00'), minutos('11:00')),
+        ('M', 4, 5, minutos('08:30'), minutos('08:45')),
+    ]
+
+def test_solapamientos_de_las_propias():
+    indice = IndiceFranjas(FRANJAS)
+    assert list(indice.solapamientos(propias={3})) == [('L', 2, 3, minutos('10:00'), minutos('11:00'))]
+    assert list(indice.solapamientos(propias={1})) == [('L', 1, 2, minutos('09:00'), minutos('10:00'))]
+    assert list(indice.solapamientos(propias=set())) == []
+
+def test_huecos():
+    indice = IndiceFranjas(FRANJAS)
+    # Las franjas del lunes se tocan y quedan como un solo bloque 08:00-12:00
+    assert indice.ocupado('L') == [[minutos('08:00'), minutos('12:00')]]
+    assert indice.huecos('L', minutos('07:00'), minutos('13:00')) == [
+        (minutos('07:00'), minutos('08:00')),
+        (minutos('12:00'), minutos('13:00')),
+    ]
+    assert indice.huecos('L', minutos('07:00'), minutos('13:00'), duracion=61) == []
+    assert indice.huecos('L', minutos('09:00'), minutos('11:00')) == []
+    assert indice.huecos('X', minutos('07:00'), minutos('13:00')) == [(minutos('07:00'), minutos('13:00'))]
+
+def test_filas_invalidas_se_ignoran():
+    indice = IndiceFranjas(FRANJAS[:1] + [
+        (6, 'L', '25:00', '26:00'),
+        (7, 'L', '8', '09:00'),
+        (8, 'L', '10:00', '09:00'),
+        (9, 'L', '10:00', '10:00'),
+        (10, 'L', None, '09:00'),
+    ])
+    assert len(indice) == 1
+    assert list(indice.franjas('L')) == [(minutos('08:00'), minutos('10:00'), 1)]
+
+def test_unir():
+    unido = IndiceFranjas.unir([IndiceFranjas(FRANJAS[::2]), IndiceFranjas(FRANJAS[1::2])])
+    assert list(unido.solapamientos()) == list(IndiceFranjas(FRANJAS).solapamientos())
+
+def test_minutos_y_hora():
+    assert minutos('07:05') == 425 and hora(425) == '07:05'
+    for valor in ('7', '07:60', '24:01', 'ab:cd'):
+        with pytest.raises(ValueError):
+            minutos(valor)
@@ -0,0 +1,145 @@
+import json
+
+from horarios import armar_horarios, combinar_documentos, repartir_por_url, transformar_datos
+
+FECHA = '2024-01-01T12:30:00'
+
+# Un horario compartido en 'a': la materia 10 tiene dos horarios con una
+# descripcion cada uno, la 11 no tiene horarios y no se muestra
+COMPARTIDOS = [(1, 'a', 5, 'Primero')]
+MATERIAS = [(10, 5, 'Algebra', 'AZUL'), (11, 5, 'Fisica', 'Rojo')]
+DETALLES_MATERIAS = [(20, 10, 'teoria', 1), (21, 10, 'practica', 0)]
+HORARIOS = [(30, 10, 'L', '08:00', '10:00'), (31, 10, 'M', '10:00', '12:00')]
+DETALLES_HORARIOS = [(40, 30, 'aula 1', 1), (41, 31, 'aula 2', 1)]
+COMENTARIOS = [(50, 5, 'hola', FECHA, 7, 'ana'), (51, 5, 'chau', FECHA, None, None)]
+
+def filas_multi():
+    return COMPARTIDOS, MATERIAS, DETALLES_MATERIAS, HORARIOS, DETALLES_HORARIOS, COMENTARIOS
+
+def filas_join():
+    # Producto de los LEFT JOIN: cada comentario y cada descripcion se repiten
+    filas = []
+    id_compartir, url, id_horario_usuario, nombre_horario = COMPARTIDOS[0]
+    for id_materia, _, nombre, color in MATERIAS:
+        for dm in [d for d in DETALLES_MATERIAS if d[1] == id_materia] or [(None,) * 4]:
+            for h in [h for h in HORARIOS if h[1] == id_materia] or [(None,) * 5]:
+                for dh in [d for d in DETALLES_HORARIOS if d[1] == h[0]] or [(None,) * 4]:
+                    for c in COMENTARIOS:
+                        filas.append((
+                            url, nombre_horario, id_materia, nombre, color, dm[2], dm[3],
+                            h[0], h[2], h[3], h[4], dh[2], dh[3], c[2], c[3], c[5],
+                            id_compartir, id_horario_usuario, dm[0], dh[0], c[0], c[4],
+                        ))
+    return filas
+
+def documento():
+    id_compartir, url, id_horario_usuario, nombre_horario = COMPARTIDOS[0]
+    return {
+        'url_compartido': url, 'nombre_horario': nombre_horario,
+        'id_compartir': id_compartir, 'id_horario_usuario': id_horario_usuario,
+        'comentarios': [
+            {'id': c[0], 'comentario': c[2], 'fecha': c[3], 'id_usuario': c[4], 'nombre_usuario': c[5]}
+            for c in COMENTARIOS
+        ],
+        'materias': [
+            {
+                'id': id, 'nombre': nombre, 'color': color.lower(),
+                'descripciones': [
+                    {'id': d[0], 'descripcion': d[2], 'mostrar': d[3]} for d in DETALLES_MATERIAS if d[1] == id
+                ] or None,
+                'horarios': [
+                    {
+                        'id': h[0], 'dia': h[2], 'hora_inicio': h[3], 'hora_fin': h[4],
+                        'descripciones': [
+                            {'id': d[0], 'descripcion': d[2], 'mostrar': d[3]} for d in DETALLES_HORARIOS if d[1] == h[0]
+                        ],
+                    }
+                    for h in HORARIOS if h[1] == id
+                ],
+            }
+            for id, _, nombre, color in MATERIAS
+        ],
+    }
+
+ESPERADO = [{
+    'nombre_horario': 'Primero',
+    'url_compartido': 'a',
+    'comentarios': [
+        {'comentario': 'hola', 'fecha': FECHA, 'nombre_usuario': 'ana'},
+        {'comentario': 'chau', 'fecha': FECHA, 'nombre_usuario': None},
+    ],
+    'materias': [{
+        'id': 10, 'nombre': 'Algebra', 'color': 'azul',
+        'descripciones': [{'descripcion': 'teoria', 'mostrar': 1}, {'descripcion': 'practica', 'mostrar': 0}],
+        'horarios': [
+            {'id': 30, 'dia': 'L', 'hora_inicio': '08:00', 'hora_fin': '10:00',
+             'descripciones': [{'descripcion': 'aula 1', 'mostrar': 1}]},
+            {'id': 31, 'dia': 'M', 'hora_inicio': '10:00', 'hora_fin': '12:00',
+             'descripciones': [{'descripcion': 'aula 2', 'mostrar': 1}]},
+        ],
+    }],
+}]
+
+DEPENDENCIAS = {
+    ('COMPARTIR_HORARIO', 1), ('HORARIOS_USUARIOS', 5), ('MATERIAS', 10), ('MATERIAS', 11),
+    ('DETALLES_MATERIAS', 20), ('DETALLES_MATERIAS', 21), ('HORARIOS', 30), ('HORARIOS', 31),
+    ('DETALLES_HORARIOS', 40), ('DETALLES_HORARIOS', 41), ('COMENTARIOS_HORARIO', 50),
+    ('COMENTARIOS_HORARIO', 51), ('USUARIOS', 7),
+}
+
+def test_las_tres_estrategias_arman_lo_mismo():
+    # La materia sin horarios no se muestra pero su primer horario debe invalidar
+    assert transformar_datos(filas_join()) == (ESPERADO, DEPENDENCIAS)
+    assert armar_horarios(*filas_multi()) == (ESPERADO, DEPENDENCIAS)
+    assert combinar_documentos([(json.dumps(documento()),)]) == (ESPERADO, DEPENDENCIAS)
+    assert combinar_documentos([(documento(),)]) == (ESPERADO, DEPENDENCIAS)
+
+def test_join_deduplica_por_id():
+    # Filas repetidas no agregan comentarios ni descripciones
+    filas = filas_join()
+    assert len(filas) > len(COMENTARIOS) * len(HORARIOS)
+    assert transformar_datos(filas + filas[::-1])[0] == ESPERADO
+
+def test_join_distingue_comentarios_iguales_con_otro_id():
+    # Dos comentarios con el mismo texto son dos comentarios
+    filas = [fila[:13] + ('hola',) + fila[14:] for fila in filas_join()]
+    resultado, _ = transformar_datos(filas)
+    assert [c['comentario'] for c in resultado[0]['comentarios']] == ['hola', 'hola']
+
+def test_sin_materias_con_horarios_no_aparece():
+    solo_fisica = [fila for fila in filas_join() if fila[2] == 11]
+    resultado, dependencias = transformar_datos(solo_fisica)
+    assert resultado == [] and ('MATERIAS', 11) in dependencias
+
+    compartidos, materias, _, _, _, comentarios = filas_multi()
+    resultado, dependencias = armar_horarios(compartidos, materias[1:], [], [], [], comentarios)
+    assert resultado == [] and ('MATERIAS', 11) in dependencias
+
+    doc = documento()
+    doc['materias'] = doc['materias'][1:]
+    resultado, dependencias = combinar_documentos([(doc,)])
+    assert resultado == [] and ('MATERIAS', 11) in dependencias
+
+def test_multi_ignora_filas_huerfanas():
+    compartidos, materias, detalles_materias, horarios, detalles_horarios, comentarios = filas_multi()
+    resultado, dependencias = armar_horarios(
+        compartidos, materias,
+        detalles_materias + [(22, 99, 'huerfana', 1)],
+        horarios + [(32, 99, 'J', '08:00', '09:00')],
+        detalles_horarios + [(42, 39, 'huerfana', 1)],
+        comentarios,
+    )
+    assert resultado == ESPERADO
+    assert not {('DETALLES_MATERIAS', 22), ('HORARIOS', 32), ('DETALLES_HORARIOS', 42)} & dependencias
+
+def test_repartir_por_url():
+    otra = [('b',) + fila[1:] for fila in filas_join()]
+    grupos = repartir_por_url('join', filas_join() + otra)
+    assert transformar_datos(grupos['a'])[0] == ESPERADO
+    assert transformar_datos(grupos['b'])[0][0]['url_compartido'] == 'b'
+
+    grupos = repartir_por_url('multi', filas_multi())
+    assert armar_horarios(*grupos['a']) == (ESPERADO, DEPENDENCIAS)
+
+    grupos = repartir_por_url('json', [(json.dumps(documento()),)])
+    assert combinar_documentos(grupos['a']) == (ESPERADO, DEPENDENCIAS)
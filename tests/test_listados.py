@@ -0,0 +1,25 @@
+import fapi
+
+def sentencias_de(ejecutadas):
+    return [sql for sql, _ in ejecutadas]
+
+def test_pagina_sin_validadores_es_un_solo_viaje(cliente, ejecutadas):
+    respuesta = cliente.get('/roles/')
+    assert respuesta.status_code == 200
+    assert 'ETag' in respuesta.headers
+    assert sentencias_de(ejecutadas) == ['SELECT id, nombre FROM ROLES ORDER BY id FETCH FIRST :limit ROWS ONLY']
+
+def test_get_condicional_sondea_max_id_y_responde_304(cliente, ejecutadas):
+    # El primer condicional lee la sonda y devuelve el ETag que la incluye
+    etag = cliente.get('/roles/', headers={'If-None-Match': '"otro"'}).headers['ETag']
+    ejecutadas.clear()
+    respuesta = cliente.get('/roles/', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 304
+    assert sentencias_de(ejecutadas) == [fapi.VERSION_TABLA.format(table='ROLES')]
+
+def test_alta_en_otro_proceso_cambia_el_etag(cliente, monkeypatch):
+    import conftest
+
+    etag = cliente.get('/roles/', headers={'If-None-Match': '"otro"'}).headers['ETag']
+    monkeypatch.setattr(conftest, 'FILA', (2,) * 7)
+    assert cliente.get('/roles/', headers={'If-None-Match': etag}).status_code == 200
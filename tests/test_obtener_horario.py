@@ -0,0 +1,43 @@
+import asyncio
+
+import fapi
+
+def test_sin_json_rapido_no_se_serializa_al_guardar(monkeypatch):
+    # FastAPI serializa la respuesta; guardar_horario no debe hacerlo antes
+    def serializar(datos):
+        raise AssertionError("serializado dos veces")
+
+    monkeypatch.setattr(fapi, 'JSON_RAPIDO', False)
+    monkeypatch.setattr(fapi, 'serializar', serializar)
+    resultado = [{"url_compartido": "a", "materias": []}]
+    assert fapi.guardar_horario('a', resultado, set(), fapi.version_horarios()) == (resultado, None, None)
+
+def test_con_json_rapido_se_guarda_el_cuerpo(monkeypatch):
+    monkeypatch.setattr(fapi, 'JSON_RAPIDO', True)
+    monkeypatch.setattr(fapi, 'serializar', lambda datos: b'cuerpo')
+    assert fapi.guardar_horario('a', [{"url_compartido": "a"}], set(), fapi.version_horarios())[2] == b'cuerpo'
+
+def test_obtener_horarios_guarda_el_etag(monkeypatch, cliente):
+    # Lo cacheado por el lote se sirve en la ruta de una url sin volver a
+    # leer la version ni el horario
+    from benchmarks.simulador import generar
+    from cache import CacheTTL
+
+    consultas = []
+
+    async def db_fetchall(sql, params=None):
+        consultas.append(sql)
+        return generar(sql, params)
+
+    monkeypatch.setattr(fapi, 'JSON_RAPIDO', False)
+    monkeypatch.setattr(fapi, 'horarios_cache', CacheTTL(16, 60))
+    monkeypatch.setattr(fapi, 'db_fetchall', db_fetchall)
+    respuesta = cliente.post('/operacion/obtenerHorarios?estrategia=join', json=['a', 'b'])
+    assert respuesta.status_code == 200 and respuesta.json()['a']
+    etag = asyncio.run(fapi.version_horario('a'))
+    assert fapi.horarios_cache.obtener('a')[1] == etag
+
+    consultas.clear()
+    respuesta = cliente.get('/operacion/obtenerHorario/a')
+    assert respuesta.status_code == 200 and respuesta.headers['etag'] == etag
+    assert consultas == []
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+import fapi
+from permisos import MatrizPermisos, emitir_token, leer_token
+
+FILAS_PERMISOS = [
+    # id_rol, tabla, leer, escribir, eliminar, modificar
+    (1, None, 1, 1, 1, 1),
+    (2, 'ROLES', 1, 0, 0, 0),
+]
+
+@pytest.fixture
+def cargas(monkeypatch):
+    # PERMISOS falsa; la lista cuenta las veces que se cargo
+    veces = []
+
+    async def cargar():
+        veces.append(1)
+        return FILAS_PERMISOS
+
+    monkeypatch.setattr(fapi, 'matriz_permisos', MatrizPermisos(cargar, ttl=300))
+    return veces
+
+def cabecera(id_rol, vigencia=60):
+    return {'Authorization': f'Bearer {emitir_token(7, id_rol, fapi.TOKEN_SECRETO, vigencia)}'}
+
+def test_token_firmado_se_lee_y_el_alterado_no():
+    token = emitir_token(7, 2, b'clave', 60)
+    assert leer_token(token, b'clave') == (7, 2)
+    assert leer_token(token, b'otra') is None
+    carga, _, firma = token.partition('.')
+    assert leer_token(f"{carga}x.{firma}", b'clave') is None
+    assert leer_token(emitir_token(7, 2, b'clave', -1), b'clave') is None
+
+def test_admin_exige_token(cliente, cargas):
+    respuesta = cliente.get('/admin/cache')
+    assert respuesta.status_code == 401
+    assert respuesta.headers['WWW-Authenticate'] == 'Bearer'
+    assert cliente.get('/admin/cache', headers={'Authorization': 'Bearer basura'}).status_code == 401
+    assert cliente.get('/admin/cache', headers=cabecera(1, vigencia=-1)).status_code == 401
+
+def test_admin_exige_permiso_sobre_admin(cliente, cargas):
+    assert cliente.get('/admin/cache', headers=cabecera(2)).status_code == 403
+    # Fila con tabla NULL: el rol 1 del script.sql
+    assert cliente.get('/admin/cache', headers=cabecera(1)).status_code == 200
+
+def test_crud_sin_permisos_activos_no_pide_token(cliente, cargas):
+    assert cliente.get('/roles/').status_code == 200
+    assert cargas == []
+
+def test_crud_con_permisos_activos(cliente, cargas, monkeypatch):
+    monkeypatch.setattr(fapi, 'PERMISOS_ACTIVOS', True)
+    assert cliente.get('/roles/').status_code == 401
+    assert cliente.get('/roles/', headers={'X-Rol-Id': '1'}).status_code == 401
+    assert cliente.get('/roles/', headers=cabecera(2)).status_code == 200
+    assert cliente.post('/roles/', json={'nombre': 'x'}, headers=cabecera(2)).status_code == 403
+    assert cliente.get('/usuarios/', headers=cabecera(2)).status_code == 403
+    # Una sola carga de PERMISOS para todas las verificaciones
+    assert cargas == [1]
+
+def test_escritura_en_permisos_invalida_la_matriz(cargas):
+    async def probar():
+        assert not await fapi.matriz_permisos.permite(3, 'ROLES', 'leer')
+        FILAS_PERMISOS.append((3, 'ROLES', 1, 0, 0, 0))
+        try:
+            # Sigue cacheada hasta que una escritura en PERMISOS la invalida
+            assert not await fapi.matriz_permisos.permite(3, 'ROLES', 'leer')
+            fapi.registrar_escritura('PERMISOS', {'id_rol': 3})
+            assert await fapi.matriz_permisos.permite(3, 'ROLES', 'leer')
+        finally:
+            FILAS_PERMISOS.pop()
+
+    asyncio.run(probar())
+    assert cargas == [1, 1]
+
+def test_escritura_durante_la_carga_no_deja_la_matriz_vigente():
+    cargas = []
+
+    async def cargar():
+        cargas.append(1)
+        if len(cargas) == 1:
+            # Llega una escritura mientras la consulta esta en vuelo
+            matriz.invalidar()
+        return FILAS_PERMISOS
+
+    matriz = MatrizPermisos(cargar, ttl=300)
+
+    async def probar():
+        await matriz.permite(1, 'ROLES', 'leer')
+        await matriz.permite(1, 'ROLES', 'leer')
+
+    asyncio.run(probar())
+    assert len(cargas) == 2
@@ -0,0 +1,27 @@
+"""Cuenta los textos SQL distintos que genera la app con ids variables.
+
+Con el pool falso de conftest.py, manda 10k peticiones con ids y urls
+distintos y verifica que el numero de textos distintos no depende del numero
+de peticiones (todo va con bind variables, asi la cache de sentencias del
+driver siempre acierta). No necesita base de datos.
+
+    python -m pytest tests/test_sentencias.py
+"""
+
+RECURSOS = ['roles', 'permisos', 'usuarios', 'horarios_usuarios', 'materias',
+            'detalles_materias', 'compartir_horario', 'comentarios_horario']
+
+def peticiones(cliente, n):
+    for i in range(n):
+        recurso = RECURSOS[i % len(RECURSOS)]
+        cliente.get(f'/{recurso}/{i}')
+        cliente.delete(f'/{recurso}/{i}')
+        cliente.get(f'/operacion/obtenerHorario/url-{i}', params={'estrategia': 'join'})
+        if i % 100 == 0:
+            cliente.delete(f'/operacion/eliminarRol/{i}')
+
+def test_sentencias_no_crecen_con_las_peticiones(cliente, sentencias):
+    peticiones(cliente, 100)
+    despues_de_100 = set(sentencias)
+    peticiones(cliente, 10000)
+    assert sentencias == despues_de_100, f"hay sentencias con valores interpolados: {sorted(sentencias - despues_de_100)[:5]}"
@@ -9,3 +9,14 @@ def createTableIfNotExist(cursor, sentence):
             pass
         else:
             raise
+
+def createIndexIfNotExist(cursor, sentence):
+    try:
+        cursor.execute(sentence)
+    except DatabaseError as e:
+        error, = e.args
+        # ORA-00955: el nombre ya existe; ORA-01408: esas columnas ya tienen indice
+        if error.code in (955, 1408):
+            pass
+        else:
+            raise